@@ -1,16 +1,14 @@
-from auto_review_tool.core.config import settings
-
-
 def initialize_auto_review_tool() -> None:
     """
-    Initializes settings by loading environment variables.
+    Checks that the required environment variables are set.
+    Called when the app, a worker or a batch starts, not on import,
+    so that e.g. `auto-review-tool --help` works without them.
     """
+    from auto_review_tool.core.config import settings
+
     env_dict = settings.env_dict
     for key, value in env_dict.items():
         if value is None:
             raise ValueError(
                 f"You need to set {key} in your environment variables."
             )
-
-
-initialize_auto_review_tool()
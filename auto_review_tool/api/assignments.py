@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+
+from auto_review_tool.core.template_store import template_store
+from auto_review_tool.models.review import AssignmentTemplate, AssignmentTemplateRequest
+
+router = APIRouter()
+
+
+@router.post("/assignments", response_model=AssignmentTemplate, status_code=201)
+async def register_assignment(request: AssignmentTemplateRequest) -> AssignmentTemplate:
+    """
+    Register the description and the rubric of an assignment once.
+    Reviews then reference it by its id in "assignment_id".
+    Registering the same assignment again returns the same template.
+    """
+    template = await template_store.register(
+        request.assignment_description, request.rubric
+    )
+    return AssignmentTemplate(**template)
+
+
+@router.get("/assignments/{assignment_id}", response_model=AssignmentTemplate)
+async def get_assignment(assignment_id: str) -> AssignmentTemplate:
+    """
+    Get a registered assignment.
+    """
+    template = await template_store.get(assignment_id)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Assignment not found.")
+    return AssignmentTemplate(**template)
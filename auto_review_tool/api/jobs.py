@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException
+
+from auto_review_tool.core.job_queue import job_queue
+from auto_review_tool.core.webhooks import check_webhook_url
+from auto_review_tool.models.review import ReviewJob, ReviewJobRequest
+from auto_review_tool.services import review as review_service
+
+router = APIRouter()
+
+
+@router.post("/reviews", response_model=ReviewJob, status_code=202)
+async def submit_review(request: ReviewJobRequest) -> ReviewJob:
+    """
+    Queue a code review and return its job immediately.
+    The review is run by an `auto-review-tool worker` process.
+    """
+    try:
+        await review_service.resolve_assignment(request)
+        if request.webhook_url is not None:
+            await check_webhook_url(str(request.webhook_url))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        job = await job_queue.enqueue(request.model_dump(mode="json"))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return ReviewJob(**job)
+
+
+@router.get("/reviews/{job_id}", response_model=ReviewJob)
+async def get_review_job(job_id: str) -> ReviewJob:
+    """
+    Get the status of a queued review and its result once it is completed.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Review job not found.")
+    return ReviewJob(**job)
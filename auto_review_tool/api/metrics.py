@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, Response
+
+from auto_review_tool.core import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """
+    Prometheus metrics of all workers of the application.
+    """
+    if not metrics.is_available():
+        raise HTTPException(
+            status_code=503,
+            detail="Metrics need the prometheus-client package.",
+        )
+    content, content_type = metrics.generate_metrics()
+    return Response(content=content, media_type=content_type)
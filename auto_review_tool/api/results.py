@@ -0,0 +1,42 @@
+from typing import Annotated, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from auto_review_tool.core.result_store import result_store
+from auto_review_tool.models.review import ReviewResult
+
+router = APIRouter()
+
+
+@router.get("/results", response_model=List[ReviewResult])
+async def list_results(
+        repo_url: Optional[str] = None,
+        commit_sha: Optional[str] = None,
+        candidate_level: Optional[str] = None,
+        assignment_hash: Optional[str] = None,
+        limit: Annotated[int, Query(ge=1, le=500)] = 50,
+        offset: Annotated[int, Query(ge=0)] = 0,
+) -> List[ReviewResult]:
+    """
+    List stored review results, newest first, without running any review.
+    """
+    results = await result_store.list_results(
+        repo_url=repo_url,
+        commit_sha=commit_sha,
+        candidate_level=candidate_level,
+        assignment_hash=assignment_hash,
+        limit=limit,
+        offset=offset,
+    )
+    return [ReviewResult(**result) for result in results]
+
+
+@router.get("/results/{result_id}", response_model=ReviewResult)
+async def get_result(result_id: int) -> ReviewResult:
+    """
+    Get a stored review result.
+    """
+    result = await result_store.get_by_id(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Review result not found.")
+    return ReviewResult(**result)
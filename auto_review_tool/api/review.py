@@ -1,49 +1,274 @@
-from typing import Any, Dict, List
+import asyncio
+import json
+import logging
+from contextlib import AsyncExitStack
+from hashlib import sha256
+from hmac import compare_digest
+from typing import Annotated, Any, AsyncIterator, Dict, Optional, Set
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 
 from auto_review_tool.clients.github_client import GitHubClient
 from auto_review_tool.clients.openai_client import OpenAIClient
+from auto_review_tool.core.admission import AdmissionRejected, admission
 from auto_review_tool.core.config import settings
-from auto_review_tool.models.review import ReviewRequest, ReviewResponse
+from auto_review_tool.core.metrics import REVIEWS_IN_PROGRESS, time_stage
+from auto_review_tool.models.review import (
+    BatchReviewRequest,
+    ReviewRequest,
+    ReviewResponse,
+)
+from auto_review_tool.services import review as review_service
 
 router = APIRouter()
-github_client = GitHubClient(token=settings.GITHUB_TOKEN)
-openai_client = OpenAIClient(api_key=settings.OPENAI_API_KEY)
+
+GitHubClientDependency = Annotated[
+    GitHubClient, Depends(review_service.get_github_client)
+]
+OpenAIClientDependency = Annotated[
+    OpenAIClient, Depends(review_service.get_openai_client)
+]
+
+# Streams keep running after the client disconnects, so that the analysis
+# still gets cached. References are kept here until they are finished.
+_background_reviews: Set[asyncio.Task] = set()
 
 
 @router.post("/review", response_model=ReviewResponse)
-async def review_code(request: ReviewRequest) -> ReviewResponse:
+async def review_code(
+        request: ReviewRequest,
+        http_request: Request,
+        github_client: GitHubClientDependency,
+        openai_client: OpenAIClientDependency,
+) -> ReviewResponse:
     """
     Endpoint for automated code review.
+    Reviews which are not answered from stored results are subject to
+    admission control, and rejected with 429 (limits of the client) or
+    503 (limits of the service) and a Retry-After header.
     """
     try:
-        if not await github_client.is_api_available():
-            raise HTTPException(
-                status_code=503,
-                detail=(
-                    "The service is temporarily unavailable "
-                    "due to internal API rate limits. "
-                    "Please try again later."
-                ),
-                headers={"Retry-After": settings.RETRY_AFTER},
+        await _check_api_availability(github_client)
+        with REVIEWS_IN_PROGRESS.labels(endpoint="review").track_inprogress():
+            return await review_service.run_review(
+                request,
+                admission.admit(_get_client_id(http_request)),
+                github_client=github_client,
+                openai_client=openai_client,
             )
-        repo_contents: List[Dict[str, Any]] = await github_client.get_repo_contents(
-            str(request.github_repo_url)
-        )
-        all_file_names = [item["path"] for item in repo_contents]
-        file_contents = await github_client.get_file_contents(repo_contents)
-        analysis = await openai_client.analyze_code(
-            file_names=list(file_contents.keys()),
-            file_contents=list(file_contents.values()),
-            assignment_description=request.assignment_description,
-            candidate_level=request.candidate_level,
-        )
-        return ReviewResponse(
-            found_files=all_file_names,
-            analysis=analysis
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise _get_rejection(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception(f"Review of {request.github_repo_url} failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/review/stream")
+async def review_code_stream(
+        request: ReviewRequest,
+        http_request: Request,
+        github_client: GitHubClientDependency,
+        openai_client: OpenAIClientDependency,
+) -> StreamingResponse:
+    """
+    Endpoint for automated code review, streamed as Server-Sent Events.
+    Emits "progress" events while the repository is fetched,
+    "token" events while the analysis is generated,
+    and a final "result" (ReviewResponse) or "error" event.
+    Reviews which are not answered from stored results are subject to
+    the same admission control as /review, decided before the stream starts.
+    """
+    admitted = AsyncExitStack()
+    try:
+        await _check_api_availability(github_client)
+        request = await review_service.resolve_assignment(request)
+        commit_sha = await github_client.get_head_commit(
+            str(request.github_repo_url), request.ref
         )
+        stored_result = await review_service.get_stored_result(request, commit_sha)
+        if stored_result is None:
+            await admitted.enter_async_context(
+                admission.admit(_get_client_id(http_request))
+            )
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise _get_rejection(e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        logging.exception(f"Review of {request.github_repo_url} failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        _stream_review(
+            request,
+            commit_sha,
+            stored_result,
+            admitted,
+            github_client,
+            openai_client,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/review/batch")
+async def review_batch(
+        request: BatchReviewRequest,
+        http_request: Request,
+        github_client: GitHubClientDependency,
+        openai_client: OpenAIClientDependency,
+) -> StreamingResponse:
+    """
+    Endpoint for reviewing many repositories for one assignment.
+    The result of every repository (BatchReviewItem) is streamed as a line
+    of JSON as soon as its review is finished.
+    Reviews of repositories are subject to the same admission control
+    as /review, and wait until they are admitted instead of being rejected.
+    """
+    try:
+        await _check_api_availability(github_client)
+        request = await review_service.resolve_assignment(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        _stream_batch(
+            request, _get_client_id(http_request), github_client, openai_client
+        ),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _stream_batch(
+        request: BatchReviewRequest,
+        client_id: str,
+        github_client: GitHubClient,
+        openai_client: OpenAIClient,
+) -> AsyncIterator[str]:
+    async for item in review_service.run_batch(
+            request,
+            client_id=client_id,
+            github_client=github_client,
+            openai_client=openai_client,
+    ):
+        yield item.model_dump_json() + "\n"
+
+
+def _get_rejection(rejected: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=rejected.status_code,
+        detail=f"{rejected} Please try again later.",
+        headers={"Retry-After": rejected.retry_after_header},
+    )
+
+
+def _get_client_id(request: Request) -> str:
+    """
+    Clients are told apart by their API key, when it is one of
+    settings.ADMISSION_API_KEYS, or else by their address. Any other key
+    is ignored, so that clients cannot get new limits by sending new keys.
+    """
+    api_key = request.headers.get(settings.ADMISSION_API_KEY_HEADER, "")
+    api_key_bytes = api_key.encode("utf-8")
+    if api_key and any(
+            compare_digest(api_key_bytes, key.encode("utf-8"))
+            for key in settings.ADMISSION_API_KEYS
+    ):
+        return f"key:{sha256(api_key_bytes).hexdigest()[:16]}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+async def _check_api_availability(github_client: GitHubClient) -> None:
+    with time_stage("rate_limit_check"):
+        retry_after = await github_client.retry_after()
+    if retry_after:
+        raise HTTPException(
+            status_code=503,
+            detail=(
+                "The service is temporarily unavailable "
+                "due to internal API rate limits. "
+                "Please try again later."
+            ),
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def _format_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_review(
+        request: ReviewRequest,
+        commit_sha: str,
+        stored_result: Optional[ReviewResponse],
+        admitted: AsyncExitStack,
+        github_client: GitHubClient,
+        openai_client: OpenAIClient,
+) -> AsyncIterator[str]:
+    """
+    Start the review in a task and stream its events from a queue.
+    The task is started right away, so that the admission it holds
+    is left even when the client never reads the stream.
+    """
+    queue: asyncio.Queue[Optional[str]] = asyncio.Queue()
+
+    def on_progress(stage: str, data: Dict[str, Any]) -> None:
+        queue.put_nowait(_format_event("progress", {"stage": stage, **data}))
+
+    async def run_review() -> None:
+        in_progress = REVIEWS_IN_PROGRESS.labels(endpoint="stream")
+        in_progress.inc()
+        try:
+            if stored_result is not None:
+                on_progress("cache_hit", {"source": "results"})
+                queue.put_nowait(_format_event("result", stored_result.model_dump()))
+                return None
+
+            async with admitted:
+                repository = await review_service.fetch_repository(
+                    str(request.github_repo_url),
+                    on_progress,
+                    commit_sha,
+                    github_client,
+                )
+                all_file_names, file_contents, files = repository
+                parts = []
+                async for part in openai_client.stream_analyze_code(
+                        file_names=list(file_contents.keys()),
+                        file_contents=list(file_contents.values()),
+                        assignment_description=request.assignment_description,
+                        candidate_level=request.candidate_level,
+                        rubric=request.rubric,
+                        on_progress=on_progress,
+                ):
+                    parts.append(part)
+                    queue.put_nowait(_format_event("token", {"text": part}))
+            result = ReviewResponse(found_files=all_file_names, analysis="".join(parts))
+            await review_service.save_review_state(
+                request, files, result.analysis
+            )
+            await review_service.store_result(request, commit_sha, result)
+            queue.put_nowait(_format_event("result", result.model_dump()))
+        except Exception as e:
+            logging.error(f"Streaming review failed: {e}")
+            queue.put_nowait(_format_event("error", {"detail": str(e)}))
+        finally:
+            in_progress.dec()
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(run_review())
+    _background_reviews.add(task)
+    task.add_done_callback(_background_reviews.discard)
+    return _read_events(queue)
+
+
+async def _read_events(queue: asyncio.Queue) -> AsyncIterator[str]:
+    while (event := await queue.get()) is not None:
+        yield event
@@ -1,9 +1,20 @@
+import asyncio
+import json
 import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, List, Optional
 
 import click
-import uvicorn
 
-from auto_review_tool.main import app
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.logging_config import setup_logging
+
+# Commands import what they need when they run, so that e.g. `--help`
+# or `worker` do not pay for the import of the app, uvicorn or openai.
+if TYPE_CHECKING:
+    from auto_review_tool.models.review import BatchReviewRequest
 
 
 @click.group()
@@ -21,11 +32,17 @@ def runprod(host: str, port: int, workers: int, reload: bool) -> None:
     """
     Runs the server in Production mode with Uvicorn.
     """
+    import uvicorn
+
+    setup_logging()
     if reload:
         logging.warning(
             "You started the server with the --reload option. "
             "This is not recommended for Production."
         )
+    if workers > 1:
+        _prepare_metrics_dir()
+        _use_log_file_per_worker()
     logging.info(f"Launching the server on {host}:{port} with {workers} workers.")
     uvicorn.run(
         "auto_review_tool.main:app",
@@ -36,10 +53,176 @@ def runprod(host: str, port: int, workers: int, reload: bool) -> None:
     )
 
 
+def _prepare_metrics_dir() -> None:
+    """
+    Workers share their metrics through files in PROMETHEUS_MULTIPROC_DIR,
+    which must be set before they start and emptied between runs.
+    """
+    from auto_review_tool.core.metrics import MULTIPROCESS_DIR_ENV
+
+    metrics_dir = os.getenv(MULTIPROCESS_DIR_ENV)
+    if not metrics_dir:
+        metrics_dir = tempfile.mkdtemp(prefix="auto-review-tool-metrics-")
+        os.environ[MULTIPROCESS_DIR_ENV] = metrics_dir
+    for metrics_file in Path(metrics_dir).glob("*.db"):
+        metrics_file.unlink()
+    logging.info(f"Metrics of the workers are collected in {metrics_dir}")
+
+
+def _use_log_file_per_worker() -> None:
+    """
+    Let every worker write and rotate its own log file, e.g. app.1234.log,
+    unless LOG_FILE already contains "{pid}".
+    """
+    if "{pid}" in settings.LOG_FILE:
+        return None
+    stem, extension = os.path.splitext(settings.LOG_FILE)
+    os.environ["LOG_FILE"] = f"{stem}.{{pid}}{extension}"
+    logging.info(f"Workers write their logs to {os.environ['LOG_FILE']}")
+
+
 @cli.command()
 def rundev() -> None:
     """Starts the FastAPI server"""
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import uvicorn
+
+    uvicorn.run("auto_review_tool.main:app", host="0.0.0.0", port=8000)
+
+
+@cli.command()
+@click.option(
+    "--concurrency",
+    default=settings.WORKER_CONCURRENCY,
+    type=int,
+    help="Number of reviews run at the same time",
+)
+def worker(concurrency: int) -> None:
+    """
+    Runs a worker which takes review jobs from the Redis queue.
+    """
+    from auto_review_tool.worker import run_worker
+
+    setup_logging()
+    try:
+        asyncio.run(run_worker(concurrency))
+    except KeyboardInterrupt:
+        logging.info("Worker stopped.")
+
+
+@cli.command()
+@click.argument("repos_file", type=click.File("r"))
+@click.option(
+    "--assignment",
+    "assignment_file",
+    type=click.File("r"),
+    help="File with the description of the assignment",
+)
+@click.option(
+    "--assignment-id",
+    help="Id of a registered assignment, used instead of --assignment",
+)
+@click.option(
+    "--candidate-level",
+    type=click.Choice(["Junior", "Middle", "Senior"]),
+    required=True,
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="JSON Lines file for the results (default: standard output)",
+)
+@click.option(
+    "--concurrency",
+    default=settings.BATCH_MAX_CONCURRENCY,
+    type=int,
+    help="Number of reviews run at the same time",
+)
+def batch(
+        repos_file: IO[str],
+        assignment_file: Optional[IO[str]],
+        assignment_id: Optional[str],
+        candidate_level: str,
+        output: IO[str],
+        concurrency: int,
+) -> None:
+    """
+    Reviews many repositories for one assignment.
+    REPOS_FILE is a JSON Lines file with a {"github_repo_url": ...} object
+    on every line. The result of every repository is written as a line
+    of JSON as soon as its review is finished.
+    """
+    from pydantic import ValidationError
+
+    from auto_review_tool.models.review import BatchReviewRequest
+
+    if (assignment_file is None) == (assignment_id is None):
+        raise click.UsageError("Either --assignment or --assignment-id is required.")
+    try:
+        request = BatchReviewRequest(
+            assignment_description=assignment_file.read() if assignment_file else None,
+            assignment_id=assignment_id,
+            github_repo_urls=_read_repo_urls(repos_file),
+            candidate_level=candidate_level,
+        )
+    except ValidationError as e:
+        raise click.BadParameter(str(e), param_hint="REPOS_FILE")
+    setup_logging()
+    try:
+        failed = asyncio.run(_run_batch(request, output, concurrency))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if failed:
+        raise click.ClickException(f"{failed} reviews failed.")
+
+
+def _read_repo_urls(repos_file: IO[str]) -> List[str]:
+    repo_urls = []
+    for line_number, line in enumerate(repos_file, start=1):
+        if not line.strip():
+            continue
+        try:
+            repo_urls.append(json.loads(line)["github_repo_url"])
+        except (ValueError, KeyError, TypeError):
+            raise click.BadParameter(
+                f"line {line_number} is not a {{\"github_repo_url\": ...}} object",
+                param_hint="REPOS_FILE",
+            )
+    return repo_urls
+
+
+async def _run_batch(
+        request: "BatchReviewRequest",
+        output: IO[str],
+        concurrency: int,
+) -> int:
+    """
+    Run a batch review with the clients of this process.
+    :return: The number of failed reviews.
+    """
+    from auto_review_tool import initialize_auto_review_tool
+    from auto_review_tool.core.redis_client import redis_client
+    from auto_review_tool.core.result_store import result_store
+    from auto_review_tool.core.template_store import template_store
+    from auto_review_tool.services import review as review_service
+
+    initialize_auto_review_tool()
+    await redis_client.connect()
+    await result_store.connect()
+    await template_store.connect()
+    await review_service.connect_clients()
+    failed = 0
+    try:
+        async for item in review_service.run_batch(request, concurrency):
+            failed += item.status == "failed"
+            output.write(item.model_dump_json() + "\n")
+            output.flush()
+    finally:
+        await review_service.close_clients()
+        await template_store.close()
+        await result_store.close()
+        await redis_client.close()
+    return failed
 
 
 if __name__ == "__main__":
@@ -1,131 +1,646 @@
-import base64
+import asyncio
 import logging
+import re
+import tarfile
+import time
 from hashlib import sha256
-from typing import Any, Dict, List, Optional
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from httpx import AsyncClient, HTTPStatusError
+from httpx import AsyncClient, HTTPStatusError, Response
 
+from auto_review_tool.core.cache import cache
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.http_client import PoolStats, create_async_client
+from auto_review_tool.core.metrics import timed_stage
+from auto_review_tool.core.progress import ProgressCallback, report_progress
+from auto_review_tool.core.prompt_planner import is_low_value_path
+from auto_review_tool.core.rate_limit import RateLimitBudget
 from auto_review_tool.core.redis_client import redis_client
+from auto_review_tool.core.single_flight import single_flight
+from auto_review_tool.core.tracing import tracer
+
+# Blobs are downloaded as raw bytes instead of base64 encoded JSON.
+RAW_MEDIA_TYPE = "application/vnd.github.raw+json"
+# Commits are requested as their bare SHA.
+COMMIT_SHA_MEDIA_TYPE = "application/vnd.github.sha"
+# Files with a NUL byte in their beginning are treated as binary.
+BINARY_SNIFF_SIZE = 8000
+# Full commit SHAs are used as they are, without resolving them.
+COMMIT_SHA_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+# Commits of the default branch are resolved through HEAD, so its name
+# does not have to be looked up first.
+DEFAULT_REF = "HEAD"
 
 
 class GitHubClient:
-    def __init__(self, token: str) -> None:
+    def __init__(
+            self,
+            token: Optional[str],
+            base_url: Optional[str] = None,
+            tokens: Optional[List[str]] = None,
+    ) -> None:
+        """
+        :param token: Token for the GitHub API.
+        :param base_url: Base URL of the GitHub API.
+        :param tokens: Pool of tokens used instead of `token`. Requests are
+                       spread between them according to their rate limits.
+        """
         self.token = token
-        self.base_url = "https://api.github.com"
-        self.headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
+        self.tokens = tokens or [token]
+        self.base_url = (base_url or settings.GITHUB_API_URL).rstrip("/")
+        self.headers = {"Accept": "application/vnd.github.v3+json"}
+        self.client: Optional[AsyncClient] = None
+        self.pool_stats = PoolStats(service="github")
+        self.rate_limit = RateLimitBudget(
+            redis_client,
+            self.tokens,
+            reserve=settings.GITHUB_RATE_LIMIT_RESERVE,
+            sync_interval=settings.GITHUB_RATE_LIMIT_SYNC_INTERVAL,
+        )
+
+    async def connect(self) -> None:
+        """Create the HTTP client shared by all requests to GitHub."""
+        if self.client is None:
+            self.client = create_async_client(
+                max_connections=settings.GITHUB_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GITHUB_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.GITHUB_KEEPALIVE_EXPIRY,
+                timeout=settings.GITHUB_TIMEOUT,
+                connect_timeout=settings.GITHUB_CONNECT_TIMEOUT,
+                http2=settings.GITHUB_HTTP2,
+                stats=self.pool_stats,
+                service="github",
+            )
+            logging.info("GitHub HTTP client is created")
+
+    async def close(self) -> None:
+        """Close the shared HTTP client."""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            logging.info(
+                f"GitHub HTTP client closed, "
+                f"pool stats: {self.pool_stats.as_dict()}"
+            )
 
-    async def get_repo_contents(self, repo_url: str) -> List[Dict[str, Any]]:
+    async def _get_client(self) -> AsyncClient:
+        """Return the shared HTTP client, creating it on first use."""
+        if self.client is None:
+            await self.connect()
+        return self.client
+
+    @timed_stage("tree")
+    async def get_repo_contents(
+            self,
+            repo_url: str,
+            commit_sha: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
         """
-        Get the contents of the repository.
+        Get the files of the repository at a commit.
+        Trees are immutable, so the tree SHA of the commit and the files
+        of the tree are cached for settings.REPO_TREE_CACHE_TTL and shared
+        by all requests which resolve to the same commit.
+        Trees which GitHub truncates are completed from their subtrees.
+        Identical concurrent calls share a single request.
         :param repo_url: URL of the repository (e.g., https://github.com/user/repo)
-        :return: List of files and folders in the repository.
+        :param commit_sha: SHA of the commit (result of get_head_commit),
+                           the head of the default branch when None.
+        :return: List of files in the repository, with their blob SHAs.
         """
         logging.info('Getting repo contents...')
-        cache_key = f"repo_contents:{repo_url}"
-        cached_data = await self._get_cached_data(cache_key)
-        if cached_data is not None:
-            return cached_data
+        if commit_sha is None:
+            commit_sha = await self.get_head_commit(repo_url)
+        return await single_flight.do(
+            f"repo_tree:{repo_url}@{commit_sha}",
+            lambda: self._get_repo_contents(repo_url, commit_sha),
+        )
+
+    async def _get_repo_contents(
+            self,
+            repo_url: str,
+            commit_sha: str,
+    ) -> List[Dict[str, Any]]:
+        commit_key = f"commit_tree:{commit_sha}"
+        tree_sha = await self._get_cached_data(commit_key)
+        if tree_sha is not None:
+            files = await self._get_cached_data(f"repo_tree:{tree_sha}")
+            if files is not None:
+                return self._add_blob_urls(repo_url, files)
+
+        owner, repo = self._parse_repo_url(repo_url)
+        semaphore = asyncio.Semaphore(settings.GITHUB_MAX_CONCURRENCY)
+        tree_sha, files = await self._fetch_tree(owner, repo, commit_sha, semaphore)
+        await self._cache_many(
+            {commit_key: tree_sha, f"repo_tree:{tree_sha}": files},
+            expire=settings.REPO_TREE_CACHE_TTL,
+        )
+        return self._add_blob_urls(repo_url, files)
+
+    async def _fetch_tree(
+            self,
+            owner: str,
+            repo: str,
+            tree_ish: str,
+            semaphore: asyncio.Semaphore,
+            prefix: str = "",
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Fetch the files of a tree recursively.
+        GitHub truncates recursive trees of very large repositories, their
+        top level is then fetched alone and their subtrees concurrently.
+        :param tree_ish: SHA of a commit or a tree.
+        :param prefix: Path of the tree in the repository.
+        :return: The SHA of the tree and its files, without their blob URLs.
+        """
+        api_url = f"{self.base_url}/repos/{owner}/{repo}/git/trees/{tree_ish}"
+        async with semaphore:
+            response_data = await self._fetch_data_from_api(f"{api_url}?recursive=1")
+        subtree_files: List[Dict[str, Any]] = []
+        if response_data.get("truncated"):
+            logging.info(
+                f"Tree {prefix or '/'} of {owner}/{repo} is truncated, "
+                f"fetching its subtrees"
+            )
+            async with semaphore:
+                response_data = await self._fetch_data_from_api(api_url)
+            subtrees = await asyncio.gather(
+                *[
+                    self._fetch_tree(
+                        owner, repo, item["sha"], semaphore, f"{prefix}{item['path']}/"
+                    )
+                    for item in response_data.get("tree", [])
+                    if item["type"] == "tree"
+                ]
+            )
+            subtree_files = [item for _sha, files in subtrees for item in files]
+
+        files = [
+            {
+                "path": f"{prefix}{item['path']}",
+                "type": "blob",
+                "sha": item.get("sha"),
+                "size": item.get("size", 0),
+            }
+            for item in response_data.get("tree", [])
+            if item["type"] == "blob"
+        ]
+        return response_data.get("sha") or tree_ish, files + subtree_files
+
+    def _add_blob_urls(
+            self,
+            repo_url: str,
+            files: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Add the API URLs of the blobs of the repository to cached tree files."""
+        return [
+            {**item, "url": self.get_blob_url(repo_url, item["sha"])} for item in files
+        ]
+
+    @timed_stage("head_commit")
+    async def get_head_commit(self, repo_url: str, ref: Optional[str] = None) -> str:
+        """
+        Resolve a branch, tag or commit of the repository to its commit SHA.
+        Only the SHA is requested, and it is revalidated with its ETag,
+        so an unchanged ref costs a 304 response.
+        :param repo_url: URL of the repository (e.g., https://github.com/user/repo)
+        :param ref: Branch, tag or commit SHA, the default branch when None.
+        :return: SHA of the commit.
+        """
+        if ref is not None and COMMIT_SHA_PATTERN.match(ref):
+            return ref
+        ref = ref or DEFAULT_REF
+        cache_key = f"head_commit:{repo_url}@{ref}"
+        cached_commit = await self._get_cached_data(cache_key)
+        headers = {"Accept": COMMIT_SHA_MEDIA_TYPE}
+        if cached_commit is not None and cached_commit.get("etag"):
+            headers["If-None-Match"] = cached_commit["etag"]
 
-        api_url = self._construct_repo_api_url(repo_url)
-        response_data = await self._fetch_data_from_api(api_url)
+        owner, repo = self._parse_repo_url(repo_url)
+        api_url = f"{self.base_url}/repos/{owner}/{repo}/commits/{ref}"
+        response = await self._fetch_response(api_url, headers)
+        if response.status_code == 304:
+            return cached_commit["sha"]
 
-        file_list_tree = response_data.get("tree", [])
-        files = [item for item in file_list_tree if item["type"] == "blob"]
+        commit = {"sha": response.text.strip(), "etag": response.headers.get("etag")}
+        await self._cache_data(cache_key, commit, expire=settings.REPO_TREE_CACHE_TTL)
+        return commit["sha"]
 
-        await self._cache_data(cache_key, files)
-        return files
+    def get_blob_url(self, repo_url: str, blob_sha: str) -> str:
+        """Construct the API URL of a blob of a repository."""
+        owner, repo = self._parse_repo_url(repo_url)
+        return f"{self.base_url}/repos/{owner}/{repo}/git/blobs/{blob_sha}"
 
-    async def get_file_contents(self, files: List[Dict[str, Any]]) -> Dict[str, str]:
+    @timed_stage("blobs")
+    async def get_file_contents(
+            self,
+            files: List[Dict[str, Any]],
+            on_progress: Optional[ProgressCallback] = None,
+    ) -> Dict[str, str]:
         """
-        Get the contents of all files in the repository.
+        Get the contents of all text files in the repository.
+        Identical concurrent calls share a single download.
         :param files: List of files (result of get_repo_contents).
-        :return: Dictionary with file paths and their contents.
+        :param on_progress: Optional callback notified about cache hits
+                            and fetched files.
+        :return: Dictionary with file paths and their contents,
+                 in the same order as the given files.
+                 Skipped files are left out.
         """
         logging.info('Getting file contents...')
-        contents = {}
-        async with AsyncClient() as client:
-            for file_details_dict in files:
-                file_url = file_details_dict["url"]
-                cache_key = (
-                    f"file_content:"
-                    f"{sha256(file_url.encode('utf-8')).hexdigest()}"
-                )
+        cache_keys = [self._get_blob_cache_key(file_details) for file_details in files]
+        flight_key = sha256("".join(cache_keys).encode("utf-8")).hexdigest()
+        return await single_flight.do(
+            f"file_contents:{flight_key}",
+            lambda: self._get_file_contents(files, on_progress),
+        )
 
-                cached_content = await self._get_cached_data(cache_key)
-                if cached_content is not None:
-                    contents[file_details_dict["path"]] = cached_content
-                    continue
+    async def _get_file_contents(
+            self,
+            files: List[Dict[str, Any]],
+            on_progress: Optional[ProgressCallback],
+    ) -> Dict[str, str]:
+        return {
+            path: content
+            async for path, content in self.iter_file_contents(files, on_progress)
+        }
+
+    async def iter_file_contents(
+            self,
+            files: List[Dict[str, Any]],
+            on_progress: Optional[ProgressCallback] = None,
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Stream the contents of the files of the repository, in order.
+        Low-value files and files larger than settings.GITHUB_MAX_FILE_SIZE
+        (according to the tree) are dropped before they are downloaded,
+        binary and non UTF-8 files after.
+        Files are fetched in batches of settings.GITHUB_INGEST_BATCH_SIZE:
+        the cache is checked for the whole batch in one round trip, missing
+        blobs are downloaded concurrently (at most
+        settings.GITHUB_MAX_CONCURRENCY at a time) and written back in one
+        pipeline. Blobs are immutable, so they are cached by their git SHA
+        and shared between all repositories (and forks) with the same file.
+        Ingestion stops after settings.GITHUB_MAX_INGEST_BYTES of content,
+        which bounds the memory used by one review.
+        :param files: List of files (result of get_repo_contents).
+        :param on_progress: Optional callback notified about cache hits
+                            and fetched files.
+        :return: Async iterator of file paths and their contents.
+        """
+        selected = self._select_files(files)
+        semaphore = asyncio.Semaphore(settings.GITHUB_MAX_CONCURRENCY)
+        batch_size = settings.GITHUB_INGEST_BATCH_SIZE
+        done = 0
+        ingested_bytes = 0
+
+        async def download(file_url: str) -> Optional[str]:
+            nonlocal done
+            content = await self._download_file_content(semaphore, file_url)
+            done += 1
+            report_progress(
+                on_progress, "files_fetched", done=done, total=len(selected)
+            )
+            return content
 
-                content = await self._fetch_file_content(client, file_url)
+        for start in range(0, len(selected), batch_size):
+            batch = selected[start:start + batch_size]
+            cache_keys = [self._get_blob_cache_key(item) for item in batch]
+            contents = await self._get_many_cached_data(cache_keys)
+            missing = [
+                index for index, content in enumerate(contents) if content is None
+            ]
+            found = len(batch) - len(missing)
+            done += found
+            logging.info(f"Found {found} of {len(batch)} files in cache")
+            report_progress(on_progress, "cache_hit", source="files", count=found)
+
+            downloaded = await asyncio.gather(
+                *[download(batch[index]["url"]) for index in missing]
+            )
+            to_cache = {}
+            for index, content in zip(missing, downloaded):
+                contents[index] = content
                 if content is not None:
-                    decoded_content = base64.b64decode(content).decode("utf-8")
-                else:
-                    decoded_content = ""
+                    to_cache[cache_keys[index]] = content
+            await self._cache_many(to_cache, expire=settings.BLOB_CACHE_TTL)
+
+            for file_details, content in zip(batch, contents):
+                # Failed downloads are None, skipped blobs are cached as "".
+                if not content:
+                    continue
+                ingested_bytes += len(content)
+                if ingested_bytes > settings.GITHUB_MAX_INGEST_BYTES:
+                    logging.warning(
+                        f"Stopped at {file_details['path']}: more than "
+                        f"{settings.GITHUB_MAX_INGEST_BYTES} bytes of content"
+                    )
+                    return
+                yield file_details["path"], content
+
+    @staticmethod
+    def _select_files(files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop the files which are not worth downloading."""
+        selected = []
+        for file_details in files:
+            path = file_details["path"]
+            if is_low_value_path(path):
+                continue
+            if file_details.get("size", 0) > settings.GITHUB_MAX_FILE_SIZE:
+                logging.debug(f"Skipping {path}: file is too large")
+                continue
+            selected.append(file_details)
+        return selected
+
+    async def _download_file_content(
+            self,
+            semaphore: asyncio.Semaphore,
+            file_url: str,
+    ) -> Optional[str]:
+        """
+        Download and decode a single file, at most N files at a time.
+        :return: The content, "" for binary and non UTF-8 files,
+                 None if the download failed.
+        """
+        async with semaphore:
+            content = await self._fetch_file_content(file_url)
+        if content is None:
+            return None
+        return self._decode_content(file_url, content) or ""
+
+    @staticmethod
+    def _decode_content(path: str, content: bytes) -> Optional[str]:
+        """Decode a text file, return None for binary and non UTF-8 files."""
+        if b"\x00" in content[:BINARY_SNIFF_SIZE]:
+            logging.debug(f"Skipping {path}: binary file")
+            return None
+        try:
+            return content.decode("utf-8")
+        except UnicodeDecodeError:
+            logging.debug(f"Skipping {path}: not a UTF-8 text file")
+            return None
+
+    @staticmethod
+    def _get_blob_cache_key(file_details_dict: Dict[str, Any]) -> str:
+        """Build a content-addressed cache key for a blob of the tree."""
+        blob_sha = file_details_dict.get("sha")
+        if blob_sha:
+            return f"blob:{blob_sha}"
+        file_url = file_details_dict["url"]
+        return f"file_content:{sha256(file_url.encode('utf-8')).hexdigest()}"
+
+    @timed_stage("archive")
+    async def get_archive_contents(
+            self,
+            repo_url: str,
+            commit_sha: Optional[str] = None,
+    ) -> Dict[str, str]:
+        """
+        Get the contents of all files in the repository with a single
+        tarball download instead of one blobs API call per file.
+        :param repo_url: URL of the repository (e.g., https://github.com/user/repo)
+        :param commit_sha: SHA of the commit (result of get_head_commit),
+                           the head of the default branch when None.
+        :return: Dictionary with file paths and their contents.
+        """
+        logging.info('Getting archive contents...')
+        if commit_sha is None:
+            commit_sha = await self.get_head_commit(repo_url)
+        cache_key = f"archive_contents:{repo_url}@{commit_sha}"
+        cached_data = await self._get_cached_data(cache_key)
+        if cached_data is not None:
+            return cached_data
+
+        owner, repo = self._parse_repo_url(repo_url)
+        api_url = f"{self.base_url}/repos/{owner}/{repo}/tarball/{commit_sha}"
+        with SpooledTemporaryFile(
+                max_size=settings.GITHUB_ARCHIVE_SPOOL_SIZE
+        ) as archive:
+            await self._download_archive(api_url, archive)
+            archive.seek(0)
+            contents = await asyncio.to_thread(self._extract_archive, archive)
+
+        await self._cache_data(cache_key, contents)
+        return contents
 
-                contents[file_details_dict["path"]] = decoded_content
-                await self._cache_data(cache_key, decoded_content)
+    async def _download_archive(self, url: str, archive: IO[bytes]) -> None:
+        """Stream a repository archive from the GitHub API into a file."""
+        client = await self._get_client()
+        token = self.rate_limit.pick_token()
+        with tracer.span("github.archive", url=url) as span:
+            async with client.stream(
+                    "GET", url, headers=self._get_headers(token), follow_redirects=True
+            ) as response:
+                span.set_attribute("http.status_code", response.status_code)
+                await self.rate_limit.update(token, response.headers)
+                if response.is_error:
+                    await response.aread()
+                    raise ValueError(
+                        f"Error while requesting GitHub API: "
+                        f"{response.status_code}, {response.text}"
+                    )
+                async for chunk in response.aiter_bytes():
+                    archive.write(chunk)
+                span.set_attribute("size", response.num_bytes_downloaded)
 
+    @staticmethod
+    def _extract_archive(archive: IO[bytes]) -> Dict[str, str]:
+        """
+        Extract text files from a gzipped repository tarball.
+        Low-value, oversized, binary and non UTF-8 files are skipped
+        while extracting, and extraction stops after
+        settings.GITHUB_MAX_INGEST_BYTES of content.
+        """
+        contents = {}
+        ingested_bytes = 0
+        with tarfile.open(fileobj=archive, mode="r|gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                # GitHub puts everything under a "<owner>-<repo>-<sha>/" folder.
+                path = member.name.partition("/")[2]
+                if not path or is_low_value_path(path):
+                    continue
+                if member.size > settings.GITHUB_MAX_FILE_SIZE:
+                    logging.debug(f"Skipping {path}: file is too large")
+                    continue
+                file_object = tar.extractfile(member)
+                if file_object is None:
+                    continue
+                content = GitHubClient._decode_content(path, file_object.read())
+                if content is None:
+                    continue
+                ingested_bytes += len(content)
+                if ingested_bytes > settings.GITHUB_MAX_INGEST_BYTES:
+                    logging.warning(
+                        f"Stopped at {path}: more than "
+                        f"{settings.GITHUB_MAX_INGEST_BYTES} bytes of content"
+                    )
+                    break
+                contents[path] = content
         return contents
 
-    async def is_api_available(self) -> bool:
-        api_url = f"{self.base_url}/rate_limit"
-        response_data = await self._fetch_data_from_api(api_url)
-        remaining_api_usage = response_data.get("rate", {}).get("remaining", 0)
-        return remaining_api_usage > 0
+    async def retry_after(self) -> int:
+        """
+        Check the rate limit budget of the tokens, as recorded from
+        the headers of previous responses by all workers.
+        :return: 0 when the API can be used, otherwise the number of seconds
+                 until the rate limit of the first token is reset.
+        """
+        return await self.rate_limit.retry_after()
+
+    def _get_headers(self, token: Optional[str]) -> Dict[str, str]:
+        """Build the headers of a request made with `token`."""
+        if token is None:
+            return dict(self.headers)
+        return {**self.headers, "Authorization": f"Bearer {token}"}
 
     @staticmethod
     async def _get_cached_data(cache_key: str) -> Optional[Any]:
         """Retrieve data from cache."""
-        if redis_client.is_connected:
-            cached_data = await redis_client.get(cache_key)
-            if cached_data is not None:
-                logging.info(f"Found cached data for {cache_key}")
-                return cached_data
-        return None
+        cached_data = await cache.get(cache_key)
+        if cached_data is not None:
+            logging.debug(f"Found cached data for {cache_key}")
+        return cached_data
 
     @staticmethod
     async def _cache_data(cache_key: str, data: Any, expire: int = 3600) -> None:
-        """Cache data in Redis."""
-        if redis_client.is_connected:
-            await redis_client.set(cache_key, data, expire=expire)
-            logging.info(f"Cached data for {cache_key}")
+        """Cache data in the local cache and in Redis."""
+        await cache.set(cache_key, data, expire=expire)
+        logging.debug(f"Cached data for {cache_key}")
 
-    def _construct_repo_api_url(self, repo_url: str) -> str:
-        """Construct the API URL for a repository."""
+    @staticmethod
+    async def _get_many_cached_data(cache_keys: List[str]) -> List[Optional[Any]]:
+        """Retrieve many values from cache in a single round trip."""
+        return await cache.mget(cache_keys)
+
+    @staticmethod
+    async def _cache_many(mapping: Dict[str, Any], expire: int = 3600) -> None:
+        """Cache many values, using a single Redis pipeline."""
+        if mapping:
+            await cache.mset(mapping, expire=expire)
+            logging.info(f"Cached {len(mapping)} values")
+
+    @staticmethod
+    def _parse_repo_url(repo_url: str) -> Tuple[str, str]:
+        """Extract the owner and the name of a repository from its URL."""
         parts = repo_url.rstrip("/").split("/")
         try:
             repo = parts.pop()
             owner = parts.pop()
         except IndexError:
             raise ValueError(f"Invalid repository URL: {repo_url}")
-        return f"{self.base_url}/repos/{owner}/{repo}/git/trees/master?recursive=1"
+        return owner, repo
 
     async def _fetch_data_from_api(self, url: str) -> dict:
         """Fetch data from the GitHub API."""
-        async with AsyncClient() as client:
+        response = await self._fetch_response(url)
+        return response.json()
+
+    async def _fetch_response(
+            self,
+            url: str,
+            headers: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        """
+        Send a GET request to the GitHub API with the token which has
+        the most remaining requests, and record its rate limit.
+        304 Not Modified responses of conditional requests are returned as is.
+        :param headers: Headers sent in addition to the default ones.
+        """
+        client = await self._get_client()
+        token = self.rate_limit.pick_token()
+        with tracer.span("github.request", url=url) as span:
             try:
-                response = await client.get(url, headers=self.headers)
+                response = await client.get(
+                    url, headers={**self._get_headers(token), **(headers or {})}
+                )
+                span.set_attribute("http.status_code", response.status_code)
+                await self.rate_limit.update(token, response.headers)
+                if response.status_code == 304:
+                    return response
                 response.raise_for_status()
-                return response.json()
+                return response
             except HTTPStatusError as e:
                 raise ValueError(
                     f"Error while requesting GitHub API: "
                     f"{e.response.status_code}, {e.response.text}"
                 )
 
-    async def _fetch_file_content(
-            self,
-            client: AsyncClient,
-            file_url: str
-    ) -> Optional[str]:
-        """Fetch the content of a single file from GitHub."""
-        try:
-            response = await client.get(file_url, headers=self.headers)
-            response.raise_for_status()
-            return response.json().get("content")
-        except Exception as e:
-            logging.error(f"Failed to get file content from {file_url}: {e}")
+    async def _fetch_file_content(self, file_url: str) -> Optional[bytes]:
+        """
+        Fetch the raw content of a single file from GitHub.
+        Requests hitting GitHub's (secondary) rate limits are retried
+        with a backoff instead of failing the whole batch. When the token
+        ran out of requests, another token of the pool is used right away.
+        """
+        client = await self._get_client()
+        with tracer.span("github.blob", url=file_url) as span:
+            try:
+                for attempt in range(settings.GITHUB_MAX_RETRIES + 1):
+                    span.set_attribute("attempts", attempt + 1)
+                    token = self.rate_limit.pick_token()
+                    response = await client.get(
+                        file_url,
+                        headers={**self._get_headers(token), "Accept": RAW_MEDIA_TYPE},
+                    )
+                    span.set_attribute("http.status_code", response.status_code)
+                    await self.rate_limit.update(token, response.headers)
+                    if (
+                            self._is_rate_limited(response)
+                            and attempt < settings.GITHUB_MAX_RETRIES
+                    ):
+                        if (
+                                len(self.tokens) > 1
+                                and response.headers.get("x-ratelimit-remaining") == "0"
+                                and await self.rate_limit.retry_after() == 0
+                        ):
+                            logging.warning(
+                                f"Token ran out of requests while fetching "
+                                f"{file_url}, retrying with another token"
+                            )
+                            continue
+                        delay = self._get_backoff_delay(response, attempt)
+                        logging.warning(
+                            f"Rate limited while fetching {file_url}, "
+                            f"retrying in {delay:.1f}s"
+                        )
+                        await asyncio.sleep(delay)
+                        continue
+                    response.raise_for_status()
+                    span.set_attribute("size", len(response.content))
+                    return response.content
+            except Exception as e:
+                span.set_attribute("error", str(e))
+                logging.error(f"Failed to get file content from {file_url}: {e}")
             return None
+
+    @staticmethod
+    def _is_rate_limited(response: Response) -> bool:
+        """Check whether GitHub rejected the request because of rate limits."""
+        if response.status_code == 429:
+            return True
+        if response.status_code != 403:
+            return False
+        return (
+            "retry-after" in response.headers
+            or response.headers.get("x-ratelimit-remaining") == "0"
+            or "rate limit" in response.text.lower()
+        )
+
+    @staticmethod
+    def _get_backoff_delay(response: Response, attempt: int) -> float:
+        """
+        Compute how long to wait before retrying a rate-limited request.
+        Honors Retry-After and X-RateLimit-Reset, otherwise backs off
+        exponentially.
+        """
+        retry_after = response.headers.get("retry-after")
+        reset = response.headers.get("x-ratelimit-reset")
+        if retry_after is not None and retry_after.isdigit():
+            delay = float(retry_after)
+        elif response.headers.get("x-ratelimit-remaining") == "0" and reset:
+            delay = float(reset) - time.time()
+        else:
+            delay = settings.GITHUB_BACKOFF_BASE * 2 ** attempt
+        return min(max(delay, 0.0), settings.GITHUB_MAX_BACKOFF)
@@ -1,41 +1,130 @@
+import asyncio
 import logging
 from collections.abc import Buffer
 from hashlib import sha256
-from typing import List
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
 
-from openai import OpenAI
+from auto_review_tool.core.cache import cache
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.http_client import PoolStats, create_async_client
+from auto_review_tool.core.metrics import OPENAI_TOKENS, time_stage, timed_stage
+from auto_review_tool.core.progress import ProgressCallback, report_progress
+from auto_review_tool.core.prompt_planner import plan_prompt
+from auto_review_tool.core.single_flight import single_flight
+from auto_review_tool.core.tracing import tracer
 
-from auto_review_tool.core.redis_client import redis_client
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from openai.types import CompletionUsage
+
+# What is expected of candidates of every level, part of the prompt prefix.
+LEVEL_RUBRICS = {
+    "Junior": (
+        "Expect working and readable code. Explain the mistakes "
+        "and do not penalize the lack of advanced patterns."
+    ),
+    "Middle": (
+        "Expect a clear structure, error handling and tests. "
+        "Point out design flaws and missed edge cases."
+    ),
+    "Senior": (
+        "Expect production-ready code. Be strict about architecture, "
+        "performance, security, testing and maintainability."
+    ),
+}
 
 
 class OpenAIClient:
-    def __init__(self, api_key: str) -> None:
+    def __init__(self, api_key: str, base_url: Optional[str] = None) -> None:
         """
         Initializing the OpenAI client.
         :param api_key: OpenAI API key.
+        :param base_url: OpenAI API URL, defaults to settings.OPENAI_BASE_URL.
         """
-        self.client = OpenAI(api_key=api_key)
+        self.api_key = api_key
+        self.base_url = base_url or settings.OPENAI_BASE_URL
+        self.client: Optional["AsyncOpenAI"] = None
+        self.pool_stats = PoolStats(service="openai")
+
+    async def connect(self) -> None:
+        """Create the async OpenAI client with its own connection pool."""
+        if self.client is None:
+            # openai is the slowest import of the application, so it is
+            # only imported by processes which use it.
+            from openai import AsyncOpenAI
+
+            http_client = create_async_client(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+                timeout=settings.OPENAI_TIMEOUT,
+                connect_timeout=settings.OPENAI_CONNECT_TIMEOUT,
+                http2=False,
+                stats=self.pool_stats,
+                service="openai",
+            )
+            self.client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=settings.OPENAI_MAX_RETRIES,
+                http_client=http_client,
+            )
+            logging.info("OpenAI client is created")
+
+    async def close(self) -> None:
+        """Close the OpenAI client and its connections."""
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+            logging.info(
+                f"OpenAI client closed, pool stats: {self.pool_stats.as_dict()}"
+            )
+
+    async def _get_client(self) -> "AsyncOpenAI":
+        """Return the OpenAI client, creating it on first use."""
+        if self.client is None:
+            await self.connect()
+        return self.client
 
     @staticmethod
-    def __get_formatted_prompt(
-            file_names: list[str],
-            file_contents: list[str],
+    def __get_prompt_prefix(
             assignment_description: str,
-            candidate_level: str
+            candidate_level: str,
+            rubric: Optional[str] = None,
     ) -> str:
-        prompt = f"""You are a coding reviewer for {candidate_level}-level developers.
-Please review the following coding assignment:
+        """
+        The system message, which is the same in every prompt of reviews
+        of one assignment and level. Providers cache such common prefixes,
+        so they are billed and processed once for a whole cohort.
+        """
+        prefix = f"""You are a coding reviewer for {candidate_level}-level developers.
+{LEVEL_RUBRICS[candidate_level]}
+
 Assignment Description:
 
 {assignment_description}
 
-Analyze the code files and provide feedback on the following:
+"""
+        if rubric:
+            prefix += f"Rubric of the assignment:\n\n{rubric}\n\n"
+        prefix += """Analyze the code and provide feedback on the following:
 - Code quality
 - Possible improvements
 - Any bugs or issues
 
-Here are the contents of the files:
-"""
+Summarize a review of the whole assignment in the following format:
+- Downsides/Comments:
+- Rating (1 to 5):
+- Conclusion:"""
+        return prefix
+
+    @staticmethod
+    def __get_formatted_prompt(
+            file_names: list[str],
+            file_contents: list[str],
+            skipped_files: Optional[list[str]] = None,
+    ) -> str:
+        prompt = "Here are the contents of the files:\n"
         files_content = "".join(
             [
                 f"File: {name}\nContent: {content}\n\n"
@@ -43,64 +132,394 @@ Here are the contents of the files:
             ]
         )
         prompt += files_content
-        prompt += """Please summarize your analysis in the following format:
-- Downsides/Comments:
-- Rating (1 to 5):
-- Conclusion:"""
+        if skipped_files:
+            prompt += (
+                "These files were not included (lockfiles, vendored, "
+                f"generated or binary files): {', '.join(skipped_files)}\n\n"
+            )
+        prompt += "Please review the assignment and summarize your analysis."
+        return prompt
+
+    @staticmethod
+    def __get_chunk_prompt(
+            chunk: Dict[str, str],
+            chunk_number: int,
+            chunks_count: int,
+    ) -> str:
+        prompt = f"""The coding assignment is too large to be reviewed at once,
+this is part {chunk_number} of {chunks_count} of its files.
+Here are the contents of the files:
+"""
+        prompt += "".join(
+            [f"File: {name}\nContent: {content}\n\n" for name, content in chunk.items()]
+        )
+        prompt += (
+            "Do not give a rating or a summary, "
+            "only list the findings for these files concisely."
+        )
+        return prompt
+
+    @staticmethod
+    def __get_reduce_prompt(
+            partial_reviews: List[str],
+            skipped_files: List[str],
+    ) -> str:
+        prompt = (
+            f"The files of the assignment were reviewed in {len(partial_reviews)} "
+            "parts.\nHere are the reviews of the parts:\n"
+        )
+        prompt += "".join(
+            [
+                f"Part {number}:\n{review}\n\n"
+                for number, review in enumerate(partial_reviews, start=1)
+            ]
+        )
+        if skipped_files:
+            prompt += (
+                "These files were not included (lockfiles, vendored, "
+                f"generated or binary files): {', '.join(skipped_files)}\n\n"
+            )
+        prompt += (
+            "Merge them into one review of the whole assignment "
+            "and summarize your analysis."
+        )
         return prompt
 
+    @staticmethod
+    def __get_changes_prompt(
+            previous_analysis: str,
+            diffs: Dict[str, str],
+            removed_files: List[str],
+            skipped_files: List[str],
+    ) -> str:
+        prompt = f"""You have already reviewed the assignment.
+Your previous review:
+
+{previous_analysis}
+
+Since then the candidate has changed the code.
+Here are the changes as unified diffs:
+"""
+        prompt += "".join(
+            [f"File: {name}\nDiff:\n{diff}\n\n" for name, diff in diffs.items()]
+        )
+        if removed_files:
+            prompt += f"Removed files: {', '.join(removed_files)}\n\n"
+        if skipped_files:
+            prompt += (
+                "Changes of these files were not included: "
+                f"{', '.join(skipped_files)}\n\n"
+            )
+        prompt += (
+            "Update your review to take the changes into account "
+            "and summarize your analysis."
+        )
+        return prompt
+
+    @timed_stage("analysis")
     async def analyze_code(
             self,
             file_names: List[str],
             file_contents: List[str],
             assignment_description: str,
-            candidate_level: str
+            candidate_level: str,
+            rubric: Optional[str] = None,
     ) -> str:
         """
         Analyzes code using the OpenAI API.
+        Low-value files are left out of the prompt. When the code does not
+        fit into one prompt, its chunks are reviewed separately (map) and
+        the partial reviews are merged into the final summary (reduce).
+        Identical concurrent calls share a single completion.
         :param file_names: List of file names.
         :param file_contents: List of file contents.
         :param assignment_description: Description of the assignment.
         :param candidate_level: Candidate level (Junior, Middle, Senior).
+        :param rubric: Review criteria of the assignment.
         :return: Analysis result.
         """
         logging.info('Analyzing code...')
-        cache_string: str = (
-                ''.join(file_names) + ''.join(file_contents) +
-                assignment_description + candidate_level
-        )
-        cache_string_encoded: Buffer = cache_string.encode('utf-8')
-        cache_key = (
-            f"code_analysis:"
-            f"{sha256(cache_string_encoded).hexdigest()}"
-        )
-        if redis_client.is_connected:
-            cached_analysis = await redis_client.get(cache_key)
-            if cached_analysis:
-                logging.info('Found cached data for "analyze_code"')
-                return cached_analysis
-
-        prompt = self.__get_formatted_prompt(
+        prefix = self.__get_prompt_prefix(
+            assignment_description, candidate_level, rubric
+        )
+        cache_key = self._get_cache_key(
+            "code_analysis", prefix, [*file_names, *file_contents]
+        )
+        return await single_flight.do(
+            cache_key,
+            lambda: self._analyze_code(cache_key, prefix, file_names, file_contents),
+        )
+
+    async def _analyze_code(
+            self,
+            cache_key: str,
+            prefix: str,
+            file_names: List[str],
+            file_contents: List[str],
+    ) -> str:
+        cached_analysis = await cache.get(cache_key)
+        if cached_analysis:
+            logging.info('Found cached data for "analyze_code"')
+            return cached_analysis
+
+        try:
+            prompt = await self._build_prompt(prefix, file_names, file_contents)
+            analysis = await self._complete(prefix, prompt)
+
+            logging.info('Caching data for "analyze_code"')
+            await cache.set(cache_key, analysis, expire=86400)
+            return analysis
+        except Exception as e:
+            raise ValueError(f"Error while requesting OpenAI API: {str(e)}")
+
+    async def stream_analyze_code(
+            self,
+            file_names: List[str],
+            file_contents: List[str],
+            assignment_description: str,
+            candidate_level: str,
+            rubric: Optional[str] = None,
+            on_progress: Optional[ProgressCallback] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Same as analyze_code, but yields the analysis piece by piece
+        as the completion is generated. The full analysis is cached
+        once the completion is finished.
+        """
+        logging.info('Analyzing code (streaming)...')
+        prefix = self.__get_prompt_prefix(
+            assignment_description, candidate_level, rubric
+        )
+        cache_key = self._get_cache_key(
+            "code_analysis", prefix, [*file_names, *file_contents]
+        )
+        cached_analysis = await cache.get(cache_key)
+        if cached_analysis:
+            logging.info('Found cached data for "analyze_code"')
+            report_progress(on_progress, "cache_hit", source="analysis")
+            yield cached_analysis
+            return
+
+        try:
+            with time_stage("analysis"):
+                prompt = await self._build_prompt(
+                    prefix, file_names, file_contents, on_progress
+                )
+                report_progress(on_progress, "analysis_started")
+                parts = []
+                async for part in self._stream_complete(prefix, prompt):
+                    parts.append(part)
+                    yield part
+        except Exception as e:
+            raise ValueError(f"Error while requesting OpenAI API: {str(e)}")
+
+        logging.info('Caching data for "analyze_code"')
+        await cache.set(cache_key, "".join(parts), expire=86400)
+
+    @staticmethod
+    def _get_cache_key(name: str, prefix: str, parts: List[str]) -> str:
+        """
+        Key of a cached completion: the hash of its prompt prefix followed
+        by the hash of the rest of the prompt. Parts are hashed with their
+        lengths, so that e.g. moving text from a file name to its content
+        changes the key.
+        """
+        parts_hash = sha256()
+        for part in parts:
+            encoded: Buffer = part.encode('utf-8')
+            parts_hash.update(len(encoded).to_bytes(8, "big"))
+            parts_hash.update(encoded)
+        prefix_hash = sha256(prefix.encode('utf-8')).hexdigest()[:16]
+        return f"{name}:{prefix_hash}:{parts_hash.hexdigest()}"
+
+    async def _build_prompt(
+            self,
+            prefix: str,
+            file_names: List[str],
+            file_contents: List[str],
+            on_progress: Optional[ProgressCallback] = None,
+    ) -> str:
+        """
+        Build the prompt of the final completion, which follows the prefix.
+        Large code is reviewed in chunks first, and the final prompt
+        asks to merge the reviews of the chunks.
+        """
+        plan = plan_prompt(
             file_names,
             file_contents,
-            assignment_description,
-            candidate_level,
+            max_chunk_tokens=settings.OPENAI_MAX_PROMPT_TOKENS,
+            max_file_tokens=settings.OPENAI_MAX_FILE_TOKENS,
+            max_chunks=settings.OPENAI_MAX_CHUNKS,
+        )
+        if len(plan.chunks) <= 1:
+            chunk = plan.chunks[0] if plan.chunks else {}
+            return self.__get_formatted_prompt(
+                list(chunk.keys()),
+                list(chunk.values()),
+                plan.skipped,
+            )
+
+        report_progress(on_progress, "chunks_review_started", count=len(plan.chunks))
+        partial_reviews = await self._review_chunks(prefix, plan.chunks)
+        return self.__get_reduce_prompt(partial_reviews, plan.skipped)
+
+    @timed_stage("analysis_changes")
+    async def analyze_changes(
+            self,
+            previous_analysis: str,
+            diffs: Dict[str, str],
+            removed_files: List[str],
+            assignment_description: str,
+            candidate_level: str,
+            rubric: Optional[str] = None,
+    ) -> str:
+        """
+        Updates a previous review with the changes made since then.
+        :param previous_analysis: Result of the previous review.
+        :param diffs: Unified diffs of the changed files by their paths.
+        :param removed_files: Paths of the removed files.
+        :param assignment_description: Description of the assignment.
+        :param candidate_level: Candidate level (Junior, Middle, Senior).
+        :param rubric: Review criteria of the assignment.
+        :return: Analysis result.
+        """
+        logging.info('Analyzing code changes...')
+        prefix = self.__get_prompt_prefix(
+            assignment_description, candidate_level, rubric
+        )
+        cache_key = self._get_cache_key(
+            "changes_analysis",
+            prefix,
+            [previous_analysis, *diffs.keys(), *diffs.values(), *removed_files],
+        )
+        return await single_flight.do(
+            cache_key,
+            lambda: self._analyze_changes(
+                cache_key, prefix, previous_analysis, diffs, removed_files
+            ),
+        )
+
+    async def _analyze_changes(
+            self,
+            cache_key: str,
+            prefix: str,
+            previous_analysis: str,
+            diffs: Dict[str, str],
+            removed_files: List[str],
+    ) -> str:
+        cached_analysis = await cache.get(cache_key)
+        if cached_analysis:
+            logging.info('Found cached data for "analyze_changes"')
+            return cached_analysis
+
+        plan = plan_prompt(
+            list(diffs.keys()),
+            list(diffs.values()),
+            max_chunk_tokens=settings.OPENAI_MAX_PROMPT_TOKENS,
+            max_file_tokens=settings.OPENAI_MAX_FILE_TOKENS,
+            max_chunks=1,
+        )
+        prompt = self.__get_changes_prompt(
+            previous_analysis,
+            plan.chunks[0] if plan.chunks else {},
+            removed_files,
+            plan.skipped,
         )
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a coding reviewer."},
-                    {"role": "user", "content": prompt},
-                ],
+            analysis = await self._complete(prefix, prompt)
+        except Exception as e:
+            raise ValueError(f"Error while requesting OpenAI API: {str(e)}")
+
+        logging.info('Caching data for "analyze_changes"')
+        await cache.set(cache_key, analysis, expire=86400)
+        return analysis
+
+    async def _review_chunks(
+            self,
+            prefix: str,
+            chunks: List[Dict[str, str]],
+    ) -> List[str]:
+        """
+        Review every chunk separately, a few chunks at a time.
+        Reviews of chunks are cached, so after a change of a large
+        repository only the chunks with changed files are reviewed again.
+        """
+        logging.info(f"Reviewing code in {len(chunks)} chunks...")
+        semaphore = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENT_CHUNKS)
+
+        async def review_chunk(chunk_number: int, chunk: Dict[str, str]) -> str:
+            prompt = self.__get_chunk_prompt(chunk, chunk_number, len(chunks))
+            cache_key = self._get_cache_key("chunk_review", prefix, [prompt])
+            cached_review = await cache.get(cache_key)
+            if cached_review:
+                logging.debug(f"Found cached review of chunk {chunk_number}")
+                return cached_review
+            async with semaphore:
+                review = await self._complete(prefix, prompt)
+            await cache.set(cache_key, review, expire=86400)
+            return review
+
+        return await asyncio.gather(
+            *[
+                review_chunk(chunk_number, chunk)
+                for chunk_number, chunk in enumerate(chunks, start=1)
+            ]
+        )
+
+    async def _complete(self, prefix: str, prompt: str) -> str:
+        """Send a prompt after its prefix to the chat completions API."""
+        client = await self._get_client()
+        with tracer.span("openai.completion", model=settings.OPENAI_MODEL) as span:
+            response = await client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=self._get_messages(prefix, prompt),
                 max_tokens=2000,
                 temperature=0.5
             )
-            analysis = response.choices[0].message.content
+            self._record_usage(response.usage, span)
+        return response.choices[0].message.content
 
-            if redis_client.is_connected:
-                logging.info('Caching data for "analyze_code"')
-                await redis_client.set(cache_key, analysis, expire=86400)
-            return analysis
-        except Exception as e:
-            raise ValueError(f"Error while requesting OpenAI API: {str(e)}")
+    async def _stream_complete(self, prefix: str, prompt: str) -> AsyncIterator[str]:
+        """
+        Send a prompt after its prefix to the chat completions API
+        and stream the answer.
+        """
+        client = await self._get_client()
+        with tracer.span(
+                "openai.completion", model=settings.OPENAI_MODEL, stream=True
+        ) as span:
+            stream = await client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=self._get_messages(prefix, prompt),
+                max_tokens=2000,
+                temperature=0.5,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                # The usage comes in a last chunk without choices.
+                self._record_usage(chunk.usage, span)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    @staticmethod
+    def _record_usage(usage: Optional["CompletionUsage"], span: Any) -> None:
+        if usage is None:
+            return None
+        OPENAI_TOKENS.labels(type="prompt").inc(usage.prompt_tokens)
+        OPENAI_TOKENS.labels(type="completion").inc(usage.completion_tokens)
+        span.set_attribute("prompt_tokens", usage.prompt_tokens)
+        span.set_attribute("completion_tokens", usage.completion_tokens)
+        # Prompt tokens of a prefix which the provider had cached.
+        details = usage.prompt_tokens_details
+        if details is not None and details.cached_tokens:
+            OPENAI_TOKENS.labels(type="cached").inc(details.cached_tokens)
+            span.set_attribute("cached_tokens", details.cached_tokens)
+
+    @staticmethod
+    def _get_messages(prefix: str, prompt: str) -> List[Dict[str, str]]:
+        # The prefix comes first, so that it is cached by the provider.
+        return [
+            {"role": "system", "content": prefix},
+            {"role": "user", "content": prompt},
+        ]
@@ -0,0 +1,363 @@
+import asyncio
+import logging
+import math
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.metrics import ADMISSIONS
+from auto_review_tool.core.redis_client import RedisClient, redis_client
+
+ADMITTED = 0
+# The limits of the client are exceeded (429 Too Many Requests).
+CLIENT_LIMITED = 1
+# The limits of the whole service are exceeded (503 Service Unavailable).
+OVERLOADED = 2
+# Buckets of clients kept by a worker without Redis.
+MAX_LOCAL_BUCKETS = 10000
+
+# Checks the in-flight caps and the token buckets of the service and of the
+# client, and only takes a token and a slot when all of them allow it.
+# Buckets are hashes of their tokens and the time they were updated at,
+# slots are sorted sets of tokens scored by the expiry of their leases.
+# Returns the decision and the milliseconds to wait before retrying.
+ADMIT_SCRIPT = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local client_rate, client_burst = tonumber(ARGV[3]), tonumber(ARGV[4])
+local max_in_flight, client_max_in_flight = tonumber(ARGV[5]), tonumber(ARGV[6])
+local slot, lease = ARGV[7], tonumber(ARGV[8])
+local average = tonumber(redis.call("GET", KEYS[5]) or "1000")
+
+local function in_flight(key)
+    redis.call("ZREMRANGEBYSCORE", key, "-inf", now)
+    return redis.call("ZCARD", key)
+end
+
+local function tokens(key, rate, burst)
+    local state = redis.call("HMGET", key, "tokens", "updated_at")
+    local available = tonumber(state[1]) or burst
+    local elapsed = now - (tonumber(state[2]) or now)
+    return math.min(burst, available + elapsed * rate / 1000)
+end
+
+if client_max_in_flight > 0 then
+    local count = in_flight(KEYS[4])
+    if count >= client_max_in_flight then
+        return {1, math.ceil(average / count)}
+    end
+end
+if max_in_flight > 0 then
+    local count = in_flight(KEYS[3])
+    if count >= max_in_flight then
+        return {2, math.ceil(average / count)}
+    end
+end
+local client_tokens, global_tokens
+if client_rate > 0 then
+    client_tokens = tokens(KEYS[2], client_rate, client_burst)
+    if client_tokens < 1 then
+        return {1, math.ceil((1 - client_tokens) * 1000 / client_rate)}
+    end
+end
+if rate > 0 then
+    global_tokens = tokens(KEYS[1], rate, burst)
+    if global_tokens < 1 then
+        return {2, math.ceil((1 - global_tokens) * 1000 / rate)}
+    end
+end
+
+if client_tokens then
+    redis.call("HSET", KEYS[2], "tokens", client_tokens - 1, "updated_at", now)
+    redis.call("PEXPIRE", KEYS[2], math.ceil(client_burst * 1000 / client_rate))
+end
+if global_tokens then
+    redis.call("HSET", KEYS[1], "tokens", global_tokens - 1, "updated_at", now)
+    redis.call("PEXPIRE", KEYS[1], math.ceil(burst * 1000 / rate))
+end
+for _, key in ipairs({KEYS[3], KEYS[4]}) do
+    redis.call("ZADD", key, now + lease, slot)
+    redis.call("PEXPIRE", key, lease)
+end
+return {0, 0}
+"""
+RENEW_SLOT_SCRIPT = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+for _, key in ipairs(KEYS) do
+    redis.call("ZADD", key, "XX", now + tonumber(ARGV[2]), ARGV[1])
+    redis.call("PEXPIRE", key, ARGV[2])
+end
+return 1
+"""
+# Frees the slot and updates the moving average of the review duration,
+# which estimates when the next slot is freed.
+RELEASE_SLOT_SCRIPT = """
+redis.call("ZREM", KEYS[1], ARGV[1])
+redis.call("ZREM", KEYS[2], ARGV[1])
+local duration = tonumber(ARGV[2])
+local average = tonumber(redis.call("GET", KEYS[3]) or ARGV[2])
+redis.call("SET", KEYS[3], math.floor(average * 0.9 + duration * 0.1), "EX", 86400)
+return 1
+"""
+
+
+class AdmissionRejected(Exception):
+    """A review was not admitted, it can be retried after `retry_after` seconds."""
+
+    def __init__(self, status_code: int, retry_after: float) -> None:
+        super().__init__(status_code, retry_after)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    def __str__(self) -> str:
+        if self.status_code == 429:
+            return "Too many review requests of this client."
+        return "The service is handling too many reviews."
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """Token bucket of a single worker, used while Redis is not available."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> float:
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated_at = max(now, self.updated_at)
+        return self.tokens
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available."""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class AdmissionController:
+    """
+    Admission control of expensive reviews, shared by the workers through
+    Redis: token buckets limit how many reviews start per second, for the
+    whole service and for every client, and in-flight caps limit how many
+    of them run at the same time. Rejected reviews either wait for up to
+    `max_wait` seconds, or are answered at once with the time after which
+    they can be retried. Without Redis, the limits apply to every worker.
+    Rates and caps of 0 disable the limit.
+    """
+
+    def __init__(
+            self,
+            redis: RedisClient,
+            rate: float,
+            burst: float,
+            client_rate: float,
+            client_burst: float,
+            max_in_flight: int,
+            client_max_in_flight: int,
+            max_wait: float,
+            lease: float,
+    ) -> None:
+        self.redis = redis
+        self.rate = rate
+        self.burst = burst
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_in_flight = max_in_flight
+        self.client_max_in_flight = client_max_in_flight
+        self.max_wait = max_wait
+        self.lease = lease
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Dict[str, int] = {}
+        # Slots taken while Redis was not available.
+        self._local_slots: Set[str] = set()
+        self._average_duration = 1.0
+
+    def admit(self, client_id: str, max_wait: Optional[float] = None) -> "Admission":
+        """
+        Admission of a review of the client, entered right before
+        the review starts and left when it is finished.
+        :param max_wait: Seconds the review may wait (default: self.max_wait).
+        """
+        return Admission(
+            self, client_id, self.max_wait if max_wait is None else max_wait
+        )
+
+    async def try_admit(self, client_id: str, slot: str) -> Tuple[int, float]:
+        """
+        Take a token and a slot for a review, if the limits allow it.
+        Without Redis, or when its reply is not understood, the limits
+        of this worker are applied instead.
+        :return: The decision and the seconds to wait before retrying.
+        """
+        result = await self.redis.run_script(
+            ADMIT_SCRIPT,
+            self._get_keys(client_id) + [self._get_key("duration")],
+            [
+                self.rate,
+                self.burst,
+                self.client_rate,
+                self.client_burst,
+                self.max_in_flight,
+                self.client_max_in_flight,
+                slot,
+                int(self.lease * 1000),
+            ],
+        )
+        if isinstance(result, list) and len(result) == 2:
+            decision, retry_after_ms = result
+            return int(decision), int(retry_after_ms) / 1000
+        if result is not None:
+            logging.error(f"Unexpected reply of the admission script: {result!r}")
+        decision, retry_after = self._try_admit_locally(client_id)
+        if decision == ADMITTED:
+            self._local_slots.add(slot)
+        return decision, retry_after
+
+    async def renew(self, client_id: str, slot: str) -> None:
+        if slot in self._local_slots:
+            return None
+        await self.redis.run_script(
+            RENEW_SLOT_SCRIPT,
+            self._get_keys(client_id)[2:],
+            [slot, int(self.lease * 1000)],
+        )
+
+    async def release(self, client_id: str, slot: str, duration: float) -> None:
+        if slot in self._local_slots:
+            self._local_slots.discard(slot)
+            self._release_locally(client_id, duration)
+            return None
+        keys = self._get_keys(client_id)[2:] + [self._get_key("duration")]
+        await self.redis.run_script(
+            RELEASE_SLOT_SCRIPT, keys, [slot, int(duration * 1000)]
+        )
+
+    def _get_key(self, name: str) -> str:
+        return f"admission:{name}"
+
+    def _get_keys(self, client_id: str) -> List[str]:
+        return [
+            self._get_key("tokens"),
+            self._get_key(f"tokens:{client_id}"),
+            self._get_key("slots"),
+            self._get_key(f"slots:{client_id}"),
+        ]
+
+    def _try_admit_locally(self, client_id: str) -> Tuple[int, float]:
+        now = time.monotonic()
+        client_in_flight = self._in_flight.get(client_id, 0)
+        in_flight = self._in_flight.get("", 0)
+        if 0 < self.client_max_in_flight <= client_in_flight:
+            return CLIENT_LIMITED, self._average_duration / client_in_flight
+        if 0 < self.max_in_flight <= in_flight:
+            return OVERLOADED, self._average_duration / in_flight
+
+        buckets = []
+        if self.client_rate > 0:
+            bucket = self._get_bucket(client_id, self.client_rate, self.client_burst)
+            buckets.append((CLIENT_LIMITED, bucket))
+        if self.rate > 0:
+            buckets.append((OVERLOADED, self._get_bucket("", self.rate, self.burst)))
+        for decision, bucket in buckets:
+            if bucket.refill(now) < 1:
+                return decision, bucket.wait_time()
+        for _, bucket in buckets:
+            bucket.tokens -= 1
+        self._in_flight[client_id] = client_in_flight + 1
+        self._in_flight[""] = in_flight + 1
+        return ADMITTED, 0.0
+
+    def _get_bucket(self, client_id: str, rate: float, burst: float) -> TokenBucket:
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            if len(self._buckets) >= MAX_LOCAL_BUCKETS:
+                # Full buckets are the same as new ones, so they are dropped.
+                now = time.monotonic()
+                self._buckets = {
+                    key: bucket
+                    for key, bucket in self._buckets.items()
+                    if bucket.refill(now) < bucket.burst
+                }
+            bucket = self._buckets[client_id] = TokenBucket(rate, burst)
+        return bucket
+
+    def _release_locally(self, client_id: str, duration: float) -> None:
+        for key in (client_id, ""):
+            self._in_flight[key] = max(0, self._in_flight.get(key, 0) - 1)
+            if not self._in_flight[key]:
+                del self._in_flight[key]
+        self._average_duration = self._average_duration * 0.9 + duration * 0.1
+
+
+class Admission:
+    """
+    Holds a slot of the admission controller while a review runs.
+    Its lease is renewed, so the slots of crashed workers are freed.
+    """
+
+    def __init__(
+            self,
+            controller: AdmissionController,
+            client_id: str,
+            max_wait: float,
+    ) -> None:
+        self.controller = controller
+        self.client_id = client_id
+        self.max_wait = max_wait
+        self.slot = uuid.uuid4().hex
+        self._started_at = 0.0
+        self._renewal: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "Admission":
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            decision, retry_after = await self.controller.try_admit(
+                self.client_id, self.slot
+            )
+            if decision == ADMITTED:
+                break
+            if time.monotonic() + retry_after > deadline:
+                reason = "client_limit" if decision == CLIENT_LIMITED else "overloaded"
+                ADMISSIONS.labels(decision=reason).inc()
+                raise AdmissionRejected(
+                    429 if decision == CLIENT_LIMITED else 503, retry_after
+                )
+            logging.info(f"Review of {self.client_id} waits {retry_after:.2f}s")
+            await asyncio.sleep(max(retry_after, 0.05))
+
+        ADMISSIONS.labels(decision="admitted").inc()
+        self._started_at = time.monotonic()
+        self._renewal = asyncio.create_task(self._renew())
+        return self
+
+    async def __aexit__(self, *_exc_info: object) -> None:
+        self._renewal.cancel()
+        await self.controller.release(
+            self.client_id, self.slot, time.monotonic() - self._started_at
+        )
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(self.controller.lease / 3)
+            await self.controller.renew(self.client_id, self.slot)
+
+
+admission = AdmissionController(
+    redis_client,
+    rate=settings.ADMISSION_RATE,
+    burst=settings.ADMISSION_BURST,
+    client_rate=settings.ADMISSION_CLIENT_RATE,
+    client_burst=settings.ADMISSION_CLIENT_BURST,
+    max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+    client_max_in_flight=settings.ADMISSION_CLIENT_MAX_IN_FLIGHT,
+    max_wait=settings.ADMISSION_MAX_WAIT,
+    lease=settings.ADMISSION_SLOT_LEASE,
+)
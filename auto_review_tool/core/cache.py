@@ -0,0 +1,158 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.metrics import (
+    CACHE_EVICTIONS,
+    CACHE_LOOKUPS,
+    LOCAL_CACHE_BYTES,
+    UPSTREAM_DURATION,
+    get_key_prefix,
+)
+from auto_review_tool.core.redis_client import RedisClient, redis_client
+
+
+class LRUCache:
+    """
+    In-process cache bounded by the approximate size of its values in bytes.
+    The least recently used entries are evicted first, expired entries
+    are dropped on access.
+    Cached values are shared, callers must not mutate them.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, Tuple[Any, float, int]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a value, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at, _size = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, expire: float) -> None:
+        """Save a value for `expire` seconds, evicting old entries if needed."""
+        self.delete(key)
+        size = self._estimate_size(value)
+        if expire <= 0 or size > self.max_bytes:
+            return None
+        self._entries[key] = (value, time.monotonic() + expire, size)
+        self.size += size
+        LOCAL_CACHE_BYTES.inc(size)
+        while self.size > self.max_bytes:
+            evicted_key, (_value, _expires_at, evicted_size) = self._entries.popitem(
+                last=False
+            )
+            self.size -= evicted_size
+            self.evictions += 1
+            LOCAL_CACHE_BYTES.dec(evicted_size)
+            CACHE_EVICTIONS.labels(get_key_prefix(evicted_key)).inc()
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+            LOCAL_CACHE_BYTES.dec(entry[2])
+
+    def clear(self) -> None:
+        LOCAL_CACHE_BYTES.dec(self.size)
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        if isinstance(value, (str, bytes)):
+            return len(value)
+        return len(json.dumps(value, default=str))
+
+
+class LayeredCache:
+    """
+    Two-tier cache: a per-worker LRUCache in front of Redis.
+    Values found in Redis are copied to the local tier with the TTL Redis
+    has left for them, so both tiers expire at the same time.
+    When Redis is not connected the local tier is used on its own.
+    """
+
+    def __init__(self, local: LRUCache, remote: RedisClient) -> None:
+        self.local = local
+        self.remote = remote
+        self.remote_hits = 0
+        self.remote_misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get a value from the local tier, then from Redis."""
+        return (await self.mget([key]))[0]
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get many values, asking Redis only for the local misses."""
+        values = [self.local.get(key) for key in keys]
+        missing = [index for index, value in enumerate(values) if value is None]
+        for key, value in zip(keys, values):
+            if value is not None:
+                CACHE_LOOKUPS.labels(get_key_prefix(key), "local_hit").inc()
+        if not missing or not self.remote.is_connected:
+            for index in missing:
+                CACHE_LOOKUPS.labels(get_key_prefix(keys[index]), "miss").inc()
+            return values
+
+        with UPSTREAM_DURATION.labels(service="redis").time():
+            remote_values = await self.remote.mget_with_ttl(
+                [keys[index] for index in missing]
+            )
+        for index, (value, ttl) in zip(missing, remote_values):
+            prefix = get_key_prefix(keys[index])
+            if value is None:
+                self.remote_misses += 1
+                CACHE_LOOKUPS.labels(prefix, "miss").inc()
+                continue
+            self.remote_hits += 1
+            CACHE_LOOKUPS.labels(prefix, "remote_hit").inc()
+            values[index] = value
+            if ttl is not None:
+                self.local.set(keys[index], value, expire=ttl)
+        return values
+
+    async def set(self, key: str, value: Any, expire: int = 3600) -> None:
+        """Save a value to both tiers."""
+        await self.mset({key: value}, expire=expire)
+
+    async def mset(self, mapping: Dict[str, Any], expire: int = 3600) -> None:
+        """Save many values to both tiers, using one Redis pipeline."""
+        for key, value in mapping.items():
+            self.local.set(key, value, expire=expire)
+        if self.remote.is_connected:
+            with UPSTREAM_DURATION.labels(service="redis").time():
+                await self.remote.mset_with_ttl(mapping, expire=expire)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "local_hits": self.local.hits,
+            "local_misses": self.local.misses,
+            "local_evictions": self.local.evictions,
+            "local_entries": len(self.local),
+            "local_bytes": self.local.size,
+            "remote_hits": self.remote_hits,
+            "remote_misses": self.remote_misses,
+        }
+
+
+cache = LayeredCache(LRUCache(settings.LOCAL_CACHE_MAX_BYTES), redis_client)
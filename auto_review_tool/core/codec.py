@@ -0,0 +1,115 @@
+import json
+import logging
+import zlib
+from typing import Any, Optional
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Values written by this codec start with the version of their format.
+# Values written before the codec existed are plain JSON, which never
+# starts with this byte, so they can still be read.
+FORMAT_VERSION = 1
+
+# The second byte describes the value: its serializer in the low four bits
+# and its compression in the high four bits.
+SERIALIZERS = {"json": 0, "msgpack": 1, "str": 2}
+COMPRESSIONS = {"none": 0, "zlib": 1, "zstd": 2}
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+class CacheCodec:
+    """
+    Turns cache values into bytes stored in Redis and back.
+    Strings, e.g. file contents, are stored as UTF-8, other values with
+    `serializer`. Values longer than `compression_threshold` bytes are
+    compressed with `compression`.
+    msgpack and zstd need the optional "msgpack" and "zstandard" packages,
+    without them JSON and zlib are used instead.
+    """
+
+    def __init__(
+            self,
+            serializer: str = "json",
+            compression: str = "zlib",
+            compression_threshold: int = 1024,
+    ) -> None:
+        if serializer not in ("json", "msgpack"):
+            raise ValueError(f"Unknown serializer: {serializer}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if serializer == "msgpack" and msgpack is None:
+            logging.warning("msgpack is not installed, using JSON instead")
+            serializer = "json"
+        if compression == "zstd" and zstandard is None:
+            logging.warning("zstandard is not installed, using zlib instead")
+            compression = "zlib"
+        self.serializer = serializer
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self._zstd_compressor = None
+        self._zstd_decompressor = None
+        if zstandard is not None:
+            self._zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            self._zstd_decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, value: Any) -> bytes:
+        if isinstance(value, str):
+            serializer = "str"
+            data = value.encode()
+        elif self.serializer == "msgpack":
+            serializer = "msgpack"
+            data = msgpack.packb(value, use_bin_type=True)
+        else:
+            serializer = "json"
+            data = json.dumps(value, separators=(",", ":")).encode()
+
+        compression = "none"
+        if self.compression != "none" and len(data) > self.compression_threshold:
+            compressed = self._compress(data, self.compression)
+            # Already compressed data can grow, it is then stored as is.
+            if len(compressed) < len(data):
+                compression, data = self.compression, compressed
+
+        flags = COMPRESSIONS[compression] << 4 | SERIALIZERS[serializer]
+        return bytes((FORMAT_VERSION, flags)) + data
+
+    def decode(self, data: Optional[bytes]) -> Any:
+        if not data:
+            return None
+        if data[0] != FORMAT_VERSION:
+            return json.loads(data)
+        flags = data[1]
+        payload = self._decompress(data[2:], flags >> 4)
+        serializer = flags & 0x0F
+        if serializer == SERIALIZERS["str"]:
+            return payload.decode()
+        if serializer == SERIALIZERS["msgpack"]:
+            if msgpack is None:
+                raise ValueError("msgpack is needed to read this value")
+            return msgpack.unpackb(payload, raw=False)
+        return json.loads(payload)
+
+    def _compress(self, data: bytes, compression: str) -> bytes:
+        if compression == "zstd":
+            return self._zstd_compressor.compress(data)
+        return zlib.compress(data, ZLIB_LEVEL)
+
+    def _decompress(self, data: bytes, compression: int) -> bytes:
+        if compression == COMPRESSIONS["none"]:
+            return data
+        if compression == COMPRESSIONS["zlib"]:
+            return zlib.decompress(data)
+        if compression == COMPRESSIONS["zstd"]:
+            if self._zstd_decompressor is None:
+                raise ValueError("zstandard is needed to read this value")
+            return self._zstd_decompressor.decompress(data)
+        raise ValueError(f"Unknown compression of a cached value: {compression}")
@@ -9,8 +9,154 @@ class Settings:
     GITHUB_TOKEN = None
     OPENAI_API_KEY = None
     REDIS_URL = None
+    # Comma-separated pool of GitHub tokens used instead of GITHUB_TOKEN.
+    GITHUB_TOKENS = []
 
-    RETRY_AFTER = 3600
+    # Serialization of values in Redis, strings are always stored as UTF-8.
+    # "msgpack" requires the optional "msgpack" package.
+    REDIS_SERIALIZER = "json"
+    # "zlib", "zstd" (requires the optional "zstandard" package) or "none".
+    REDIS_COMPRESSION = "zlib"
+    # Values longer than this (in bytes) are compressed.
+    REDIS_COMPRESSION_THRESHOLD = 1024
+
+    # Size limit in bytes of the per-worker in-memory cache in front of Redis.
+    LOCAL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+    GITHUB_API_URL = "https://api.github.com"
+    # "blobs" fetches every file through the git blobs API,
+    # "archive" downloads a single tarball of the repository.
+    GITHUB_FETCH_MODE = "blobs"
+    # Archives larger than this are spooled from memory to a temporary file.
+    GITHUB_ARCHIVE_SPOOL_SIZE = 10 * 1024 * 1024
+    # Blobs are immutable, so they are cached much longer than other data.
+    # Redis evicts the least recently used ones when it is out of memory.
+    BLOB_CACHE_TTL = 30 * 24 * 3600
+    # Trees are revalidated with conditional requests, so they can be
+    # cached for a long time.
+    REPO_TREE_CACHE_TTL = 7 * 24 * 3600
+    # The last review of every repository is kept this long for re-reviews.
+    REVIEW_STATE_TTL = 30 * 24 * 3600
+    # Re-reviews only send the changes to OpenAI when at most this share
+    # of the files has changed, otherwise the whole code is reviewed again.
+    INCREMENTAL_MAX_CHANGED_RATIO = 0.5
+    # Files larger than this (in bytes) are skipped.
+    GITHUB_MAX_FILE_SIZE = 1024 * 1024
+    # Content of a repository read for one review, in bytes.
+    # Files after this are skipped, which bounds the memory of a review.
+    GITHUB_MAX_INGEST_BYTES = 16 * 1024 * 1024
+    # Files whose cache entries are read in one round trip.
+    GITHUB_INGEST_BATCH_SIZE = 100
+
+    # Maximum number of blobs downloaded from GitHub at the same time.
+    GITHUB_MAX_CONCURRENCY = 10
+    # Maximum number of open connections to the GitHub API host.
+    GITHUB_MAX_CONNECTIONS = 10
+    # Idle connections kept open to the GitHub API host.
+    GITHUB_MAX_KEEPALIVE_CONNECTIONS = 10
+    # Seconds an idle connection is kept in the pool.
+    GITHUB_KEEPALIVE_EXPIRY = 30.0
+    # Read/write/pool timeout and connect timeout in seconds.
+    GITHUB_TIMEOUT = 30.0
+    GITHUB_CONNECT_TIMEOUT = 5.0
+    # Requires the optional "h2" package.
+    GITHUB_HTTP2 = False
+    # How many times a rate-limited (403/429) request is retried.
+    GITHUB_MAX_RETRIES = 3
+    # Base and maximum delay in seconds for the exponential backoff.
+    GITHUB_BACKOFF_BASE = 1.0
+    GITHUB_MAX_BACKOFF = 60.0
+    # Requests of every token kept for reviews which have already started.
+    GITHUB_RATE_LIMIT_RESERVE = 10
+    # How often in seconds a worker shares the rate limit budget in Redis.
+    GITHUB_RATE_LIMIT_SYNC_INTERVAL = 1.0
+
+    OPENAI_BASE_URL = None
+    OPENAI_MODEL = "gpt-4-turbo"
+    # A completion can take up to a minute, so the timeout is generous.
+    OPENAI_TIMEOUT = 120.0
+    OPENAI_CONNECT_TIMEOUT = 5.0
+    OPENAI_MAX_RETRIES = 2
+    OPENAI_MAX_CONNECTIONS = 20
+    OPENAI_KEEPALIVE_EXPIRY = 30.0
+    # Estimated tokens of code sent in one prompt. Bigger repositories
+    # are reviewed in chunks which are merged into one review.
+    OPENAI_MAX_PROMPT_TOKENS = 60000
+    # Files longer than this are truncated.
+    OPENAI_MAX_FILE_TOKENS = 8000
+    # Files which do not fit into this many chunks are skipped.
+    OPENAI_MAX_CHUNKS = 8
+    OPENAI_MAX_CONCURRENT_CHUNKS = 4
+
+    # SQLite database keeping the results of all reviews.
+    RESULT_STORE_PATH = "reviews.db"
+    # SQLite database keeping the registered assignment templates.
+    TEMPLATE_STORE_PATH = "templates.db"
+
+    # Reviews of a batch run at the same time, in every batch.
+    BATCH_MAX_CONCURRENCY = 8
+    # Repositories accepted in one batch.
+    BATCH_MAX_REPOS = 500
+
+    # Reviews started per second by all clients together and by every client,
+    # and the bursts allowed above these rates. 0 disables a limit.
+    # Reviews answered from stored results are not limited.
+    ADMISSION_RATE = 2.0
+    ADMISSION_BURST = 20
+    ADMISSION_CLIENT_RATE = 0.2
+    ADMISSION_CLIENT_BURST = 5
+    # Reviews running at the same time, in all workers and of every client.
+    ADMISSION_MAX_IN_FLIGHT = 32
+    ADMISSION_CLIENT_MAX_IN_FLIGHT = 4
+    # Seconds a review may wait for admission before it is rejected.
+    ADMISSION_MAX_WAIT = 0.0
+    # Slots of reviews are freed after this many seconds if their worker
+    # stops renewing them, e.g. when it crashed.
+    ADMISSION_SLOT_LEASE = 60.0
+    # Header identifying a client by its API key. Only the comma-separated
+    # ADMISSION_API_KEYS are trusted, the address of the client is used
+    # for other keys and when the header is not sent.
+    ADMISSION_API_KEY_HEADER = "X-API-Key"
+    ADMISSION_API_KEYS = []
+
+    # How long review jobs and their results are kept in Redis.
+    JOB_TTL = 24 * 3600
+    # How many jobs a worker process runs at the same time.
+    WORKER_CONCURRENCY = 4
+    # Jobs are requeued when their worker stops renewing its lease for
+    # this many seconds, e.g. when it crashed, and fail after as many runs.
+    JOB_LEASE = 60.0
+    JOB_MAX_ATTEMPTS = 3
+    WEBHOOK_TIMEOUT = 10.0
+    # Comma-separated hosts webhooks may be sent to. When it is empty,
+    # webhooks may be sent to any public address.
+    WEBHOOK_ALLOWED_HOSTS = []
+
+    # Lease in seconds of the Redis lock held while identical concurrent
+    # calls wait for one of them. It is renewed while the call runs.
+    SINGLE_FLIGHT_LEASE = 15.0
+    # How long other workers wait for the call before making it themselves.
+    SINGLE_FLIGHT_WAIT_TIMEOUT = 300.0
+    SINGLE_FLIGHT_POLL_INTERVAL = 0.5
+
+    # "{pid}" is replaced with the id of the process, so that several
+    # workers do not write and rotate the same file.
+    LOG_FILE = "app.log"
+    # "text" or "json" (one JSON object per line).
+    LOG_FORMAT = "text"
+    LOG_LEVEL = "INFO"
+    # Share of the DEBUG records kept, e.g. of the lines logged per file.
+    LOG_DEBUG_SAMPLE_RATE = 1.0
+
+    # "jsonl" writes the spans of every request to TRACING_FILE,
+    # "otlp" sends them to an OpenTelemetry collector, "none" disables tracing.
+    TRACING_EXPORTER = "none"
+    TRACING_FILE = "traces.jsonl"
+    # OTLP/HTTP endpoint of the collector, in the JSON encoding.
+    TRACING_OTLP_ENDPOINT = "http://localhost:4318/v1/traces"
+    TRACING_SERVICE_NAME = "auto-review-tool"
+    # Finished spans are exported in batches this often in seconds.
+    TRACING_EXPORT_INTERVAL = 5.0
 
     def __init__(self) -> None:
         from dotenv import load_dotenv
@@ -19,12 +165,228 @@ class Settings:
 
         self.__env_dict = {}
         self.GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+        self.GITHUB_TOKENS = [
+            token.strip()
+            for token in os.getenv("GITHUB_TOKENS", "").split(",")
+            if token.strip()
+        ]
+        if self.GITHUB_TOKEN is None and self.GITHUB_TOKENS:
+            self.GITHUB_TOKEN = self.GITHUB_TOKENS[0]
         self.OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
         self.REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.REDIS_SERIALIZER = os.getenv("REDIS_SERIALIZER", self.REDIS_SERIALIZER)
+        self.REDIS_COMPRESSION = os.getenv(
+            "REDIS_COMPRESSION", self.REDIS_COMPRESSION
+        )
+        self.REDIS_COMPRESSION_THRESHOLD = int(
+            os.getenv(
+                "REDIS_COMPRESSION_THRESHOLD", self.REDIS_COMPRESSION_THRESHOLD
+            )
+        )
+
+        self.LOCAL_CACHE_MAX_BYTES = int(
+            os.getenv("LOCAL_CACHE_MAX_BYTES", self.LOCAL_CACHE_MAX_BYTES)
+        )
+        self.GITHUB_API_URL = os.getenv("GITHUB_API_URL", self.GITHUB_API_URL)
+        self.GITHUB_FETCH_MODE = os.getenv(
+            "GITHUB_FETCH_MODE", self.GITHUB_FETCH_MODE
+        )
+        self.GITHUB_ARCHIVE_SPOOL_SIZE = int(
+            os.getenv("GITHUB_ARCHIVE_SPOOL_SIZE", self.GITHUB_ARCHIVE_SPOOL_SIZE)
+        )
+        self.BLOB_CACHE_TTL = int(
+            os.getenv("BLOB_CACHE_TTL", self.BLOB_CACHE_TTL)
+        )
+        self.REPO_TREE_CACHE_TTL = int(
+            os.getenv("REPO_TREE_CACHE_TTL", self.REPO_TREE_CACHE_TTL)
+        )
+        self.REVIEW_STATE_TTL = int(
+            os.getenv("REVIEW_STATE_TTL", self.REVIEW_STATE_TTL)
+        )
+        self.INCREMENTAL_MAX_CHANGED_RATIO = float(
+            os.getenv(
+                "INCREMENTAL_MAX_CHANGED_RATIO", self.INCREMENTAL_MAX_CHANGED_RATIO
+            )
+        )
+        self.GITHUB_MAX_FILE_SIZE = int(
+            os.getenv("GITHUB_MAX_FILE_SIZE", self.GITHUB_MAX_FILE_SIZE)
+        )
+        self.GITHUB_MAX_INGEST_BYTES = int(
+            os.getenv("GITHUB_MAX_INGEST_BYTES", self.GITHUB_MAX_INGEST_BYTES)
+        )
+        self.GITHUB_INGEST_BATCH_SIZE = int(
+            os.getenv("GITHUB_INGEST_BATCH_SIZE", self.GITHUB_INGEST_BATCH_SIZE)
+        )
+        self.GITHUB_MAX_CONCURRENCY = int(
+            os.getenv("GITHUB_MAX_CONCURRENCY", self.GITHUB_MAX_CONCURRENCY)
+        )
+        self.GITHUB_MAX_CONNECTIONS = int(
+            os.getenv("GITHUB_MAX_CONNECTIONS", self.GITHUB_MAX_CONNECTIONS)
+        )
+        self.GITHUB_MAX_KEEPALIVE_CONNECTIONS = int(
+            os.getenv(
+                "GITHUB_MAX_KEEPALIVE_CONNECTIONS",
+                self.GITHUB_MAX_KEEPALIVE_CONNECTIONS,
+            )
+        )
+        self.GITHUB_KEEPALIVE_EXPIRY = float(
+            os.getenv("GITHUB_KEEPALIVE_EXPIRY", self.GITHUB_KEEPALIVE_EXPIRY)
+        )
+        self.GITHUB_TIMEOUT = float(
+            os.getenv("GITHUB_TIMEOUT", self.GITHUB_TIMEOUT)
+        )
+        self.GITHUB_CONNECT_TIMEOUT = float(
+            os.getenv("GITHUB_CONNECT_TIMEOUT", self.GITHUB_CONNECT_TIMEOUT)
+        )
+        self.GITHUB_HTTP2 = self._get_bool_env("GITHUB_HTTP2", self.GITHUB_HTTP2)
+        self.GITHUB_MAX_RETRIES = int(
+            os.getenv("GITHUB_MAX_RETRIES", self.GITHUB_MAX_RETRIES)
+        )
+        self.GITHUB_BACKOFF_BASE = float(
+            os.getenv("GITHUB_BACKOFF_BASE", self.GITHUB_BACKOFF_BASE)
+        )
+        self.GITHUB_MAX_BACKOFF = float(
+            os.getenv("GITHUB_MAX_BACKOFF", self.GITHUB_MAX_BACKOFF)
+        )
+        self.GITHUB_RATE_LIMIT_RESERVE = int(
+            os.getenv("GITHUB_RATE_LIMIT_RESERVE", self.GITHUB_RATE_LIMIT_RESERVE)
+        )
+        self.GITHUB_RATE_LIMIT_SYNC_INTERVAL = float(
+            os.getenv(
+                "GITHUB_RATE_LIMIT_SYNC_INTERVAL",
+                self.GITHUB_RATE_LIMIT_SYNC_INTERVAL,
+            )
+        )
+
+        self.OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", self.OPENAI_BASE_URL)
+        self.OPENAI_MODEL = os.getenv("OPENAI_MODEL", self.OPENAI_MODEL)
+        self.OPENAI_TIMEOUT = float(
+            os.getenv("OPENAI_TIMEOUT", self.OPENAI_TIMEOUT)
+        )
+        self.OPENAI_CONNECT_TIMEOUT = float(
+            os.getenv("OPENAI_CONNECT_TIMEOUT", self.OPENAI_CONNECT_TIMEOUT)
+        )
+        self.OPENAI_MAX_RETRIES = int(
+            os.getenv("OPENAI_MAX_RETRIES", self.OPENAI_MAX_RETRIES)
+        )
+        self.OPENAI_MAX_CONNECTIONS = int(
+            os.getenv("OPENAI_MAX_CONNECTIONS", self.OPENAI_MAX_CONNECTIONS)
+        )
+        self.OPENAI_KEEPALIVE_EXPIRY = float(
+            os.getenv("OPENAI_KEEPALIVE_EXPIRY", self.OPENAI_KEEPALIVE_EXPIRY)
+        )
+        self.OPENAI_MAX_PROMPT_TOKENS = int(
+            os.getenv("OPENAI_MAX_PROMPT_TOKENS", self.OPENAI_MAX_PROMPT_TOKENS)
+        )
+        self.OPENAI_MAX_FILE_TOKENS = int(
+            os.getenv("OPENAI_MAX_FILE_TOKENS", self.OPENAI_MAX_FILE_TOKENS)
+        )
+        self.OPENAI_MAX_CHUNKS = int(
+            os.getenv("OPENAI_MAX_CHUNKS", self.OPENAI_MAX_CHUNKS)
+        )
+        self.OPENAI_MAX_CONCURRENT_CHUNKS = int(
+            os.getenv(
+                "OPENAI_MAX_CONCURRENT_CHUNKS", self.OPENAI_MAX_CONCURRENT_CHUNKS
+            )
+        )
+        self.RESULT_STORE_PATH = os.getenv(
+            "RESULT_STORE_PATH", self.RESULT_STORE_PATH
+        )
+        self.TEMPLATE_STORE_PATH = os.getenv(
+            "TEMPLATE_STORE_PATH", self.TEMPLATE_STORE_PATH
+        )
+        self.BATCH_MAX_CONCURRENCY = int(
+            os.getenv("BATCH_MAX_CONCURRENCY", self.BATCH_MAX_CONCURRENCY)
+        )
+        self.BATCH_MAX_REPOS = int(os.getenv("BATCH_MAX_REPOS", self.BATCH_MAX_REPOS))
+        self.ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", self.ADMISSION_RATE))
+        self.ADMISSION_BURST = float(
+            os.getenv("ADMISSION_BURST", self.ADMISSION_BURST)
+        )
+        self.ADMISSION_CLIENT_RATE = float(
+            os.getenv("ADMISSION_CLIENT_RATE", self.ADMISSION_CLIENT_RATE)
+        )
+        self.ADMISSION_CLIENT_BURST = float(
+            os.getenv("ADMISSION_CLIENT_BURST", self.ADMISSION_CLIENT_BURST)
+        )
+        self.ADMISSION_MAX_IN_FLIGHT = int(
+            os.getenv("ADMISSION_MAX_IN_FLIGHT", self.ADMISSION_MAX_IN_FLIGHT)
+        )
+        self.ADMISSION_CLIENT_MAX_IN_FLIGHT = int(
+            os.getenv(
+                "ADMISSION_CLIENT_MAX_IN_FLIGHT", self.ADMISSION_CLIENT_MAX_IN_FLIGHT
+            )
+        )
+        self.ADMISSION_MAX_WAIT = float(
+            os.getenv("ADMISSION_MAX_WAIT", self.ADMISSION_MAX_WAIT)
+        )
+        self.ADMISSION_SLOT_LEASE = float(
+            os.getenv("ADMISSION_SLOT_LEASE", self.ADMISSION_SLOT_LEASE)
+        )
+        self.ADMISSION_API_KEY_HEADER = os.getenv(
+            "ADMISSION_API_KEY_HEADER", self.ADMISSION_API_KEY_HEADER
+        )
+        self.ADMISSION_API_KEYS = [
+            key.strip()
+            for key in os.getenv("ADMISSION_API_KEYS", "").split(",")
+            if key.strip()
+        ]
+        self.JOB_TTL = int(os.getenv("JOB_TTL", self.JOB_TTL))
+        self.WORKER_CONCURRENCY = int(
+            os.getenv("WORKER_CONCURRENCY", self.WORKER_CONCURRENCY)
+        )
+        self.JOB_LEASE = float(os.getenv("JOB_LEASE", self.JOB_LEASE))
+        self.JOB_MAX_ATTEMPTS = int(
+            os.getenv("JOB_MAX_ATTEMPTS", self.JOB_MAX_ATTEMPTS)
+        )
+        self.WEBHOOK_TIMEOUT = float(
+            os.getenv("WEBHOOK_TIMEOUT", self.WEBHOOK_TIMEOUT)
+        )
+        self.WEBHOOK_ALLOWED_HOSTS = [
+            host.strip().lower()
+            for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",")
+            if host.strip()
+        ]
+        self.SINGLE_FLIGHT_LEASE = float(
+            os.getenv("SINGLE_FLIGHT_LEASE", self.SINGLE_FLIGHT_LEASE)
+        )
+        self.SINGLE_FLIGHT_WAIT_TIMEOUT = float(
+            os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", self.SINGLE_FLIGHT_WAIT_TIMEOUT)
+        )
+        self.SINGLE_FLIGHT_POLL_INTERVAL = float(
+            os.getenv(
+                "SINGLE_FLIGHT_POLL_INTERVAL", self.SINGLE_FLIGHT_POLL_INTERVAL
+            )
+        )
+
+        self.LOG_FILE = os.getenv("LOG_FILE", self.LOG_FILE)
+        self.LOG_FORMAT = os.getenv("LOG_FORMAT", self.LOG_FORMAT)
+        self.LOG_LEVEL = os.getenv("LOG_LEVEL", self.LOG_LEVEL).upper()
+        self.LOG_DEBUG_SAMPLE_RATE = float(
+            os.getenv("LOG_DEBUG_SAMPLE_RATE", self.LOG_DEBUG_SAMPLE_RATE)
+        )
+        self.TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", self.TRACING_EXPORTER)
+        self.TRACING_FILE = os.getenv("TRACING_FILE", self.TRACING_FILE)
+        self.TRACING_OTLP_ENDPOINT = os.getenv(
+            "TRACING_OTLP_ENDPOINT", self.TRACING_OTLP_ENDPOINT
+        )
+        self.TRACING_SERVICE_NAME = os.getenv(
+            "TRACING_SERVICE_NAME", self.TRACING_SERVICE_NAME
+        )
+        self.TRACING_EXPORT_INTERVAL = float(
+            os.getenv("TRACING_EXPORT_INTERVAL", self.TRACING_EXPORT_INTERVAL)
+        )
 
         self.__env_dict["GITHUB_TOKEN"] = self.GITHUB_TOKEN
         self.__env_dict["OPENAI_API_KEY"] = self.OPENAI_API_KEY
 
+    @staticmethod
+    def _get_bool_env(name: str, default: bool) -> bool:
+        value = os.getenv(name)
+        if value is None:
+            return default
+        return value.strip().lower() in ("1", "true", "yes", "on")
+
     @property
     def env_dict(self) -> dict:
         return self.__env_dict
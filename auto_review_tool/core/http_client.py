@@ -0,0 +1,119 @@
+import logging
+import time
+from importlib.util import find_spec
+from typing import Any, Dict, Optional
+
+from httpx import AsyncClient, Limits, Request, Response, Timeout
+
+from auto_review_tool.core.metrics import (
+    UPSTREAM_DURATION,
+    UPSTREAM_POOL_CONNECTIONS,
+    UPSTREAM_POOL_REQUESTS,
+    UPSTREAM_REQUESTS,
+)
+
+
+class PoolStats:
+    """
+    Connection pool statistics of an AsyncClient.
+    Every request that did not have to open a new TCP connection
+    is counted as a pool hit.
+    """
+
+    def __init__(self, service: Optional[str] = None) -> None:
+        """
+        :param service: Name of the upstream service in the metrics,
+                        which are only recorded when it is set.
+        """
+        self.service = service
+        self.requests = 0
+        self.connections = 0
+
+    @property
+    def hits(self) -> int:
+        return max(self.requests - self.connections, 0)
+
+    @property
+    def misses(self) -> int:
+        return self.connections
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def on_request(self, request: Request) -> None:
+        """httpx request hook which subscribes to httpcore trace events."""
+        self.requests += 1
+        if self.service is not None:
+            UPSTREAM_POOL_REQUESTS.labels(service=self.service).inc()
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, _info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.started":
+            self.connections += 1
+            if self.service is not None:
+                UPSTREAM_POOL_CONNECTIONS.labels(service=self.service).inc()
+
+
+class UpstreamMetrics:
+    """httpx hooks recording the status and the latency of every request."""
+
+    def __init__(self, service: str) -> None:
+        self.service = service
+
+    async def on_request(self, request: Request) -> None:
+        request.extensions["started_at"] = time.perf_counter()
+
+    async def on_response(self, response: Response) -> None:
+        UPSTREAM_REQUESTS.labels(
+            service=self.service, status=str(response.status_code)
+        ).inc()
+        started_at = response.request.extensions.get("started_at")
+        if started_at is not None:
+            UPSTREAM_DURATION.labels(service=self.service).observe(
+                time.perf_counter() - started_at
+            )
+
+
+def create_async_client(
+        *,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        timeout: float,
+        connect_timeout: float,
+        http2: bool,
+        stats: PoolStats,
+        service: Optional[str] = None,
+        **kwargs: Any,
+) -> AsyncClient:
+    """
+    Create a long-lived AsyncClient with a bounded connection pool.
+    HTTP/2 is only enabled when the optional "h2" package is installed.
+    :param service: Name of the upstream service in the request metrics.
+    """
+    if http2 and find_spec("h2") is None:
+        logging.warning(
+            "HTTP/2 is enabled, but the 'h2' package is not installed. "
+            "Falling back to HTTP/1.1."
+        )
+        http2 = False
+    event_hooks = {"request": [stats.on_request], "response": []}
+    if service is not None:
+        metrics = UpstreamMetrics(service)
+        event_hooks["request"].append(metrics.on_request)
+        event_hooks["response"].append(metrics.on_response)
+    return AsyncClient(
+        limits=Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=Timeout(timeout, connect=connect_timeout),
+        http2=http2,
+        event_hooks=event_hooks,
+        **kwargs,
+    )
@@ -0,0 +1,140 @@
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.redis_client import RedisClient, redis_client
+
+# Removes a finished job from the processing list and frees its lease.
+ACK_SCRIPT = """
+redis.call("LREM", KEYS[1], 0, ARGV[1])
+redis.call("DEL", KEYS[2])
+return 1
+"""
+# Moves jobs whose workers stopped renewing their leases back to the queue.
+# A job is only requeued when its lease was missing in two scans in a row,
+# so that a job which was just taken and whose lease is not set yet stays.
+REQUEUE_STALE_SCRIPT = """
+local requeued = 0
+for _, entry in ipairs(redis.call("LRANGE", KEYS[1], 0, -1)) do
+    local lease_key = ARGV[1] .. cjson.decode(entry)
+    if redis.call("EXISTS", lease_key) == 1 then
+        redis.call("SREM", KEYS[3], entry)
+    elseif redis.call("SISMEMBER", KEYS[3], entry) == 1 then
+        redis.call("SREM", KEYS[3], entry)
+        redis.call("LREM", KEYS[1], 0, entry)
+        redis.call("RPUSH", KEYS[2], entry)
+        requeued = requeued + 1
+    else
+        redis.call("SADD", KEYS[3], entry)
+    end
+end
+return requeued
+"""
+
+
+class JobQueue:
+    """
+    Queue of review jobs stored in Redis.
+    Job ids are pushed to a list which workers take them from. A taken job
+    is moved to a processing list in the same step, and its worker holds
+    a lease on it until the job is acknowledged, so the jobs of crashed
+    workers are requeued by `requeue_stale()` instead of being lost.
+    The jobs themselves are kept under their own keys for settings.JOB_TTL.
+    """
+
+    def __init__(self, redis: RedisClient, name: str = "review_jobs") -> None:
+        self.redis = redis
+        self.queue_key = f"{name}:queue"
+        self.processing_key = f"{name}:processing"
+        self.suspects_key = f"{name}:stale"
+        self.name = name
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.name}:job:{job_id}"
+
+    def _lease_key(self, job_id: str) -> str:
+        return f"{self.name}:lease:{job_id}"
+
+    async def enqueue(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Create a job and add it to the queue.
+        :raises RuntimeError: If Redis is not available.
+        """
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "request": request,
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if not self.redis.is_connected:
+            raise RuntimeError("The job queue is not available.")
+        await self.redis.set(self._job_key(job["job_id"]), job, expire=settings.JOB_TTL)
+        if not await self.redis.push(self.queue_key, job["job_id"]):
+            raise RuntimeError("The job queue is not available.")
+        logging.info(f"Review job {job['job_id']} is queued")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.redis.get(self._job_key(job_id))
+
+    async def update(self, job_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        """Update the fields of a job, e.g. its status or its result."""
+        job = await self.get(job_id)
+        if job is None:
+            return None
+        job.update(fields, updated_at=time.time())
+        await self.redis.set(self._job_key(job_id), job, expire=settings.JOB_TTL)
+        return job
+
+    async def claim(self, worker_id: str, timeout: float = 5) -> Optional[str]:
+        """
+        Take the id of the next job, waiting up to `timeout` seconds,
+        and lease it to the worker for settings.JOB_LEASE seconds.
+        """
+        job_id = await self.redis.move(
+            self.queue_key, self.processing_key, timeout=timeout
+        )
+        if job_id is not None:
+            await self.redis.acquire_lock(
+                self._lease_key(job_id), worker_id, settings.JOB_LEASE
+            )
+        return job_id
+
+    async def renew(self, job_id: str, worker_id: str) -> bool:
+        """Renew the lease of a job which is still running."""
+        return await self.redis.extend_lock(
+            self._lease_key(job_id), worker_id, settings.JOB_LEASE
+        )
+
+    async def ack(self, job_id: str) -> None:
+        """Remove a finished job from the processing list."""
+        await self.redis.run_script(
+            ACK_SCRIPT,
+            [self.processing_key, self._lease_key(job_id)],
+            [json.dumps(job_id)],
+        )
+
+    async def requeue_stale(self) -> int:
+        """
+        Requeue the jobs of workers which stopped renewing their leases.
+        :return: How many jobs were requeued.
+        """
+        requeued = await self.redis.run_script(
+            REQUEUE_STALE_SCRIPT,
+            [self.processing_key, self.queue_key, self.suspects_key],
+            [self._lease_key("")],
+        )
+        if requeued:
+            logging.warning(f"Requeued {requeued} stale review jobs")
+        return requeued or 0
+
+
+job_queue = JobQueue(redis_client)
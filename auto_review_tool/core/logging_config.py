@@ -1,50 +1,133 @@
+import atexit
+import json
+import logging
+import os
+import random
+from datetime import datetime, timezone
 from logging.config import dictConfig
 
-LOG_FILE = "app.log"
+from auto_review_tool.core.config import settings
 
-LOGGING_CONFIG = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "default": {
-            "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+# Attributes every LogRecord has, the others were passed in `extra`.
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Keeps only a share of the DEBUG records, e.g. the per-file lines
+    of big repositories. Records of higher levels are always kept.
+    """
+
+    def __init__(self, rate: float = 1.0) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate  # noqa: S311
+
+
+def get_logging_config() -> dict:
+    """
+    Build the logging configuration from the settings.
+    Records are put on a queue and written to the console and the log file
+    by a listener thread, so logging does not block the event loop.
+    """
+    # With several workers every process writes and rotates its own file.
+    log_file = settings.LOG_FILE.format(pid=os.getpid())
+    formatter = "json" if settings.LOG_FORMAT == "json" else "default"
+    handlers = ["queue"]
+    return {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "formatters": {
+            "default": {
+                "format": (
+                    "%(asctime)s - %(name)s - %(levelname)s - "
+                    "[%(request_id)s] - %(message)s"
+                ),
+            },
+            "json": {
+                "()": JsonFormatter,
+            },
         },
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "default",
+        "filters": {
+            # Correlates the logs of a request with its traces. It runs
+            # before the record is queued, in the context of the request.
+            "request_id": {
+                "()": "auto_review_tool.core.tracing.RequestIdFilter",
+            },
+            "debug_sampling": {
+                "()": DebugSamplingFilter,
+                "rate": settings.LOG_DEBUG_SAMPLE_RATE,
+            },
         },
-        "file": {
-            "class": "logging.handlers.TimedRotatingFileHandler",
-            "filename": LOG_FILE,
-            "formatter": "default",
-            "when": "midnight",
-            "interval": 1,
-            "backupCount": 7,
+        "handlers": {
+            "console": {
+                "class": "logging.StreamHandler",
+                "formatter": formatter,
+            },
+            "file": {
+                "class": "logging.handlers.TimedRotatingFileHandler",
+                "filename": log_file,
+                "formatter": formatter,
+                "when": "midnight",
+                "interval": 1,
+                "backupCount": 7,
+            },
+            "queue": {
+                "class": "logging.handlers.QueueHandler",
+                "handlers": ["console", "file"],
+                "filters": ["request_id", "debug_sampling"],
+                "respect_handler_level": True,
+            },
         },
-    },
-    "root": {
-        "handlers": ["console", "file"],
-        "level": "INFO",
-    },
-    "loggers": {
-        "fastapi": {
-            "handlers": ["console", "file"],
-            "level": "INFO",
-            "propagate": False,
+        "root": {
+            "handlers": handlers,
+            "level": settings.LOG_LEVEL,
         },
-        "auto_review_tool": {
-            "handlers": ["console", "file"],
-            "level": "DEBUG",
-            "propagate": False,
+        "loggers": {
+            "fastapi": {
+                "handlers": handlers,
+                "level": "INFO",
+                "propagate": False,
+            },
+            "auto_review_tool": {
+                "handlers": handlers,
+                "level": "DEBUG",
+                "propagate": False,
+            },
         },
-    },
-}
+    }
 
 
 def setup_logging() -> None:
     """
     Initializes the logging configuration.
     """
-    dictConfig(LOGGING_CONFIG)
+    dictConfig(get_logging_config())
+    listener = logging.getHandlerByName("queue").listener
+    listener.start()
+    # Write the records which are still queued when the process exits.
+    atexit.register(listener.stop)
@@ -0,0 +1,182 @@
+import functools
+import os
+from contextlib import nullcontext
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # pragma: no cover
+    prometheus_client = None
+
+T = TypeVar("T")
+
+# Multi-process mode of prometheus-client, used with several uvicorn workers.
+MULTIPROCESS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+STAGE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class _NoopMetric:
+    """Stands in for every metric when prometheus-client is not installed."""
+
+    def labels(self, *_args: Any, **_kwargs: Any) -> "_NoopMetric":
+        return self
+
+    def inc(self, _amount: float = 1) -> None:
+        pass
+
+    def dec(self, _amount: float = 1) -> None:
+        pass
+
+    def observe(self, _amount: float) -> None:
+        pass
+
+    def time(self) -> ContextManager:
+        return nullcontext()
+
+    def track_inprogress(self) -> ContextManager:
+        return nullcontext()
+
+
+def is_available() -> bool:
+    """Whether the optional prometheus-client package is installed."""
+    return prometheus_client is not None
+
+
+def _counter(name: str, documentation: str, labels: Sequence[str]) -> Any:
+    if not is_available():
+        return _NoopMetric()
+    return prometheus_client.Counter(name, documentation, labels)
+
+
+def _histogram(
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        buckets: Sequence[float] = STAGE_BUCKETS,
+) -> Any:
+    if not is_available():
+        return _NoopMetric()
+    return prometheus_client.Histogram(name, documentation, labels, buckets=buckets)
+
+
+def _gauge(name: str, documentation: str, labels: Sequence[str]) -> Any:
+    if not is_available():
+        return _NoopMetric()
+    # "livesum" adds up the values of the workers which are still alive.
+    return prometheus_client.Gauge(
+        name, documentation, labels, multiprocess_mode="livesum"
+    )
+
+
+STAGE_DURATION = _histogram(
+    "review_stage_duration_seconds",
+    "Duration of the stages of a review.",
+    ["stage"],
+)
+UPSTREAM_REQUESTS = _counter(
+    "upstream_requests_total",
+    "Requests sent to GitHub and OpenAI by response status.",
+    ["service", "status"],
+)
+UPSTREAM_DURATION = _histogram(
+    "upstream_request_duration_seconds",
+    "Time until the response headers of GitHub and OpenAI, and of Redis calls.",
+    ["service"],
+)
+UPSTREAM_POOL_REQUESTS = _counter(
+    "upstream_pool_requests_total",
+    "Requests sent through the connection pools of GitHub and OpenAI.",
+    ["service"],
+)
+UPSTREAM_POOL_CONNECTIONS = _counter(
+    "upstream_pool_connections_total",
+    "Connections opened by the pools, the other requests reused a connection.",
+    ["service"],
+)
+CACHE_LOOKUPS = _counter(
+    "cache_lookups_total",
+    "Cache lookups by key prefix and result (local_hit, remote_hit or miss).",
+    ["prefix", "result"],
+)
+CACHE_EVICTIONS = _counter(
+    "cache_evictions_total",
+    "Entries evicted from the local caches of the workers by key prefix.",
+    ["prefix"],
+)
+LOCAL_CACHE_BYTES = _gauge(
+    "local_cache_bytes",
+    "Approximate size of the values in the local caches of the workers.",
+    [],
+)
+OPENAI_TOKENS = _counter(
+    "openai_tokens_total",
+    "Tokens used by OpenAI completions.",
+    ["type"],
+)
+ADMISSIONS = _counter(
+    "admissions_total",
+    "Reviews by admission decision (admitted, client_limit or overloaded).",
+    ["decision"],
+)
+REVIEWS_IN_PROGRESS = _gauge(
+    "reviews_in_progress",
+    "Reviews which are running.",
+    ["endpoint"],
+)
+
+
+def time_stage(stage: str) -> ContextManager:
+    """Measure the duration of a stage of a review."""
+    return STAGE_DURATION.labels(stage=stage).time()
+
+
+def timed_stage(
+        stage: str,
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Decorator measuring the duration of a coroutine function as a stage."""
+
+    def decorator(function: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(function)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            with time_stage(stage):
+                return await function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_key_prefix(key: str) -> str:
+    """Group cache keys by their prefix, e.g. "blob" for "blob:<sha>"."""
+    return key.split(":", 1)[0]
+
+
+def generate_metrics() -> Tuple[bytes, str]:
+    """
+    Render the metrics in the Prometheus text format.
+    In multi-process mode the metrics of all workers are collected.
+    :return: The metrics and their content type.
+    """
+    if os.getenv(MULTIPROCESS_DIR_ENV):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    content = prometheus_client.generate_latest(registry)
+    return content, prometheus_client.CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: Optional[int] = None) -> None:
+    """Drop the live gauges of a worker which is shutting down."""
+    if is_available() and os.getenv(MULTIPROCESS_DIR_ENV):
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,15 @@
+from typing import Any, Callable, Dict, Optional
+
+# Called with the name of a pipeline event and its data,
+# e.g. ("files_fetched", {"done": 10, "total": 40}).
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+
+def report_progress(
+        on_progress: Optional[ProgressCallback],
+        event: str,
+        **data: Any,
+) -> None:
+    """Notify the progress callback, if there is one."""
+    if on_progress is not None:
+        on_progress(event, data)
@@ -0,0 +1,156 @@
+import logging
+from pathlib import PurePosixPath
+from typing import Dict, List, Sequence
+
+IGNORED_DIRECTORIES = {
+    ".git",
+    ".idea",
+    ".venv",
+    ".vscode",
+    "__pycache__",
+    "bower_components",
+    "build",
+    "coverage",
+    "dist",
+    "htmlcov",
+    "node_modules",
+    "site-packages",
+    "vendor",
+    "venv",
+}
+IGNORED_FILE_NAMES = {
+    "Cargo.lock",
+    "Gemfile.lock",
+    "Pipfile.lock",
+    "composer.lock",
+    "go.sum",
+    "package-lock.json",
+    "pnpm-lock.yaml",
+    "poetry.lock",
+    "uv.lock",
+    "yarn.lock",
+}
+IGNORED_EXTENSIONS = {
+    ".bin",
+    ".bmp",
+    ".class",
+    ".dll",
+    ".eot",
+    ".exe",
+    ".gif",
+    ".gz",
+    ".ico",
+    ".jar",
+    ".jpeg",
+    ".jpg",
+    ".lock",
+    ".map",
+    ".mp3",
+    ".mp4",
+    ".otf",
+    ".pdf",
+    ".png",
+    ".pyc",
+    ".so",
+    ".svg",
+    ".tar",
+    ".ttf",
+    ".webp",
+    ".woff",
+    ".woff2",
+    ".zip",
+}
+MINIFIED_SUFFIXES = (".min.js", ".min.css", ".bundle.js")
+# Lines this long on average only appear in generated or minified files.
+MAX_AVERAGE_LINE_LENGTH = 300
+# A rough average for source code, good enough to plan a prompt.
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = "\n... [truncated]"
+
+
+class PromptPlan:
+    """
+    Files of a repository split into chunks which fit the prompt budget.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: List[Dict[str, str]] = []
+        self.skipped: List[str] = []
+        self.truncated: List[str] = []
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def is_low_value_path(path: str) -> bool:
+    """
+    Check whether a file is not worth reviewing:
+    lockfiles, vendored or built code, binary assets and minified files.
+    """
+    pure_path = PurePosixPath(path)
+    if any(part in IGNORED_DIRECTORIES for part in pure_path.parts[:-1]):
+        return True
+    if pure_path.name in IGNORED_FILE_NAMES:
+        return True
+    if pure_path.suffix.lower() in IGNORED_EXTENSIONS:
+        return True
+    return pure_path.name.lower().endswith(MINIFIED_SUFFIXES)
+
+
+def is_generated_content(content: str) -> bool:
+    """Detect minified or generated files by their average line length."""
+    lines = content.count("\n") + 1
+    return len(content) / lines > MAX_AVERAGE_LINE_LENGTH
+
+
+def plan_prompt(
+        file_names: Sequence[str],
+        file_contents: Sequence[str],
+        max_chunk_tokens: int,
+        max_file_tokens: int,
+        max_chunks: int,
+) -> PromptPlan:
+    """
+    Select the files to review and split them into chunks.
+    Low-value files are skipped, files longer than max_file_tokens
+    are truncated, and the rest is packed in order into at most
+    max_chunks chunks of max_chunk_tokens each.
+    """
+    plan = PromptPlan()
+    chunk: Dict[str, str] = {}
+    chunk_tokens = 0
+    for name, content in zip(file_names, file_contents):
+        if not content.strip() or is_low_value_path(name):
+            plan.skipped.append(name)
+            continue
+        if is_generated_content(content):
+            plan.skipped.append(name)
+            continue
+
+        tokens = estimate_tokens(name) + estimate_tokens(content)
+        if tokens > max_file_tokens:
+            content = (
+                content[:max_file_tokens * CHARS_PER_TOKEN] + TRUNCATION_MARKER
+            )
+            tokens = estimate_tokens(name) + estimate_tokens(content)
+            plan.truncated.append(name)
+
+        if chunk and chunk_tokens + tokens > max_chunk_tokens:
+            plan.chunks.append(chunk)
+            chunk = {}
+            chunk_tokens = 0
+        if len(plan.chunks) == max_chunks:
+            plan.skipped.append(name)
+            continue
+        chunk[name] = content
+        chunk_tokens += tokens
+
+    if chunk and len(plan.chunks) < max_chunks:
+        plan.chunks.append(chunk)
+    logging.info(
+        f"Prompt plan: {len(plan.chunks)} chunks, "
+        f"{len(plan.skipped)} skipped and {len(plan.truncated)} truncated files"
+    )
+    return plan
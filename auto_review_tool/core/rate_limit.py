@@ -0,0 +1,141 @@
+import logging
+import math
+import time
+from hashlib import sha256
+from typing import Dict, List, Mapping, Optional
+
+from auto_review_tool.core.redis_client import RedisClient
+
+
+class TokenBudget:
+    """Remaining requests of a single token in the current rate limit window."""
+
+    def __init__(self, remaining: int, reset: float) -> None:
+        self.remaining = remaining
+        self.reset = reset
+
+    def is_available(self, reserve: int, now: float) -> bool:
+        return self.remaining > reserve or self.reset <= now
+
+    def merge(self, other: "TokenBudget") -> None:
+        """
+        Combine two observations of the same token.
+        A later reset means a new window, otherwise the lowest remaining
+        count is the most recent one.
+        """
+        if other.reset > self.reset:
+            self.remaining, self.reset = other.remaining, other.reset
+        elif other.reset == self.reset:
+            self.remaining = min(self.remaining, other.remaining)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"remaining": self.remaining, "reset": self.reset}
+
+
+class RateLimitBudget:
+    """
+    Rate limit budget of a pool of GitHub tokens.
+    It is updated from the X-RateLimit-* headers of every response,
+    so no extra request to /rate_limit is needed, and shared between
+    workers through Redis. Requests use the token with the most remaining
+    requests, and `reserve` requests of every token are left for reviews
+    which have already started.
+    """
+
+    def __init__(
+            self,
+            redis: RedisClient,
+            tokens: List[Optional[str]],
+            reserve: int,
+            sync_interval: float,
+            name: str = "github_rate_limit",
+    ) -> None:
+        self.redis = redis
+        self.tokens = tokens
+        self.reserve = reserve
+        self.sync_interval = sync_interval
+        self.name = name
+        self._budgets: Dict[Optional[str], TokenBudget] = {}
+        self._synced_at: Dict[Optional[str], float] = {}
+        self._next_token = 0
+
+    def pick_token(self) -> Optional[str]:
+        """
+        Return the available token with the most remaining requests.
+        Tokens which have not been used yet come first, ties are rotated.
+        """
+        now = time.time()
+        best_token, best_remaining = None, -1
+        for offset in range(len(self.tokens)):
+            token = self.tokens[(self._next_token + offset) % len(self.tokens)]
+            budget = self._budgets.get(token)
+            if budget is None or budget.reset <= now:
+                remaining = math.inf
+            else:
+                remaining = budget.remaining
+            if remaining > best_remaining:
+                best_token, best_remaining = token, remaining
+        self._next_token = (self._next_token + 1) % len(self.tokens)
+        return best_token
+
+    async def update(self, token: Optional[str], headers: Mapping[str, str]) -> None:
+        """Record the rate limit headers of a response made with `token`."""
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        if remaining is None or reset is None:
+            return None
+        try:
+            observed = TokenBudget(int(remaining), float(reset))
+        except (TypeError, ValueError):
+            return None
+
+        budget = self._budgets.get(token)
+        if budget is None:
+            budget = self._budgets[token] = observed
+        else:
+            budget.merge(observed)
+
+        now = time.time()
+        # Redis is updated at most every `sync_interval` seconds per token,
+        # and on every response once the token is running out.
+        if (
+                now - self._synced_at.get(token, 0.0) < self.sync_interval
+                and budget.remaining > self.reserve
+        ):
+            return None
+        self._synced_at[token] = now
+        expire = max(int(budget.reset - now) + 1, 1)
+        await self.redis.set(self._get_key(token), budget.as_dict(), expire=expire)
+
+    async def refresh(self) -> None:
+        """Merge the budgets recorded by other workers."""
+        keys = [self._get_key(token) for token in self.tokens]
+        for token, data in zip(self.tokens, await self.redis.mget(keys)):
+            if data is None:
+                continue
+            observed = TokenBudget(int(data["remaining"]), float(data["reset"]))
+            if token in self._budgets:
+                self._budgets[token].merge(observed)
+            else:
+                self._budgets[token] = observed
+
+    async def retry_after(self) -> int:
+        """
+        Return 0 when any token can still make requests,
+        otherwise the number of seconds until the first token is reset.
+        """
+        await self.refresh()
+        now = time.time()
+        resets = []
+        for token in self.tokens:
+            budget = self._budgets.get(token)
+            if budget is None or budget.is_available(self.reserve, now):
+                return 0
+            resets.append(budget.reset)
+        retry_after = max(math.ceil(min(resets) - now), 1)
+        logging.warning(f"GitHub rate limit is exhausted for {retry_after}s")
+        return retry_after
+
+    def _get_key(self, token: Optional[str]) -> str:
+        token_hash = sha256((token or "").encode("utf-8")).hexdigest()[:16]
+        return f"{self.name}:{token_hash}"
@@ -1,10 +1,25 @@
 import json
 import logging
-from typing import Optional
-
-import redis.asyncio as redis
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+from auto_review_tool.core.codec import CacheCodec
 from auto_review_tool.core.config import settings
+from auto_review_tool.core.tracing import tracer
+
+# Locks are only extended or released by the holder of their token.
+EXTEND_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 
 
 class RedisClient:
@@ -12,11 +27,20 @@ class RedisClient:
         self.redis_url = settings.REDIS_URL
         self.redis = None
         self.is_connected = False
+        self.codec = CacheCodec(
+            serializer=settings.REDIS_SERIALIZER,
+            compression=settings.REDIS_COMPRESSION,
+            compression_threshold=settings.REDIS_COMPRESSION_THRESHOLD,
+        )
 
     async def connect(self) -> None:
         """Connecting to Redis."""
+        # Imported here, as commands which do not use Redis need not load it.
+        import redis.asyncio as redis
+
         try:
             self.redis = await redis.from_url(self.redis_url)
+            await self.redis.ping()
             self.is_connected = True
             logging.info("Redis is connected")
         except Exception as e:
@@ -25,29 +49,220 @@ class RedisClient:
 
     async def close(self) -> None:
         """Close the connection to Redis."""
+        self.is_connected = False
         if self.redis:
             await self.redis.aclose()
+            self.redis = None
             logging.info("Redis connection closed")
 
     async def get(self, key: str) -> Optional[dict]:
         """Get data from cache."""
+        if not self.is_connected:
+            return None
+        with tracer.span("redis.get", key=key) as span:
+            try:
+                data = await self.redis.get(key)
+                span.set_attribute("hit", data is not None)
+                return self.codec.decode(data)
+            except Exception as e:
+                span.set_attribute("error", str(e))
+                logging.error(f"Error getting data from Redis: {e}")
+                return None
+
+    async def set(self, key: str, value: dict, expire: int = 3600) -> None:
+        """Save data to cache."""
+        if not self.is_connected:
+            return None
+        with tracer.span("redis.set", key=key) as span:
+            try:
+                await self.redis.set(key, self.codec.encode(value), ex=expire)
+            except Exception as e:
+                span.set_attribute("error", str(e))
+                logging.error(f"Error saving data to Redis: {e}")
+
+    async def acquire_lock(
+            self,
+            key: str,
+            token: str,
+            lease: float,
+    ) -> Optional[bool]:
+        """
+        Try to take a lock which expires after `lease` seconds.
+        :return: Whether the lock was taken, None if Redis is not available.
+        """
         if not self.is_connected:
             return None
         try:
-            data = await self.redis.get(key)
-            return json.loads(data) if data else None
+            return bool(
+                await self.redis.set(key, token, nx=True, px=int(lease * 1000))
+            )
         except Exception as e:
-            logging.error(f"Error getting data from Redis: {e}")
+            logging.error(f"Error acquiring lock in Redis: {e}")
             return None
 
-    async def set(self, key: str, value: dict, expire: int = 3600) -> None:
-        """Save data to cache."""
+    async def extend_lock(self, key: str, token: str, lease: float) -> bool:
+        """Renew the lease of a lock, if it is still held with `token`."""
+        if not self.is_connected:
+            return False
+        try:
+            return bool(
+                await self.redis.eval(
+                    EXTEND_LOCK_SCRIPT, 1, key, token, int(lease * 1000)
+                )
+            )
+        except Exception as e:
+            logging.error(f"Error extending lock in Redis: {e}")
+            return False
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """Release a lock, if it is still held with `token`."""
+        if not self.is_connected:
+            return None
+        try:
+            await self.redis.eval(RELEASE_LOCK_SCRIPT, 1, key, token)
+        except Exception as e:
+            logging.error(f"Error releasing lock in Redis: {e}")
+
+    async def run_script(
+            self,
+            script: str,
+            keys: List[str],
+            args: List[Any],
+    ) -> Optional[Any]:
+        """
+        Run a Lua script, which Redis runs atomically.
+        :return: The result of the script, None if Redis is not available.
+        """
+        if not self.is_connected:
+            return None
+        try:
+            return await self.redis.eval(script, len(keys), *keys, *args)
+        except Exception as e:
+            logging.error(f"Error running a script in Redis: {e}")
+            return None
+
+    async def push(self, queue_key: str, value: Any) -> bool:
+        """Append a value to the end of a list used as a queue."""
+        if not self.is_connected:
+            return False
+        try:
+            await self.redis.rpush(queue_key, json.dumps(value))
+            return True
+        except Exception as e:
+            logging.error(f"Error pushing data to Redis: {e}")
+            return False
+
+    async def move(
+            self,
+            source_key: str,
+            destination_key: str,
+            timeout: float = 0,
+    ) -> Optional[Any]:
+        """
+        Take a value from the beginning of a queue and append it to another
+        list in one step, waiting up to `timeout` seconds for one to appear.
+        The value stays in Redis until it is removed from the other list.
+        """
         if not self.is_connected:
             return None
         try:
-            await self.redis.set(key, json.dumps(value), ex=expire)
+            item = await self.redis.blmove(
+                source_key, destination_key, timeout, "LEFT", "RIGHT"
+            )
         except Exception as e:
-            logging.error(f"Error saving data to Redis: {e}")
+            logging.error(f"Error moving data in Redis: {e}")
+            return None
+        return json.loads(item) if item else None
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get many values from cache in a single round trip."""
+        if not self.is_connected or not keys:
+            return [None] * len(keys)
+        with tracer.span("redis.mget", keys=len(keys)) as span:
+            try:
+                values = await self.redis.mget(keys)
+                span.set_attribute("hits", sum(data is not None for data in values))
+                return [self.codec.decode(data) for data in values]
+            except Exception as e:
+                span.set_attribute("error", str(e))
+                logging.error(f"Error getting data from Redis: {e}")
+                return [None] * len(keys)
+
+    async def mget_with_ttl(
+            self,
+            keys: List[str],
+    ) -> List[Tuple[Optional[Any], Optional[float]]]:
+        """
+        Get many values together with their remaining TTL in seconds
+        in a single round trip. The TTL is None for keys without expiration.
+        """
+        if not self.is_connected or not keys:
+            return [(None, None)] * len(keys)
+        with tracer.span("redis.mget", keys=len(keys)) as span:
+            try:
+                pipeline = self.redis.pipeline(transaction=False)
+                for key in keys:
+                    pipeline.get(key)
+                    pipeline.pttl(key)
+                results = await pipeline.execute()
+            except Exception as e:
+                span.set_attribute("error", str(e))
+                logging.error(f"Error getting data from Redis: {e}")
+                return [(None, None)] * len(keys)
+        values = []
+        for data, pttl in zip(results[::2], results[1::2]):
+            ttl = pttl / 1000 if pttl is not None and pttl > 0 else None
+            values.append((self.codec.decode(data), ttl))
+        return values
+
+    async def mset_with_ttl(self, mapping: Dict[str, Any], expire: int = 3600) -> None:
+        """Save many values to cache in a single pipeline."""
+        async with self.batch() as batch:
+            for key, value in mapping.items():
+                batch.set(key, value, expire=expire)
+
+    @asynccontextmanager
+    async def batch(self) -> AsyncIterator["RedisBatch"]:
+        """
+        Collect writes and send them to Redis in one pipeline on exit.
+        Usage:
+            async with redis_client.batch() as batch:
+                batch.set("key", value, expire=60)
+        """
+        batch = RedisBatch(self)
+        yield batch
+        await batch.flush()
+
+
+class RedisBatch:
+    """Writes collected by RedisClient.batch()."""
+
+    def __init__(self, client: RedisClient) -> None:
+        self.client = client
+        self.writes: Dict[int, Dict[str, Any]] = {}
+
+    def set(self, key: str, value: Any, expire: int = 3600) -> None:
+        """Queue a value to be saved to cache."""
+        self.writes.setdefault(expire, {})[key] = value
+
+    async def flush(self) -> None:
+        """Send all queued writes to Redis."""
+        if not self.client.is_connected or not self.writes:
+            self.writes = {}
+            return None
+        keys = sum(len(mapping) for mapping in self.writes.values())
+        with tracer.span("redis.mset", keys=keys) as span:
+            try:
+                pipeline = self.client.redis.pipeline(transaction=False)
+                for expire, mapping in self.writes.items():
+                    for key, value in mapping.items():
+                        pipeline.set(key, self.client.codec.encode(value), ex=expire)
+                await pipeline.execute()
+            except Exception as e:
+                span.set_attribute("error", str(e))
+                logging.error(f"Error saving data to Redis: {e}")
+            finally:
+                self.writes = {}
 
 
 redis_client = RedisClient()
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.sqlite_store import SQLiteStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo_url TEXT NOT NULL,
+    commit_sha TEXT NOT NULL,
+    candidate_level TEXT NOT NULL,
+    assignment_hash TEXT NOT NULL,
+    found_files TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS review_results_key ON review_results (
+    repo_url, commit_sha, candidate_level, assignment_hash
+);
+CREATE INDEX IF NOT EXISTS review_results_created_at ON review_results (
+    created_at
+);
+"""
+COLUMNS = (
+    "id",
+    "repo_url",
+    "commit_sha",
+    "candidate_level",
+    "assignment_hash",
+    "found_files",
+    "analysis",
+    "created_at",
+)
+# Columns which list_results can filter by.
+FILTERS = ("repo_url", "commit_sha", "candidate_level", "assignment_hash")
+# Queries are written out in full, only the conditions on the columns
+# in FILTERS are added to SELECT_RESULTS, and values are always bound.
+SELECT_RESULTS = (
+    "SELECT id, repo_url, commit_sha, candidate_level, assignment_hash, "
+    "found_files, analysis, created_at FROM review_results"
+)
+INSERT_RESULT = (
+    "INSERT OR REPLACE INTO review_results (repo_url, commit_sha, "
+    "candidate_level, assignment_hash, found_files, analysis, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+class ResultStore(SQLiteStore):
+    """
+    Persistent store of finished reviews in SQLite.
+    Results are keyed by repository, commit, candidate level and the hash
+    of the assignment, so a repository which has not got new commits
+    is answered without fetching it again.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path, SCHEMA, "Result store")
+
+    async def get(
+            self,
+            repo_url: str,
+            commit_sha: str,
+            candidate_level: str,
+            assignment_hash: str,
+    ) -> Optional[Dict[str, Any]]:
+        """Get the result of a review of a commit, if there is one."""
+        results = await self.list_results(
+            repo_url=repo_url,
+            commit_sha=commit_sha,
+            candidate_level=candidate_level,
+            assignment_hash=assignment_hash,
+            limit=1,
+        )
+        return results[0] if results else None
+
+    async def get_by_id(self, result_id: int) -> Optional[Dict[str, Any]]:
+        """Get a result by its id."""
+        rows = await asyncio.to_thread(
+            self._run,
+            lambda connection: connection.execute(
+                SELECT_RESULTS + " WHERE id = ?", (result_id,)
+            ).fetchall(),
+        )
+        return self._to_dict(rows[0]) if rows else None
+
+    async def save(
+            self,
+            repo_url: str,
+            commit_sha: str,
+            candidate_level: str,
+            assignment_hash: str,
+            found_files: List[str],
+            analysis: str,
+    ) -> None:
+        """Save the result of a review, replacing an older one of the commit."""
+        values = (
+            repo_url,
+            commit_sha,
+            candidate_level,
+            assignment_hash,
+            json.dumps(found_files),
+            analysis,
+            time.time(),
+        )
+        await asyncio.to_thread(
+            self._run,
+            lambda connection: connection.execute(INSERT_RESULT, values),
+        )
+
+    async def list_results(
+            self,
+            limit: int = 50,
+            offset: int = 0,
+            **filters: Optional[str],
+    ) -> List[Dict[str, Any]]:
+        """
+        List results, newest first.
+        :param filters: Values of the columns in FILTERS to match,
+                        None values are ignored.
+        """
+        conditions = []
+        params: List[Any] = []
+        for column, value in filters.items():
+            if column not in FILTERS:
+                raise ValueError(f"Results cannot be filtered by {column}")
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        rows = await asyncio.to_thread(
+            self._run,
+            lambda connection: connection.execute(
+                SELECT_RESULTS + where + " ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall(),
+        )
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _to_dict(row: tuple) -> Dict[str, Any]:
+        result = dict(zip(COLUMNS, row))
+        result["found_files"] = json.loads(result["found_files"])
+        return result
+
+
+result_store = ResultStore(settings.RESULT_STORE_PATH)
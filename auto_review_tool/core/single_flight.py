@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.redis_client import RedisClient, redis_client
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls made with the same key.
+    Within a worker, the call runs in its own task, which the leader and the
+    followers await, so that a caller which is cancelled, e.g. because its
+    client disconnected, does not cancel the call of the others.
+    Across workers, the leader holds a Redis lock with a short lease,
+    renewed while its call runs. Followers wait for the lock to be released
+    and only then make the call, which by then is answered from the cache.
+    """
+
+    def __init__(
+            self,
+            redis: RedisClient,
+            lease: float,
+            wait_timeout: float,
+            poll_interval: float,
+    ) -> None:
+        self.redis = redis
+        self.lease = lease
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Call `fn`, unless a call with the same key is already running."""
+        task = self._calls.get(key)
+        if task is not None:
+            logging.info(f"Waiting for the running call of {key}")
+        else:
+            task = asyncio.create_task(self._call_with_lock(key, fn))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved when every caller was cancelled.
+        if not task.cancelled():
+            task.exception()
+
+    async def _call_with_lock(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        if not self.redis.is_connected:
+            return await fn()
+
+        lock_key = f"single_flight:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            acquired = await self.redis.acquire_lock(lock_key, token, self.lease)
+            if acquired:
+                break
+            # Without Redis the call is not deduplicated across workers.
+            if acquired is None:
+                return await fn()
+            if time.monotonic() > deadline:
+                logging.warning(f"Timed out waiting for the lock of {key}")
+                return await fn()
+            await asyncio.sleep(self.poll_interval)
+
+        renewal = asyncio.create_task(self._renew_lock(lock_key, token))
+        try:
+            return await fn()
+        finally:
+            renewal.cancel()
+            await self.redis.release_lock(lock_key, token)
+
+    async def _renew_lock(self, lock_key: str, token: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not await self.redis.extend_lock(lock_key, token, self.lease):
+                logging.warning(f"Lost the lock {lock_key}")
+                return None
+
+
+single_flight = SingleFlight(
+    redis_client,
+    lease=settings.SINGLE_FLIGHT_LEASE,
+    wait_timeout=settings.SINGLE_FLIGHT_WAIT_TIMEOUT,
+    poll_interval=settings.SINGLE_FLIGHT_POLL_INTERVAL,
+)
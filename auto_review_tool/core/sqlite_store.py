@@ -0,0 +1,56 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SQLiteStore:
+    """
+    Base of the stores kept in SQLite.
+    The database is opened on first use and its schema is created then.
+    Queries run in a thread, as the sqlite3 module is blocking,
+    and one at a time, as they share the connection.
+    """
+
+    def __init__(self, path: str, schema: str, name: str) -> None:
+        """
+        :param schema: Script creating the tables, if they do not exist.
+        :param name: Name of the store in the logs.
+        """
+        self.path = path
+        self.schema = schema
+        self.name = name
+        self.connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL lets the API and the workers read while one of them writes.
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.schema)
+            self.connection = connection
+            logging.info(f"{self.name} is opened at {self.path}")
+        return self.connection
+
+    async def connect(self) -> None:
+        """Open the database and create its tables."""
+        await asyncio.to_thread(self._run, lambda connection: None)
+
+    async def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+                logging.info(f"{self.name} closed")
+
+    def _run(self, query: Callable[[sqlite3.Connection], T]) -> T:
+        """Run a query in a transaction, it is called in a thread."""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                return query(connection)
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from hashlib import sha256
+from typing import Any, Dict, Optional
+
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.sqlite_store import SQLiteStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assignment_templates (
+    id TEXT PRIMARY KEY,
+    assignment_description TEXT NOT NULL,
+    rubric TEXT,
+    created_at REAL NOT NULL
+);
+"""
+COLUMNS = ("id", "assignment_description", "rubric", "created_at")
+SELECT_TEMPLATE = (
+    "SELECT id, assignment_description, rubric, created_at "
+    "FROM assignment_templates WHERE id = ?"
+)
+INSERT_TEMPLATE = (
+    "INSERT OR IGNORE INTO assignment_templates "
+    "(id, assignment_description, rubric, created_at) VALUES (?, ?, ?, ?)"
+)
+
+
+def get_template_id(assignment_description: str, rubric: Optional[str]) -> str:
+    """Templates are identified by the hash of their content."""
+    content = f"{len(assignment_description)}:{assignment_description}{rubric or ''}"
+    return sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+class TemplateStore(SQLiteStore):
+    """
+    Persistent store of assignment templates in SQLite.
+    A template is the description and the rubric of an assignment,
+    registered once and then referenced by its id in review requests,
+    so that they are not sent with every review of a cohort.
+    Templates never change, so they are kept in memory once read.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path, SCHEMA, "Template store")
+        self._templates: Dict[str, Dict[str, Any]] = {}
+
+    async def close(self) -> None:
+        """Close the database and forget the templates read from it."""
+        await super().close()
+        self._templates.clear()
+
+    async def register(
+            self,
+            assignment_description: str,
+            rubric: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Save a template. Registering the same assignment again
+        returns the existing template.
+        """
+        template_id = get_template_id(assignment_description, rubric)
+        values = (template_id, assignment_description, rubric, time.time())
+        await asyncio.to_thread(
+            self._run,
+            lambda connection: connection.execute(INSERT_TEMPLATE, values),
+        )
+        return await self.get(template_id)
+
+    async def get(self, template_id: str) -> Optional[Dict[str, Any]]:
+        """Get a template by its id."""
+        if template_id in self._templates:
+            return self._templates[template_id]
+        rows = await asyncio.to_thread(
+            self._run,
+            lambda connection: connection.execute(
+                SELECT_TEMPLATE, (template_id,)
+            ).fetchall(),
+        )
+        if not rows:
+            return None
+        template = dict(zip(COLUMNS, rows[0]))
+        self._templates[template_id] = template
+        return template
+
+
+template_store = TemplateStore(settings.TEMPLATE_STORE_PATH)
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from httpx import AsyncClient
+
+from auto_review_tool.core.config import settings
+
+# Id of the HTTP request or job being handled, also added to every log record.
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_current_span_var: ContextVar[Optional["Span"]] = ContextVar(
+    "current_span", default=None
+)
+
+
+class Span:
+    """A timed operation of a request, with its parent and attributes."""
+
+    def __init__(
+            self,
+            name: str,
+            trace_id: str,
+            parent_id: Optional[str],
+            attributes: Dict[str, Any],
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.request_id = request_id_var.get()
+        self.attributes = attributes
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "request_id": self.request_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": (self.end_time - self.start_time) / 1e6,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+class JsonLinesExporter:
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    async def export(self, spans: List[Span]) -> None:
+        lines = "".join(
+            json.dumps(span.as_dict(), default=str) + "\n" for span in spans
+        )
+        await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+    async def close(self) -> None:
+        pass
+
+
+class OtlpExporter:
+    """Sends finished spans to an OpenTelemetry collector with OTLP/HTTP JSON."""
+
+    def __init__(self, endpoint: str, service_name: str) -> None:
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.client = AsyncClient(timeout=10.0)
+
+    async def export(self, spans: List[Span]) -> None:
+        payload = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            _to_otlp_attribute("service.name", self.service_name)
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "auto_review_tool"},
+                            "spans": [self._to_otlp_span(span) for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        response = await self.client.post(self.endpoint, json=payload)
+        response.raise_for_status()
+
+    @staticmethod
+    def _to_otlp_span(span: Span) -> Dict[str, Any]:
+        attributes = dict(span.attributes)
+        if span.request_id is not None:
+            attributes["request.id"] = span.request_id
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            # SPAN_KIND_INTERNAL
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_time),
+            "endTimeUnixNano": str(span.end_time),
+            "attributes": [
+                _to_otlp_attribute(key, value) for key, value in attributes.items()
+            ],
+            # STATUS_CODE_OK or STATUS_CODE_ERROR
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id is not None:
+            otlp_span["parentSpanId"] = span.parent_id
+        return otlp_span
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def _to_otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed_value = {"boolValue": value}
+    elif isinstance(value, int):
+        typed_value = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed_value = {"doubleValue": value}
+    else:
+        typed_value = {"stringValue": str(value)}
+    return {"key": key, "value": typed_value}
+
+
+class Tracer:
+    """
+    Records spans of requests and exports them in batches from a background
+    task every `export_interval` seconds. Without an exporter spans are not
+    recorded at all, so tracing costs nothing when it is disabled.
+    """
+
+    def __init__(self, export_interval: float, max_queue_size: int = 10000) -> None:
+        self.exporter = None
+        self.export_interval = export_interval
+        self.max_queue_size = max_queue_size
+        self._finished: List[Span] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def configure(self, exporter: Optional[str] = None) -> None:
+        """Create the exporter chosen by settings.TRACING_EXPORTER."""
+        exporter = exporter or settings.TRACING_EXPORTER
+        if exporter == "jsonl":
+            self.exporter = JsonLinesExporter(settings.TRACING_FILE)
+        elif exporter == "otlp":
+            self.exporter = OtlpExporter(
+                settings.TRACING_OTLP_ENDPOINT, settings.TRACING_SERVICE_NAME
+            )
+        else:
+            self.exporter = None
+
+    async def start(self) -> None:
+        """Start exporting spans in the background."""
+        self.configure()
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._export_periodically())
+            logging.info(f"Tracing is enabled with {settings.TRACING_EXPORTER}")
+
+    async def shutdown(self) -> None:
+        """Stop the background export and export the remaining spans."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self.exporter is not None:
+            await self.exporter.close()
+            self.exporter = None
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Any]:
+        """
+        Measure an operation. Spans started inside it, also in tasks
+        created inside it, become its children.
+        Usage:
+            with tracer.span("github.request", url=url) as span:
+                span.set_attribute("http.status_code", 200)
+        """
+        if not self.enabled:
+            yield _NoopSpan()
+            return
+        parent = _current_span_var.get()
+        span = Span(
+            name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+        token = _current_span_var.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            try:
+                _current_span_var.reset(token)
+            except ValueError:
+                # An async generator closed in another context, e.g. by
+                # the garbage collector, cannot restore the parent span.
+                pass
+            span.end_time = time.time_ns()
+            if len(self._finished) < self.max_queue_size:
+                self._finished.append(span)
+
+    async def flush(self) -> None:
+        """Export the finished spans."""
+        spans, self._finished = self._finished, []
+        if not spans or self.exporter is None:
+            return None
+        try:
+            await self.exporter.export(spans)
+        except Exception as e:
+            logging.error(f"Failed to export {len(spans)} spans: {e}")
+
+    async def _export_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.export_interval)
+            await self.flush()
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds the id of the current request to log records as `request_id`."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        return True
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+tracer = Tracer(export_interval=settings.TRACING_EXPORT_INTERVAL)
@@ -0,0 +1,74 @@
+import asyncio
+import ipaddress
+import socket
+from typing import Any, Dict
+from urllib.parse import urlsplit
+
+from httpx import AsyncClient, Request
+
+from auto_review_tool.core.config import settings
+
+
+async def check_webhook_url(url: str) -> None:
+    """
+    Check that a webhook only reaches public http(s) services, so that
+    requests cannot make the worker call services of its own network.
+    Hosts in settings.WEBHOOK_ALLOWED_HOSTS are always allowed,
+    and when it is set, no other hosts are.
+    :raises ValueError: If the webhook is not allowed.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("Webhooks must be http or https URLs.")
+    host = parts.hostname.lower()
+    if settings.WEBHOOK_ALLOWED_HOSTS:
+        if host not in settings.WEBHOOK_ALLOWED_HOSTS:
+            raise ValueError(f"Webhooks to {host} are not allowed.")
+        return None
+
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(
+            host, parts.port, type=socket.SOCK_STREAM
+        )
+    except OSError as e:
+        raise ValueError(f"The host of the webhook cannot be resolved: {e}")
+    for *_, address in addresses:
+        if not _is_public_address(address[0]):
+            raise ValueError(f"Webhooks to {host} are not allowed.")
+
+
+def create_webhook_client() -> AsyncClient:
+    """
+    Create the client sending webhooks. Unless hosts are allowed
+    in settings.WEBHOOK_ALLOWED_HOSTS, the address of every connection
+    is checked as soon as it is made, as the host may resolve to another
+    address than when its URL was checked (DNS rebinding).
+    Proxies of the environment are not used, so that the checked address
+    is the one of the host.
+    """
+    event_hooks = {}
+    if not settings.WEBHOOK_ALLOWED_HOSTS:
+        event_hooks["request"] = [_trace_connections]
+    return AsyncClient(
+        timeout=settings.WEBHOOK_TIMEOUT, trust_env=False, event_hooks=event_hooks
+    )
+
+
+async def _trace_connections(request: Request) -> None:
+    request.extensions["trace"] = _check_connection
+
+
+async def _check_connection(event_name: str, info: Dict[str, Any]) -> None:
+    """httpcore trace callback, called before the request is sent."""
+    if event_name != "connection.connect_tcp.complete":
+        return None
+    stream = info["return_value"]
+    address = stream.get_extra_info("server_addr")
+    if address is None or not _is_public_address(address[0]):
+        await stream.aclose()
+        raise ValueError(f"Webhooks to {address} are not allowed.")
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    return ip.is_global and not ip.is_multicast
@@ -1,11 +1,20 @@
 import logging
 from contextlib import asynccontextmanager
+from typing import Callable
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 
-from auto_review_tool.api import review
+from auto_review_tool import initialize_auto_review_tool
+from auto_review_tool.api import assignments, jobs, metrics, results, review
 from auto_review_tool.core.logging_config import setup_logging
+from auto_review_tool.core.metrics import mark_process_dead
 from auto_review_tool.core.redis_client import redis_client
+from auto_review_tool.core.result_store import result_store
+from auto_review_tool.core.template_store import template_store
+from auto_review_tool.core.tracing import new_request_id, request_id_var, tracer
+from auto_review_tool.services import review as review_service
+
+REQUEST_ID_HEADER = "X-Request-ID"
 
 setup_logging()
 logger = logging.getLogger("auto_review_tool")
@@ -13,10 +22,24 @@ logger = logging.getLogger("auto_review_tool")
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI) -> None:
-    """Application life cycle."""
+    """
+    Application life cycle. The clients are created here rather than
+    when the modules are imported, and injected into the endpoints
+    as dependencies.
+    """
+    initialize_auto_review_tool()
     await redis_client.connect()
+    await result_store.connect()
+    await template_store.connect()
+    await review_service.connect_clients()
+    await tracer.start()
     yield
+    await tracer.shutdown()
+    await review_service.close_clients()
+    await template_store.close()
+    await result_store.close()
     await redis_client.close()
+    mark_process_dead()
 
 
 app = FastAPI(
@@ -26,4 +49,26 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next: Callable) -> Response:
+    """
+    Give every request an id, taken from the X-Request-ID header when
+    the client sent one, and trace the request under it.
+    """
+    request_id = request.headers.get(REQUEST_ID_HEADER) or new_request_id()
+    request_id_var.set(request_id)
+    with tracer.span(
+            f"{request.method} {request.url.path}", method=request.method
+    ) as span:
+        response = await call_next(request)
+        span.set_attribute("http.status_code", response.status_code)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
 app.include_router(review.router, prefix="/api", tags=["Review"])
+app.include_router(jobs.router, prefix="/api", tags=["Jobs"])
+app.include_router(results.router, prefix="/api", tags=["Results"])
+app.include_router(assignments.router, prefix="/api", tags=["Assignments"])
+app.include_router(metrics.router)
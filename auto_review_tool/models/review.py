@@ -1,17 +1,103 @@
-from typing import List, Literal
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl, model_validator
 
+from auto_review_tool.core.config import settings
 
-class ReviewRequest(BaseModel):
+
+class AssignmentRequest(BaseModel):
+    """
+    The assignment of a review: its description and an optional rubric,
+    or the id of a registered AssignmentTemplate instead.
+    """
+    assignment_description: Optional[str] = None
+    rubric: Optional[str] = None
+    assignment_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_assignment(self) -> "AssignmentRequest":
+        if self.assignment_description is None and self.assignment_id is None:
+            raise ValueError("assignment_description or assignment_id is required")
+        return self
+
+
+class ReviewRequest(AssignmentRequest):
     """
     A ReviewRequest model.
     """
-    assignment_description: str
     github_repo_url: HttpUrl
     candidate_level: Literal["Junior", "Middle", "Senior"]
+    # Branch, tag or commit SHA to review, the default branch when not set.
+    ref: Optional[str] = Field(default=None, pattern=r"^[\w-]+([./][\w-]+)*$")
 
 
 class ReviewResponse(BaseModel):
     found_files: List[str]
     analysis: str
+
+
+class BatchReviewRequest(AssignmentRequest):
+    """
+    Reviews of many repositories for the same assignment.
+    """
+    github_repo_urls: List[HttpUrl] = Field(
+        min_length=1, max_length=settings.BATCH_MAX_REPOS
+    )
+    candidate_level: Literal["Junior", "Middle", "Senior"]
+
+
+class AssignmentTemplateRequest(BaseModel):
+    assignment_description: str
+    # Criteria the code is reviewed by, in addition to the candidate level.
+    rubric: Optional[str] = None
+
+
+class AssignmentTemplate(AssignmentTemplateRequest):
+    """
+    A registered assignment, referenced by its id in review requests.
+    """
+    id: str
+    created_at: float
+
+
+class BatchReviewItem(BaseModel):
+    """
+    The result of one repository of a batch review.
+    """
+    github_repo_url: str
+    status: Literal["completed", "failed"]
+    result: Optional[ReviewResponse] = None
+    error: Optional[str] = None
+
+
+class ReviewJobRequest(ReviewRequest):
+    """
+    A review to run in the background.
+    The finished job is POSTed to webhook_url, if it is set.
+    """
+    webhook_url: Optional[HttpUrl] = None
+
+
+class ReviewJob(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "completed", "failed"]
+    result: Optional[ReviewResponse] = None
+    error: Optional[str] = None
+    # Runs of the job, it is run again when its worker stops.
+    attempts: int = 0
+    created_at: float
+    updated_at: float
+
+
+class ReviewResult(BaseModel):
+    """
+    A finished review kept in the result store.
+    """
+    id: int
+    repo_url: str
+    commit_sha: str
+    candidate_level: str
+    assignment_hash: str
+    found_files: List[str]
+    analysis: str
+    created_at: float
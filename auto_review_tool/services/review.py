@@ -0,0 +1,434 @@
+import asyncio
+import difflib
+import logging
+import math
+from contextlib import nullcontext
+from hashlib import sha256
+from typing import Any, AsyncContextManager, AsyncIterator, Dict, List, Optional, Tuple
+
+from auto_review_tool.clients.github_client import GitHubClient
+from auto_review_tool.clients.openai_client import OpenAIClient
+from auto_review_tool.core.admission import admission
+from auto_review_tool.core.cache import cache
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.metrics import REVIEWS_IN_PROGRESS, timed_stage
+from auto_review_tool.core.progress import ProgressCallback, report_progress
+from auto_review_tool.core.result_store import result_store
+from auto_review_tool.core.template_store import template_store
+from auto_review_tool.models.review import (
+    AssignmentRequest,
+    BatchReviewItem,
+    BatchReviewRequest,
+    ReviewRequest,
+    ReviewResponse,
+)
+
+# The clients of this process, created on first use, e.g. in the lifespan
+# of the app, instead of when the module is imported.
+github_client: Optional[GitHubClient] = None
+openai_client: Optional[OpenAIClient] = None
+
+
+def get_github_client() -> GitHubClient:
+    """Return the GitHub client, also used as a FastAPI dependency."""
+    global github_client
+    if github_client is None:
+        github_client = GitHubClient(
+            token=settings.GITHUB_TOKEN, tokens=settings.GITHUB_TOKENS
+        )
+    return github_client
+
+
+def get_openai_client() -> OpenAIClient:
+    """Return the OpenAI client, also used as a FastAPI dependency."""
+    global openai_client
+    if openai_client is None:
+        openai_client = OpenAIClient(api_key=settings.OPENAI_API_KEY)
+    return openai_client
+
+
+async def connect_clients() -> None:
+    """Create the clients and open their connection pools."""
+    await get_github_client().connect()
+    await get_openai_client().connect()
+
+
+async def close_clients() -> None:
+    """Close the connection pools of the clients which were created."""
+    if openai_client is not None:
+        await openai_client.close()
+    if github_client is not None:
+        await github_client.close()
+
+
+async def run_review(
+        request: ReviewRequest,
+        admission: Optional[AsyncContextManager] = None,
+        github_client: Optional[GitHubClient] = None,
+        openai_client: Optional[OpenAIClient] = None,
+) -> ReviewResponse:
+    """
+    Review a repository. Its head commit is resolved first, and commits
+    which were already reviewed for the same assignment and candidate level
+    are answered from the result store without fetching any files.
+    :param admission: Entered only when the repository is actually reviewed,
+                      so answers from the result store are not limited.
+    :param github_client: Client of the review, e.g. injected into an endpoint
+                          (default: the client of this process).
+    :param openai_client: The same for OpenAI.
+    """
+    github_client = github_client or get_github_client()
+    request = await resolve_assignment(request)
+    commit_sha = await github_client.get_head_commit(
+        str(request.github_repo_url), request.ref
+    )
+    stored_result = await get_stored_result(request, commit_sha)
+    if stored_result is not None:
+        return stored_result
+    async with admission or nullcontext():
+        result = await _review_repository(
+            request,
+            commit_sha,
+            github_client,
+            openai_client or get_openai_client(),
+        )
+    await store_result(request, commit_sha, result)
+    return result
+
+
+async def run_batch(
+        request: BatchReviewRequest,
+        concurrency: Optional[int] = None,
+        client_id: Optional[str] = None,
+        github_client: Optional[GitHubClient] = None,
+        openai_client: Optional[OpenAIClient] = None,
+) -> AsyncIterator[BatchReviewItem]:
+    """
+    Review many repositories for one assignment and yield their results
+    in the order they finish. A failed review does not stop the others.
+    Reviews only start while the GitHub rate limit budget allows it.
+    The reviews which are left are cancelled when the caller stops iterating.
+    :param concurrency: Reviews run at the same time
+                        (default: settings.BATCH_MAX_CONCURRENCY).
+    :param client_id: Client the reviews are admitted for, they wait until
+                      the limits of the client and of the service allow them.
+                      Reviews are not limited when it is None, e.g. in the CLI.
+    :param github_client: Client of the reviews (default: the client of this process).
+    :param openai_client: The same for OpenAI.
+    """
+    github_client = github_client or get_github_client()
+    semaphore = asyncio.Semaphore(concurrency or settings.BATCH_MAX_CONCURRENCY)
+    request = await resolve_assignment(request)
+
+    async def review(repo_url: str) -> BatchReviewItem:
+        async with semaphore:
+            await _wait_for_rate_limit(github_client)
+            review_request = ReviewRequest(
+                assignment_description=request.assignment_description,
+                rubric=request.rubric,
+                github_repo_url=repo_url,
+                candidate_level=request.candidate_level,
+            )
+            admitted = None
+            if client_id is not None:
+                admitted = admission.admit(client_id, max_wait=math.inf)
+            try:
+                with REVIEWS_IN_PROGRESS.labels(endpoint="batch").track_inprogress():
+                    result = await run_review(
+                        review_request,
+                        admitted,
+                        github_client=github_client,
+                        openai_client=openai_client,
+                    )
+            except Exception as e:
+                logging.error(f"Review of {repo_url} in a batch failed: {e}")
+                return BatchReviewItem(
+                    github_repo_url=repo_url, status="failed", error=str(e)
+                )
+            return BatchReviewItem(
+                github_repo_url=repo_url, status="completed", result=result
+            )
+
+    # The same repository is only reviewed once.
+    repo_urls = list(dict.fromkeys(str(url) for url in request.github_repo_urls))
+    logging.info(f"Reviewing a batch of {len(repo_urls)} repositories")
+    tasks = [asyncio.create_task(review(repo_url)) for repo_url in repo_urls]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def resolve_assignment(request: AssignmentRequest) -> AssignmentRequest:
+    """
+    Fill in the description and the rubric of the assignment
+    from its template, when the request references one.
+    """
+    if request.assignment_id is None:
+        return request
+    template = await template_store.get(request.assignment_id)
+    if template is None:
+        raise ValueError(f"Assignment {request.assignment_id} is not registered")
+    return request.model_copy(
+        update={
+            "assignment_description": template["assignment_description"],
+            "rubric": template["rubric"],
+        }
+    )
+
+
+async def _wait_for_rate_limit(github_client: GitHubClient) -> None:
+    """Wait until the GitHub rate limit budget allows a new review."""
+    while retry_after := await github_client.retry_after():
+        logging.warning(
+            f"GitHub rate limit is exhausted, pausing the batch for {retry_after}s"
+        )
+        await asyncio.sleep(retry_after)
+
+
+async def _review_repository(
+        request: ReviewRequest,
+        commit_sha: str,
+        github_client: GitHubClient,
+        openai_client: OpenAIClient,
+) -> ReviewResponse:
+    """
+    Fetch the repository at the commit and analyze its code.
+    When the repository was reviewed before, unchanged repositories are
+    answered with the previous review, and for small changes only the
+    changed files are fetched and sent to OpenAI with the previous review.
+    """
+    repo_url = str(request.github_repo_url)
+    if settings.GITHUB_FETCH_MODE == "archive":
+        all_file_names, file_contents, _files = await fetch_repository(
+            repo_url, commit_sha=commit_sha, github_client=github_client
+        )
+        analysis = await openai_client.analyze_code(
+            file_names=list(file_contents.keys()),
+            file_contents=list(file_contents.values()),
+            assignment_description=request.assignment_description,
+            candidate_level=request.candidate_level,
+            rubric=request.rubric,
+        )
+        return ReviewResponse(found_files=all_file_names, analysis=analysis)
+
+    files: List[Dict[str, Any]] = await github_client.get_repo_contents(
+        repo_url, commit_sha
+    )
+    all_file_names = [item["path"] for item in files]
+    state = await get_review_state(request)
+    file_shas = _get_file_shas(files)
+
+    if state is not None and file_shas is not None:
+        if state["files"] == file_shas:
+            logging.info(f"{repo_url} has not changed since the last review")
+            return ReviewResponse(
+                found_files=all_file_names, analysis=state["analysis"]
+            )
+        analysis = await _review_changes(
+            request, files, file_shas, state, github_client, openai_client
+        )
+        if analysis is not None:
+            await save_review_state(request, files, analysis)
+            return ReviewResponse(found_files=all_file_names, analysis=analysis)
+
+    file_contents = await github_client.get_file_contents(files)
+    analysis = await openai_client.analyze_code(
+        file_names=list(file_contents.keys()),
+        file_contents=list(file_contents.values()),
+        assignment_description=request.assignment_description,
+        candidate_level=request.candidate_level,
+        rubric=request.rubric,
+    )
+    await save_review_state(request, files, analysis)
+    return ReviewResponse(found_files=all_file_names, analysis=analysis)
+
+
+async def fetch_repository(
+        repo_url: str,
+        on_progress: Optional[ProgressCallback] = None,
+        commit_sha: Optional[str] = None,
+        github_client: Optional[GitHubClient] = None,
+) -> Tuple[List[str], Dict[str, str], Optional[List[Dict[str, Any]]]]:
+    """
+    Fetch the files of a repository.
+    :param commit_sha: Commit to fetch, the head of the default branch when None.
+    :param github_client: Client to fetch with (default: the client of this process).
+    :return: Paths of all files found, the contents of the fetched files
+             and the tree entries of the files (None in archive mode).
+    """
+    github_client = github_client or get_github_client()
+    if settings.GITHUB_FETCH_MODE == "archive":
+        file_contents = await github_client.get_archive_contents(repo_url, commit_sha)
+        report_progress(
+            on_progress,
+            "files_fetched",
+            done=len(file_contents),
+            total=len(file_contents),
+        )
+        return list(file_contents.keys()), file_contents, None
+
+    files: List[Dict[str, Any]] = await github_client.get_repo_contents(
+        repo_url, commit_sha
+    )
+    report_progress(on_progress, "tree_fetched", files=len(files))
+    all_file_names = [item["path"] for item in files]
+    file_contents = await github_client.get_file_contents(
+        files, on_progress=on_progress
+    )
+    return all_file_names, file_contents, files
+
+
+def get_assignment_hash(
+        assignment_description: str,
+        rubric: Optional[str] = None,
+) -> str:
+    assignment = assignment_description
+    if rubric:
+        assignment += f"\nRubric:\n{rubric}"
+    return sha256(assignment.encode("utf-8")).hexdigest()
+
+
+@timed_stage("result_lookup")
+async def get_stored_result(
+        request: ReviewRequest,
+        commit_sha: str,
+) -> Optional[ReviewResponse]:
+    """Get the stored result of a review of the commit, if there is one."""
+    stored_result = await result_store.get(
+        repo_url=str(request.github_repo_url),
+        commit_sha=commit_sha,
+        candidate_level=request.candidate_level,
+        assignment_hash=get_assignment_hash(
+            request.assignment_description, request.rubric
+        ),
+    )
+    if stored_result is None:
+        return None
+    logging.info(f"Found stored result of {request.github_repo_url}@{commit_sha}")
+    return ReviewResponse(
+        found_files=stored_result["found_files"],
+        analysis=stored_result["analysis"],
+    )
+
+
+@timed_stage("result_save")
+async def store_result(
+        request: ReviewRequest,
+        commit_sha: str,
+        result: ReviewResponse,
+) -> None:
+    """Keep the result of a review of the commit in the result store."""
+    await result_store.save(
+        repo_url=str(request.github_repo_url),
+        commit_sha=commit_sha,
+        candidate_level=request.candidate_level,
+        assignment_hash=get_assignment_hash(
+            request.assignment_description, request.rubric
+        ),
+        found_files=result.found_files,
+        analysis=result.analysis,
+    )
+
+
+def _get_review_state_key(request: ReviewRequest) -> str:
+    key = "".join(
+        [
+            str(request.github_repo_url),
+            request.assignment_description,
+            request.rubric or "",
+            request.candidate_level,
+            request.ref or "",
+        ]
+    )
+    return f"review_state:{sha256(key.encode('utf-8')).hexdigest()}"
+
+
+def _get_file_shas(files: List[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    """Map file paths to blob SHAs, or None if some SHAs are unknown."""
+    file_shas = {item["path"]: item.get("sha") for item in files}
+    if not all(file_shas.values()):
+        return None
+    return file_shas
+
+
+async def get_review_state(request: ReviewRequest) -> Optional[Dict[str, Any]]:
+    """Get the blob SHAs and the analysis of the last review of a repository."""
+    return await cache.get(_get_review_state_key(request))
+
+
+async def save_review_state(
+        request: ReviewRequest,
+        files: Optional[List[Dict[str, Any]]],
+        analysis: str,
+) -> None:
+    """Remember the reviewed blob SHAs, so the next review can be incremental."""
+    file_shas = _get_file_shas(files) if files is not None else None
+    if file_shas is None:
+        return None
+    await cache.set(
+        _get_review_state_key(request),
+        {"files": file_shas, "analysis": analysis},
+        expire=settings.REVIEW_STATE_TTL,
+    )
+
+
+async def _review_changes(
+        request: ReviewRequest,
+        files: List[Dict[str, Any]],
+        file_shas: Dict[str, str],
+        state: Dict[str, Any],
+        github_client: GitHubClient,
+        openai_client: OpenAIClient,
+) -> Optional[str]:
+    """
+    Update the previous review with the diffs of the changed files.
+    :return: The new analysis, or None if too much has changed
+             and the whole code should be reviewed again.
+    """
+    previous_shas: Dict[str, str] = state["files"]
+    changed = [item for item in files if previous_shas.get(item["path"]) != item["sha"]]
+    removed = [path for path in previous_shas if path not in file_shas]
+    if len(changed) > settings.INCREMENTAL_MAX_CHANGED_RATIO * len(files):
+        return None
+    logging.info(
+        f"Re-reviewing {len(changed)} changed and {len(removed)} removed files"
+    )
+
+    repo_url = str(request.github_repo_url)
+    previous_files = [
+        {
+            "path": item["path"],
+            "sha": previous_shas[item["path"]],
+            "url": github_client.get_blob_url(repo_url, previous_shas[item["path"]]),
+        }
+        for item in changed
+        if item["path"] in previous_shas
+    ]
+    new_contents = await github_client.get_file_contents(changed)
+    old_contents = await github_client.get_file_contents(previous_files)
+    diffs = {
+        path: _get_diff(path, old_contents.get(path, ""), content)
+        for path, content in new_contents.items()
+    }
+    return await openai_client.analyze_changes(
+        previous_analysis=state["analysis"],
+        diffs=diffs,
+        removed_files=removed,
+        assignment_description=request.assignment_description,
+        candidate_level=request.candidate_level,
+        rubric=request.rubric,
+    )
+
+
+def _get_diff(path: str, old_content: str, new_content: str) -> str:
+    return "".join(
+        difflib.unified_diff(
+            old_content.splitlines(keepends=True),
+            new_content.splitlines(keepends=True),
+            fromfile=f"a/{path}",
+            tofile=f"b/{path}",
+        )
+    )
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+from auto_review_tool.core.admission import admission
+from auto_review_tool.core.cache import cache
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.result_store import result_store
+from auto_review_tool.core.template_store import template_store
+
+
+def pytest_configure(config):
+    # The test modules import the app, which sets up logging,
+    # so its log file is moved out of the working directory first.
+    log_dir = tempfile.mkdtemp(prefix="auto-review-tool-tests-")
+    settings.LOG_FILE = f"{log_dir}/app.log"
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    cache.local.clear()
+    yield
+    cache.local.clear()
+
+
+@pytest.fixture(autouse=True)
+def isolated_admission():
+    # All test clients have the same address, so every test gets new limits.
+    with (
+        patch.object(admission, "_buckets", {}),
+        patch.object(admission, "_in_flight", {}),
+    ):
+        yield admission
+
+
+@pytest.fixture(autouse=True)
+def isolated_result_store(tmp_path):
+    with patch.object(result_store, "path", str(tmp_path / "reviews.db")):
+        yield result_store
+        asyncio.run(result_store.close())
+
+
+@pytest.fixture(autouse=True)
+def isolated_template_store(tmp_path):
+    with patch.object(template_store, "path", str(tmp_path / "templates.db")):
+        yield template_store
+        asyncio.run(template_store.close())
+
+
+@pytest.fixture
+def openai_stub_server():
+    """
+    Local stand-in for the OpenAI API, answering chat completions
+    after `server.latency` seconds.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            self.server.requests.append(request)
+            time.sleep(self.server.latency)
+            if request.get("stream"):
+                self._stream_answer(request)
+                return
+            body = json.dumps(
+                {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {
+                                "role": "assistant",
+                                "content": self.server.answer,
+                            },
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 10,
+                        "completion_tokens": 10,
+                        "total_tokens": 20,
+                    },
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream_answer(self, request):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for word in self.server.answer.split(" "):
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [
+                        {"index": 0, "delta": {"content": word + " "}}
+                    ],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.latency = 0.0
+    server.answer = (
+        "- Downsides/Comments: None\n- Rating: 5\n- Conclusion: Excellent code"
+    )
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_port}/v1"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,219 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from auto_review_tool.api.review import _get_client_id
+from auto_review_tool.clients.github_client import GitHubClient
+from auto_review_tool.clients.openai_client import OpenAIClient
+from auto_review_tool.core.admission import (
+    RELEASE_SLOT_SCRIPT,
+    AdmissionController,
+    AdmissionRejected,
+    admission,
+)
+from auto_review_tool.core.config import settings
+from auto_review_tool.main import app
+
+
+def _controller(redis_result=None, **limits):
+    redis = MagicMock()
+    redis.run_script = AsyncMock(return_value=redis_result)
+    options = {
+        "rate": 0,
+        "burst": 0,
+        "client_rate": 0,
+        "client_burst": 0,
+        "max_in_flight": 0,
+        "client_max_in_flight": 0,
+        "max_wait": 0,
+        "lease": 60,
+        **limits,
+    }
+    return AdmissionController(redis, **options)
+
+
+async def _review(controller, client_id="client"):
+    async with controller.admit(client_id):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_token_buckets_of_the_client_and_the_service():
+    controller = _controller(client_rate=0.5, client_burst=2, rate=0.1, burst=3)
+
+    await _review(controller, "a")
+    await _review(controller, "a")
+    with pytest.raises(AdmissionRejected) as client_limited:
+        await _review(controller, "a")
+    await _review(controller, "b")
+    with pytest.raises(AdmissionRejected) as overloaded:
+        await _review(controller, "c")
+
+    assert client_limited.value.status_code == 429
+    assert 1.9 < client_limited.value.retry_after <= 2
+    assert client_limited.value.retry_after_header == "2"
+    assert overloaded.value.status_code == 503
+    assert 9.9 < overloaded.value.retry_after <= 10
+
+
+@pytest.mark.asyncio
+async def test_in_flight_reviews_are_capped():
+    controller = _controller(client_max_in_flight=1, max_in_flight=2)
+
+    async with controller.admit("a"):
+        with pytest.raises(AdmissionRejected) as client_limited:
+            await _review(controller, "a")
+        async with controller.admit("b"):
+            with pytest.raises(AdmissionRejected) as overloaded:
+                await _review(controller, "c")
+    await _review(controller, "a")
+
+    assert client_limited.value.status_code == 429
+    assert overloaded.value.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_rejected_review_waits_for_admission():
+    controller = _controller(client_rate=20, client_burst=1, max_wait=1)
+
+    await asyncio.gather(_review(controller), _review(controller))
+
+    # Reviews which would wait for longer are rejected at once.
+    controller = _controller(client_rate=0.1, client_burst=1, max_wait=1)
+    await _review(controller)
+    with pytest.raises(AdmissionRejected):
+        await _review(controller)
+
+
+@pytest.mark.asyncio
+async def test_limits_are_shared_through_redis():
+    controller = _controller(redis_result=[2, 1500], rate=1, burst=1)
+
+    with pytest.raises(AdmissionRejected) as overloaded:
+        await _review(controller)
+    controller.redis.run_script.return_value = [0, 0]
+    await _review(controller)
+
+    assert overloaded.value.status_code == 503
+    assert overloaded.value.retry_after_header == "2"
+    assert controller.redis.run_script.await_args.args[0] == RELEASE_SLOT_SCRIPT
+
+
+@pytest.mark.asyncio
+async def test_unexpected_redis_reply_falls_back_to_local_limits():
+    controller = _controller(redis_result=0, client_rate=0.1, client_burst=1)
+
+    await _review(controller)
+    with pytest.raises(AdmissionRejected) as client_limited:
+        await _review(controller)
+
+    assert client_limited.value.status_code == 429
+    # Slots taken locally are not released in Redis.
+    assert controller.redis.run_script.await_count == 2
+
+
+def _request(api_key=None, host="10.0.0.1"):
+    headers = [] if api_key is None else [(b"x-api-key", api_key.encode())]
+    return Request({"type": "http", "headers": headers, "client": (host, 1234)})
+
+
+@patch.object(settings, "ADMISSION_API_KEYS", ["known"])
+def test_clients_are_only_told_apart_by_known_api_keys():
+    known = _get_client_id(_request("known"))
+
+    assert known.startswith("key:")
+    assert "known" not in known
+    assert _get_client_id(_request("known", host="10.0.0.2")) == known
+    # Unknown keys do not get limits of their own.
+    assert _get_client_id(_request("random")) == "ip:10.0.0.1"
+    assert _get_client_id(_request()) == "ip:10.0.0.1"
+
+
+@patch.object(OpenAIClient, "analyze_code", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_file_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_repo_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_head_commit", new_callable=AsyncMock)
+@patch.object(GitHubClient, "retry_after", new=AsyncMock(return_value=0))
+def test_review_endpoint_admission(
+        mock_get_head_commit,
+        mock_get_repo_contents,
+        mock_get_file_contents,
+        mock_analyze_code,
+):
+    mock_get_head_commit.side_effect = ["c1", "c2", "c1"]
+    mock_get_repo_contents.return_value = [{"path": "main.py", "type": "blob"}]
+    mock_get_file_contents.return_value = {"main.py": "print(1)"}
+    mock_analyze_code.return_value = "Good"
+    payload = {
+        "assignment_description": "Review this code.",
+        "github_repo_url": "https://github.com/test/repo",
+        "candidate_level": "Junior",
+    }
+    headers = {"X-API-Key": "secret"}
+
+    with (
+        patch.object(settings, "ADMISSION_API_KEYS", ["secret"]),
+        patch.object(admission, "client_rate", 0.01),
+        patch.object(admission, "client_burst", 1),
+        patch.object(admission, "_buckets", {}),
+        TestClient(app) as client,
+    ):
+        first = client.post("/api/review", json=payload, headers=headers)
+        limited = client.post("/api/review", json=payload, headers=headers)
+        # The reviewed commit is answered from the stored results.
+        cached = client.post("/api/review", json=payload, headers=headers)
+
+    assert first.status_code == 200, first.json()
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 99
+    assert cached.status_code == 200
+    mock_analyze_code.assert_awaited_once()
+
+
+@patch.object(OpenAIClient, "stream_analyze_code")
+@patch.object(GitHubClient, "get_file_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_repo_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_head_commit", new_callable=AsyncMock)
+@patch.object(GitHubClient, "retry_after", new=AsyncMock(return_value=0))
+def test_review_stream_endpoint_admission(
+        mock_get_head_commit,
+        mock_get_repo_contents,
+        mock_get_file_contents,
+        mock_stream_analyze_code,
+):
+    async def stream_analysis(**kwargs):
+        yield "Good"
+
+    mock_get_head_commit.side_effect = ["c1", "c2", "c1"]
+    mock_get_repo_contents.return_value = [{"path": "main.py", "type": "blob"}]
+    mock_get_file_contents.return_value = {"main.py": "print(1)"}
+    mock_stream_analyze_code.side_effect = stream_analysis
+    payload = {
+        "assignment_description": "Review this code.",
+        "github_repo_url": "https://github.com/test/repo",
+        "candidate_level": "Junior",
+    }
+
+    with (
+        patch.object(admission, "client_rate", 0.01),
+        patch.object(admission, "client_burst", 1),
+        patch.object(admission, "_buckets", {}),
+        TestClient(app) as client,
+    ):
+        first = client.post("/api/review/stream", json=payload)
+        limited = client.post("/api/review/stream", json=payload)
+        # The reviewed commit is answered from the stored results.
+        cached = client.post("/api/review/stream", json=payload)
+
+    assert first.status_code == 200
+    assert "event: result" in first.text
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 99
+    assert cached.status_code == 200
+    assert "event: result" in cached.text
+    assert mock_stream_analyze_code.call_count == 1
+    # The slot of the first review was released.
+    assert admission._in_flight == {}
@@ -0,0 +1,66 @@
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from auto_review_tool.clients.github_client import GitHubClient
+from auto_review_tool.clients.openai_client import OpenAIClient
+from auto_review_tool.main import app
+
+
+@patch.object(OpenAIClient, "analyze_code", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_file_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_repo_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_head_commit", new_callable=AsyncMock)
+@patch.object(GitHubClient, "retry_after", new=AsyncMock(return_value=0))
+def test_review_of_a_registered_assignment(
+        mock_get_head_commit,
+        mock_get_repo_contents,
+        mock_get_file_contents,
+        mock_analyze_code,
+):
+    mock_get_head_commit.return_value = "c1"
+    mock_get_repo_contents.return_value = [{"path": "main.py", "type": "blob"}]
+    mock_get_file_contents.return_value = {"main.py": "print(1)"}
+    mock_analyze_code.return_value = "Good"
+    assignment = {"assignment_description": "Write a CLI.", "rubric": "Has tests"}
+
+    with TestClient(app) as client:
+        response = client.post("/api/assignments", json=assignment)
+        again = client.post("/api/assignments", json=assignment)
+        assignment_id = response.json()["id"]
+        fetched = client.get(f"/api/assignments/{assignment_id}")
+        review = client.post(
+            "/api/review",
+            json={
+                "assignment_id": assignment_id,
+                "github_repo_url": "https://github.com/test/repo",
+                "candidate_level": "Junior",
+            },
+        )
+        unknown = client.post(
+            "/api/review",
+            json={
+                "assignment_id": "unknown",
+                "github_repo_url": "https://github.com/test/repo",
+                "candidate_level": "Junior",
+            },
+        )
+        missing = client.post(
+            "/api/review",
+            json={
+                "github_repo_url": "https://github.com/test/repo",
+                "candidate_level": "Junior",
+            },
+        )
+
+    assert response.status_code == 201
+    assert again.json() == response.json()
+    assert fetched.json()["rubric"] == "Has tests"
+    assert review.status_code == 200
+    assert mock_analyze_code.call_args.kwargs["assignment_description"] == (
+        "Write a CLI."
+    )
+    assert mock_analyze_code.call_args.kwargs["rubric"] == "Has tests"
+    assert unknown.status_code == 400
+    assert missing.status_code == 422
+    assert client.get("/api/assignments/unknown").status_code == 404
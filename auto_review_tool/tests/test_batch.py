@@ -0,0 +1,167 @@
+import asyncio
+import json
+from contextlib import nullcontext
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from click.testing import CliRunner
+from fastapi.testclient import TestClient
+
+from auto_review_tool.cli import cli
+from auto_review_tool.clients.github_client import GitHubClient
+from auto_review_tool.core.admission import admission
+from auto_review_tool.main import app
+from auto_review_tool.models.review import BatchReviewRequest, ReviewResponse
+from auto_review_tool.services import review as review_service
+
+REPO_URLS = [
+    "https://github.com/test/slow",
+    "https://github.com/test/broken",
+    "https://github.com/test/fast",
+]
+
+
+async def fake_run_review(request, admission=None, **_clients):
+    repo = str(request.github_repo_url).rsplit("/", 1)[-1]
+    if repo == "broken":
+        raise ValueError("Error while requesting GitHub API: 404, Not Found")
+    async with admission or nullcontext():
+        if repo == "slow":
+            await asyncio.sleep(0.2)
+    return ReviewResponse(found_files=["main.py"], analysis=f"Review of {repo}")
+
+
+@pytest.mark.asyncio
+@patch.object(GitHubClient, "retry_after", new=AsyncMock(return_value=0))
+@patch.object(review_service, "run_review", side_effect=fake_run_review)
+async def test_batch_yields_results_as_they_finish(mock_run_review):
+    request = BatchReviewRequest(
+        assignment_description="Review this code.",
+        github_repo_urls=REPO_URLS + [REPO_URLS[0]],
+        candidate_level="Junior",
+    )
+
+    items = [item async for item in review_service.run_batch(request)]
+
+    assert [item.github_repo_url for item in items] == [
+        REPO_URLS[1],
+        REPO_URLS[2],
+        REPO_URLS[0],
+    ]
+    assert items[0].status == "failed"
+    assert "404" in items[0].error
+    assert items[2].result.analysis == "Review of slow"
+    assert mock_run_review.call_count == 3
+    assert {
+        call.args[0].assignment_description for call in mock_run_review.call_args_list
+    } == {"Review this code."}
+
+
+@pytest.mark.asyncio
+@patch("auto_review_tool.services.review.asyncio.sleep", new_callable=AsyncMock)
+@patch.object(GitHubClient, "retry_after", new_callable=AsyncMock)
+@patch.object(review_service, "run_review", side_effect=fake_run_review)
+async def test_batch_waits_for_the_rate_limit(
+        mock_run_review,
+        mock_retry_after,
+        mock_sleep,
+):
+    mock_retry_after.side_effect = [30, 0]
+    request = BatchReviewRequest(
+        assignment_description="Review this code.",
+        github_repo_urls=[REPO_URLS[2]],
+        candidate_level="Junior",
+    )
+
+    items = [item async for item in review_service.run_batch(request)]
+
+    mock_sleep.assert_awaited_once_with(30)
+    assert items[0].status == "completed"
+
+
+@patch.object(review_service, "run_review", side_effect=fake_run_review)
+def test_batch_endpoint_streams_json_lines(mock_run_review):
+    payload = {
+        "assignment_description": "Review this code.",
+        "github_repo_urls": REPO_URLS,
+        "candidate_level": "Middle",
+    }
+
+    with TestClient(app) as client:
+        response = client.post("/api/review/batch", json=payload)
+        empty = client.post(
+            "/api/review/batch", json={**payload, "github_repo_urls": []}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["status"] for item in items] == ["failed", "completed", "completed"]
+    assert empty.status_code == 422
+    # Reviews are admitted for the client of the batch.
+    assert mock_run_review.call_args.args[1].client_id == "ip:testclient"
+
+
+@pytest.mark.asyncio
+@patch.object(GitHubClient, "retry_after", new=AsyncMock(return_value=0))
+@patch.object(review_service, "run_review", side_effect=fake_run_review)
+async def test_concurrent_batches_of_a_client_are_throttled(mock_run_review):
+    request = BatchReviewRequest(
+        assignment_description="Review this code.",
+        github_repo_urls=[REPO_URLS[0]],
+        candidate_level="Junior",
+    )
+
+    async def run_batch():
+        started = asyncio.get_running_loop().time()
+        items = [
+            item
+            async for item in review_service.run_batch(request, client_id="ip:1.2.3.4")
+        ]
+        return items, asyncio.get_running_loop().time() - started
+
+    with (
+        patch.object(admission, "client_max_in_flight", 1),
+        patch.object(admission, "_in_flight", {}),
+        patch.object(admission, "_average_duration", 0.5),
+    ):
+        (first, first_time), (second, second_time) = await asyncio.gather(
+            run_batch(), run_batch()
+        )
+
+    assert [item.status for item in first + second] == ["completed", "completed"]
+    # One of the batches waited for the review of the other one.
+    assert min(first_time, second_time) < 0.4
+    assert max(first_time, second_time) > 0.4
+    assert admission._in_flight == {}
+
+
+@patch.object(review_service, "run_review", side_effect=fake_run_review)
+def test_batch_command(mock_run_review, tmp_path):
+    repos_file = tmp_path / "repos.jsonl"
+    repos_file.write_text(
+        "\n".join(json.dumps({"github_repo_url": url}) for url in REPO_URLS) + "\n"
+    )
+    assignment_file = tmp_path / "assignment.md"
+    assignment_file.write_text("Review this code.")
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "batch",
+            str(repos_file),
+            "--assignment",
+            str(assignment_file),
+            "--candidate-level",
+            "Senior",
+            "--concurrency",
+            "2",
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert "1 reviews failed" in result.output
+    lines = [line for line in result.output.splitlines() if line.startswith("{")]
+    assert {json.loads(line)["github_repo_url"] for line in lines} == set(REPO_URLS)
+    assert mock_run_review.call_args.args[0].candidate_level == "Senior"
+    assert mock_run_review.call_args.args[1] is None
@@ -0,0 +1,93 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+from auto_review_tool.core.cache import LayeredCache, LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used_by_size():
+    cache = LRUCache(max_bytes=10)
+    cache.set("a", "aaaa", expire=60)
+    cache.set("b", "bbbb", expire=60)
+    assert cache.get("a") == "aaaa"
+
+    cache.set("c", "cccc", expire=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+    assert cache.size == 8
+    assert cache.evictions == 1
+
+
+def test_lru_cache_exports_its_size_and_evictions():
+    cache = LRUCache(max_bytes=10)
+    bytes_before = REGISTRY.get_sample_value("local_cache_bytes")
+    evictions_before = _get_evictions("blob")
+
+    cache.set("blob:a", "aaaa", expire=60)
+    cache.set("blob:b", "bbbb", expire=60)
+    cache.set("blob:c", "cccc", expire=60)
+
+    assert REGISTRY.get_sample_value("local_cache_bytes") - bytes_before == 8
+    assert _get_evictions("blob") - evictions_before == 1
+    cache.clear()
+    assert REGISTRY.get_sample_value("local_cache_bytes") == bytes_before
+
+
+def _get_evictions(prefix):
+    return (
+        REGISTRY.get_sample_value("cache_evictions_total", {"prefix": prefix}) or 0.0
+    )
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(max_bytes=100)
+    with patch("time.monotonic", return_value=100.0):
+        cache.set("key", "value", expire=10)
+    with patch("time.monotonic", return_value=105.0):
+        assert cache.get("key") == "value"
+    with patch("time.monotonic", return_value=111.0):
+        assert cache.get("key") is None
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_lru_cache_skips_values_bigger_than_limit():
+    cache = LRUCache(max_bytes=3)
+    cache.set("key", "value", expire=10)
+    assert cache.get("key") is None
+
+
+@pytest.mark.asyncio
+async def test_layered_cache_promotes_remote_hits_with_remaining_ttl():
+    remote = MagicMock(is_connected=True)
+    remote.mget_with_ttl = AsyncMock(return_value=[("remote", 30.0), (None, None)])
+    local = LRUCache(max_bytes=100)
+    local.set("local", "value", expire=60)
+    cache = LayeredCache(local, remote)
+
+    values = await cache.mget(["local", "remote", "missing"])
+
+    assert values == ["value", "remote", None]
+    remote.mget_with_ttl.assert_awaited_once_with(["remote", "missing"])
+    with patch.object(local, "set") as mock_set:
+        await cache.get("remote")
+    mock_set.assert_not_called()
+    assert cache.stats()["remote_hits"] == 1
+    assert cache.stats()["remote_misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_layered_cache_works_without_redis():
+    remote = MagicMock(is_connected=False)
+    remote.mget_with_ttl = AsyncMock()
+    remote.mset_with_ttl = AsyncMock()
+    cache = LayeredCache(LRUCache(max_bytes=100), remote)
+
+    await cache.set("key", {"a": 1}, expire=60)
+
+    assert await cache.get("key") == {"a": 1}
+    remote.mget_with_ttl.assert_not_called()
+    remote.mset_with_ttl.assert_not_called()
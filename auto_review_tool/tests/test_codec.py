@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from auto_review_tool.core.codec import FORMAT_VERSION, CacheCodec
+
+SOURCE = "def main():\n    print('Hello, world!')\n" * 100
+VALUES = [
+    SOURCE,
+    "ünïcode",
+    {"found_files": ["main.py"], "analysis": SOURCE, "rating": 5, "sha": None},
+    [{"path": "main.py", "type": "blob", "size": 3}],
+    42,
+]
+
+
+@pytest.mark.parametrize(
+    "serializer, compression",
+    [("json", "none"), ("json", "zlib"), ("msgpack", "zlib"), ("msgpack", "zstd")],
+)
+def test_values_round_trip(serializer, compression):
+    if serializer == "msgpack":
+        pytest.importorskip("msgpack")
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    codec = CacheCodec(serializer, compression, compression_threshold=64)
+
+    for value in VALUES:
+        assert codec.decode(codec.encode(value)) == value
+
+
+def test_large_values_are_compressed():
+    codec = CacheCodec("json", "zlib", compression_threshold=1024)
+
+    small, large = codec.encode("x = 1\n"), codec.encode(SOURCE)
+
+    assert small[0] == large[0] == FORMAT_VERSION
+    assert small[2:] == b"x = 1\n"
+    assert len(large) < len(SOURCE) / 10
+
+
+def test_values_written_as_plain_json_are_still_read():
+    codec = CacheCodec()
+    value = {"found_files": ["main.py"], "analysis": "Good"}
+
+    assert codec.decode(json.dumps(value).encode()) == value
+    assert codec.decode(json.dumps(SOURCE).encode()) == SOURCE
+    assert codec.decode(None) is None
@@ -1,8 +1,16 @@
-from unittest.mock import AsyncMock, patch
+import asyncio
+import io
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from prometheus_client import REGISTRY
 
 from auto_review_tool.clients.github_client import GitHubClient
+from auto_review_tool.core.config import settings
 from auto_review_tool.core.redis_client import redis_client
 
 
@@ -14,7 +22,9 @@ async def test_get_file_contents():
         {"url": "https://api.github.com/file2", "path": "file2.py"},
     ]
 
-    client.get_file_contents = AsyncMock(return_value={"file1.py": "print('hello world')"})
+    client.get_file_contents = AsyncMock(
+        return_value={"file1.py": "print('hello world')"}
+    )
 
     contents = await client.get_file_contents(mock_files)
     assert "file1.py" in contents
@@ -41,8 +51,371 @@ async def test_get_repo_contents(mock_redis_get, _mock_redis_set, mock_httpx_get
     client = GitHubClient(token="mock_token")
     repo_url = "https://github.com/user/repo"
 
-    result = await client.get_repo_contents(repo_url)
+    result = await client.get_repo_contents(repo_url, "c1")
 
     assert len(result) == 2
     assert result[0]["path"] == "file1.py"
     assert result[1]["path"] == "file2.py"
+
+
+def _mock_response(status_code, json_data=None, headers=None, text="", content=b""):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = content
+    response.headers = headers or {}
+    response.text = text
+    response.json = lambda: json_data
+    if status_code >= 400:
+        response.raise_for_status.side_effect = Exception(f"HTTP {status_code}")
+    return response
+
+
+@pytest.mark.asyncio
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+async def test_get_file_contents_keeps_order(mock_httpx_get):
+    async def delayed_get(url, headers=None):
+        index = int(url.rsplit("/", 1)[-1])
+        await asyncio.sleep(0.01 * (5 - index))
+        return _mock_response(200, content=f"file {index}".encode())
+
+    mock_httpx_get.side_effect = delayed_get
+    files = [
+        {"url": f"https://api.github.com/blob/{index}", "path": f"file{index}.py"}
+        for index in range(5)
+    ]
+
+    client = GitHubClient(token="mock_token")
+    contents = await client.get_file_contents(files)
+
+    assert list(contents.keys()) == [f"file{index}.py" for index in range(5)]
+    assert contents["file3.py"] == "file 3"
+
+
+@pytest.mark.asyncio
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+async def test_get_file_contents_skips_large_and_binary_files(mock_httpx_get):
+    blobs = {
+        "main.py": b"print('ok')",
+        "data.dat": b"\x00\x01\x02",
+        "notes.txt": "caf\u00e9".encode("latin-1"),
+        "other.py": b"print('over budget')",
+    }
+
+    async def get(url, headers=None):
+        assert headers["Accept"] == "application/vnd.github.raw+json"
+        return _mock_response(200, content=blobs[url.rsplit("/", 1)[-1]])
+
+    mock_httpx_get.side_effect = get
+    files = [
+        {"url": f"https://api.github.com/blob/{path}", "path": path, "size": size}
+        for path, size in [
+            ("main.py", 11),
+            ("huge.py", 10 * 1024 * 1024),
+            ("logo.png", 100),
+            ("data.dat", 3),
+            ("notes.txt", 4),
+            ("other.py", 20),
+        ]
+    ]
+
+    client = GitHubClient(token="mock_token")
+    with patch.object(settings, "GITHUB_MAX_INGEST_BYTES", 20):
+        contents = await client.get_file_contents(files)
+
+    assert contents == {"main.py": "print('ok')"}
+    requested = {
+        call.args[0].rsplit("/", 1)[-1] for call in mock_httpx_get.await_args_list
+    }
+    assert requested == {"main.py", "data.dat", "notes.txt", "other.py"}
+
+
+@pytest.mark.asyncio
+@patch("asyncio.sleep", new_callable=AsyncMock)
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+async def test_get_file_contents_retries_when_rate_limited(mock_httpx_get, mock_sleep):
+    mock_httpx_get.side_effect = [
+        _mock_response(429, headers={"retry-after": "2"}),
+        _mock_response(403, headers={"x-ratelimit-remaining": "0"}),
+        _mock_response(200, content=b"print('ok')"),
+    ]
+
+    client = GitHubClient(token="mock_token")
+    contents = await client.get_file_contents(
+        [{"url": "https://api.github.com/blob/1", "path": "file1.py"}]
+    )
+
+    assert contents == {"file1.py": "print('ok')"}
+    assert mock_httpx_get.call_count == 3
+    assert mock_sleep.await_args_list[0].args == (2.0,)
+
+
+@pytest.mark.asyncio
+@patch("asyncio.sleep", new_callable=AsyncMock)
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+async def test_get_file_contents_rotates_exhausted_token(mock_httpx_get, mock_sleep):
+    reset = str(int(time.time()) + 600)
+    mock_httpx_get.side_effect = [
+        _mock_response(
+            403,
+            headers={"x-ratelimit-remaining": "0", "x-ratelimit-reset": reset},
+        ),
+        _mock_response(
+            200,
+            content=b"print('ok')",
+            headers={"x-ratelimit-remaining": "4999", "x-ratelimit-reset": reset},
+        ),
+    ]
+
+    client = GitHubClient(token=None, tokens=["first_token", "second_token"])
+    contents = await client.get_file_contents(
+        [{"url": "https://api.github.com/blob/1", "path": "file1.py"}]
+    )
+
+    assert contents == {"file1.py": "print('ok')"}
+    authorizations = [
+        call.kwargs["headers"]["Authorization"]
+        for call in mock_httpx_get.await_args_list
+    ]
+    assert authorizations == ["Bearer first_token", "Bearer second_token"]
+    mock_sleep.assert_not_awaited()
+    assert await client.retry_after() == 0
+
+
+def _build_fixture_tarball():
+    files = {
+        "user-repo-abc123/README.md": b"# Repo",
+        "user-repo-abc123/src/main.py": b"print('hello world')",
+        "user-repo-abc123/logo.png": b"\x89PNG\r\n\x1a\n\xff\xfe",
+    }
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        tar.addfile(tarfile.TarInfo("user-repo-abc123/"))
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+COMMIT_SHA = "a" * 40
+
+
+@pytest.fixture
+def github_api_server():
+    tarball = _build_fixture_tarball()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/repos/user/repo/commits/HEAD":
+                self._respond(200, COMMIT_SHA.encode())
+            elif self.path == f"/repos/user/repo/tarball/{COMMIT_SHA}":
+                self._respond(
+                    302, headers={"Location": "/codeload/user/repo/legacy.tar.gz"}
+                )
+            elif self.path == "/codeload/user/repo/legacy.tar.gz":
+                self._respond(
+                    200, tarball, headers={"Content-Type": "application/x-gzip"}
+                )
+            elif self.path == "/rate_limit":
+                self._respond(200, b'{"rate": {"remaining": 5000}}')
+            else:
+                self._respond(404)
+
+        def _respond(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_get_archive_contents(github_api_server):
+    client = GitHubClient(token="mock_token", base_url=github_api_server)
+
+    contents = await client.get_archive_contents("https://github.com/user/repo")
+    await client.close()
+
+    assert contents == {
+        "README.md": "# Repo",
+        "src/main.py": "print('hello world')",
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_archive_contents_missing_repo(github_api_server):
+    client = GitHubClient(token="mock_token", base_url=github_api_server)
+
+    with pytest.raises(ValueError):
+        await client.get_archive_contents("https://github.com/user/missing")
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_client_reuses_connections(github_api_server):
+    client = GitHubClient(token="mock_token", base_url=github_api_server)
+    requests_before = _get_metric("upstream_pool_requests_total")
+    connections_before = _get_metric("upstream_pool_connections_total")
+    await client.connect()
+
+    for _ in range(3):
+        await client._fetch_data_from_api(f"{github_api_server}/rate_limit")
+    await client.close()
+
+    assert client.client is None
+    assert client.pool_stats.as_dict() == {"requests": 3, "hits": 2, "misses": 1}
+    assert _get_metric("upstream_pool_requests_total") - requests_before == 3
+    assert _get_metric("upstream_pool_connections_total") - connections_before == 1
+
+
+def _get_metric(name):
+    return REGISTRY.get_sample_value(name, {"service": "github"}) or 0.0
+
+
+@pytest.mark.asyncio
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+async def test_get_file_contents_uses_blob_sha_cache(mock_httpx_get):
+    cache = {"blob:abc": "cached license"}
+
+    async def mget_with_ttl(keys):
+        return [(cache.get(key), 60) for key in keys]
+
+    mock_httpx_get.return_value = _mock_response(200, content=b"print('new')")
+    files = [
+        {"url": "https://api.github.com/u1/blobs/abc", "path": "LICENSE", "sha": "abc"},
+        {"url": "https://api.github.com/u1/blobs/def", "path": "main.py", "sha": "def"},
+    ]
+
+    with (
+        patch.object(redis_client, "is_connected", True),
+        patch.object(
+            redis_client, "mget_with_ttl", AsyncMock(side_effect=mget_with_ttl)
+        ),
+        patch.object(
+            redis_client, "mset_with_ttl", new_callable=AsyncMock
+        ) as mock_mset,
+    ):
+        client = GitHubClient(token="mock_token")
+        contents = await client.get_file_contents(files)
+
+    assert contents == {"LICENSE": "cached license", "main.py": "print('new')"}
+    mock_httpx_get.assert_awaited_once()
+    assert mock_mset.await_args.args[0] == {"blob:def": "print('new')"}
+
+
+@pytest.mark.asyncio
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+async def test_get_repo_contents_caches_tree_by_sha(mock_httpx_get):
+    tree = {
+        "sha": "t1",
+        "tree": [{"path": "file1.py", "type": "blob", "sha": "a", "size": 3}],
+    }
+    mock_httpx_get.return_value = _mock_response(200, tree)
+
+    client = GitHubClient(token="mock_token", base_url="https://api.github.com")
+    first = await client.get_repo_contents("https://github.com/user/repo", "c1")
+    second = await client.get_repo_contents("https://github.com/user/repo", "c1")
+    fork = await client.get_repo_contents("https://github.com/other/fork", "c1")
+
+    mock_httpx_get.assert_awaited_once()
+    assert mock_httpx_get.await_args.args[0] == (
+        "https://api.github.com/repos/user/repo/git/trees/c1?recursive=1"
+    )
+    assert first == second
+    assert first[0]["url"] == "https://api.github.com/repos/user/repo/git/blobs/a"
+    assert fork[0]["url"] == "https://api.github.com/repos/other/fork/git/blobs/a"
+
+
+@pytest.mark.asyncio
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+async def test_get_repo_contents_completes_truncated_tree(mock_httpx_get):
+    trees = {
+        "c1?recursive=1": {"sha": "root", "truncated": True, "tree": []},
+        "c1": {
+            "sha": "root",
+            "tree": [
+                {"path": "README.md", "type": "blob", "sha": "r"},
+                {"path": "src", "type": "tree", "sha": "src"},
+                {"path": "docs", "type": "tree", "sha": "docs"},
+            ],
+        },
+        "src?recursive=1": {
+            "sha": "src",
+            "tree": [
+                {"path": "app", "type": "tree", "sha": "app"},
+                {"path": "app/main.py", "type": "blob", "sha": "m"},
+            ],
+        },
+        "docs?recursive=1": {
+            "sha": "docs",
+            "tree": [{"path": "index.md", "type": "blob", "sha": "i"}],
+        },
+    }
+
+    async def get(url, headers=None):
+        return _mock_response(200, trees[url.rsplit("/", 1)[-1]])
+
+    mock_httpx_get.side_effect = get
+    client = GitHubClient(token="mock_token")
+    files = await client.get_repo_contents("https://github.com/user/repo", "c1")
+
+    assert [item["path"] for item in files] == [
+        "README.md",
+        "src/app/main.py",
+        "docs/index.md",
+    ]
+    assert mock_httpx_get.await_count == 4
+
+
+@pytest.mark.asyncio
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+async def test_get_head_commit_revalidates_with_etag(mock_httpx_get):
+    not_modified = _mock_response(304)
+    not_modified.raise_for_status.side_effect = None
+    mock_httpx_get.side_effect = [
+        _mock_response(200, headers={"etag": '"c1"'}, text="c1sha\n"),
+        not_modified,
+    ]
+
+    client = GitHubClient(token="mock_token")
+    first = await client.get_head_commit("https://github.com/user/repo")
+    second = await client.get_head_commit("https://github.com/user/repo")
+
+    assert first == second == "c1sha"
+    assert mock_httpx_get.await_args_list[0].args[0].endswith(
+        "/repos/user/repo/commits/HEAD"
+    )
+    second_headers = mock_httpx_get.await_args_list[1].kwargs["headers"]
+    assert second_headers["Accept"] == "application/vnd.github.sha"
+    assert second_headers["If-None-Match"] == '"c1"'
+
+
+@pytest.mark.asyncio
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+async def test_get_head_commit_of_a_ref(mock_httpx_get):
+    mock_httpx_get.return_value = _mock_response(200, text="b" * 40)
+    client = GitHubClient(token="mock_token")
+
+    assert await client.get_head_commit("https://github.com/user/repo", "a" * 40) == (
+        "a" * 40
+    )
+    mock_httpx_get.assert_not_awaited()
+
+    sha = await client.get_head_commit("https://github.com/user/repo", "feature/x")
+    assert sha == "b" * 40
+    assert mock_httpx_get.await_args.args[0].endswith(
+        "/repos/user/repo/commits/feature/x"
+    )
@@ -0,0 +1,255 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from auto_review_tool import worker
+from auto_review_tool.api import jobs
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.job_queue import ACK_SCRIPT, JobQueue
+from auto_review_tool.core.webhooks import check_webhook_url, create_webhook_client
+from auto_review_tool.main import app
+from auto_review_tool.models.review import ReviewResponse
+
+
+class InMemoryRedis:
+    def __init__(self):
+        self.is_connected = True
+        self.values = {}
+        self.lists = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, expire=3600):
+        self.values[key] = value
+
+    async def push(self, queue_key, value):
+        self.lists.setdefault(queue_key, []).append(value)
+        return True
+
+    async def move(self, source_key, destination_key, timeout=0):
+        items = self.lists.get(source_key)
+        if not items:
+            return None
+        item = items.pop(0)
+        self.lists.setdefault(destination_key, []).append(item)
+        return item
+
+    async def acquire_lock(self, key, token, lease):
+        return self.values.setdefault(key, token) == token
+
+    async def extend_lock(self, key, token, lease):
+        return self.values.get(key) == token
+
+    async def run_script(self, script, keys, args):
+        """Runs the scripts of the queue, leases never expire here."""
+        if script == ACK_SCRIPT:
+            processing = self.lists.get(keys[0], [])
+            self.lists[keys[0]] = [i for i in processing if i != json.loads(args[0])]
+            self.values.pop(keys[1], None)
+            return 1
+        processing, queue = self.lists.get(keys[0], []), []
+        for job_id in list(processing):
+            if args[0] + job_id not in self.values:
+                processing.remove(job_id)
+                queue.append(job_id)
+        self.lists.setdefault(keys[1], []).extend(queue)
+        return len(queue)
+
+
+PAYLOAD = {
+    "assignment_description": "Review this code.",
+    "github_repo_url": "https://github.com/test/repo",
+    "candidate_level": "Junior",
+}
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(InMemoryRedis())
+    with (
+        patch.object(jobs, "job_queue", queue),
+        patch.object(worker, "job_queue", queue),
+    ):
+        yield queue
+
+
+def test_submit_and_poll_review_job(queue):
+    with TestClient(app) as client:
+        response = client.post("/api/reviews", json=PAYLOAD)
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "queued"
+
+        response = client.get(f"/api/reviews/{job['job_id']}")
+        assert response.status_code == 200
+        assert response.json()["status"] == "queued"
+
+        assert client.get("/api/reviews/missing").status_code == 404
+
+
+def test_submit_review_job_without_redis(queue):
+    queue.redis.is_connected = False
+    with TestClient(app) as client:
+        response = client.post("/api/reviews", json=PAYLOAD)
+    assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_process_job_stores_result_and_calls_webhook(queue):
+    job = await queue.enqueue({**PAYLOAD, "webhook_url": "https://example.com/hook"})
+    job_id = await queue.claim("worker")
+    result = ReviewResponse(found_files=["file1.py"], analysis="Rating: 5")
+
+    with (
+        patch.object(worker, "run_review", AsyncMock(return_value=result)),
+        patch.object(worker, "send_webhook", new_callable=AsyncMock) as mock_webhook,
+    ):
+        await worker.process_job(job_id)
+
+    stored = await queue.get(job["job_id"])
+    assert stored["status"] == "completed"
+    assert stored["result"] == result.model_dump()
+    assert stored["attempts"] == 1
+    mock_webhook.assert_awaited_once_with("https://example.com/hook", stored)
+    assert queue.redis.lists[queue.processing_key] == []
+
+
+@pytest.mark.asyncio
+async def test_process_job_stores_error(queue):
+    job = await queue.enqueue(PAYLOAD)
+
+    with patch.object(worker, "run_review", AsyncMock(side_effect=ValueError("boom"))):
+        await worker.process_job(job["job_id"])
+
+    stored = await queue.get(job["job_id"])
+    assert stored["status"] == "failed"
+    assert stored["error"] == "boom"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "request_payload",
+    [{"github_repo_url": "not a url"}, None, ["not", "a", "request"]],
+)
+async def test_job_with_invalid_request_fails(queue, request_payload):
+    job = await queue.enqueue(request_payload)
+    job_id = await queue.claim("worker")
+
+    with patch.object(worker, "run_review", AsyncMock()) as mock_run_review:
+        await worker.process_job(job_id, "worker")
+
+    mock_run_review.assert_not_awaited()
+    stored = await queue.get(job["job_id"])
+    assert stored["status"] == "failed"
+    assert stored["error"].startswith("The request of the job is invalid")
+    # The job is not requeued.
+    assert queue.redis.lists[queue.processing_key] == []
+    assert await queue.requeue_stale() == 0
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_stopped_workers_are_requeued(queue):
+    job = await queue.enqueue(PAYLOAD)
+    job_id = await queue.claim("worker")
+    assert queue.redis.lists[queue.processing_key] == [job_id]
+
+    assert await queue.requeue_stale() == 0
+    # The worker stopped, so its lease expired.
+    queue.redis.values.pop(queue._lease_key(job_id))
+    assert await queue.requeue_stale() == 1
+    assert queue.redis.lists[queue.queue_key] == [job["job_id"]]
+    assert queue.redis.lists[queue.processing_key] == []
+
+
+@pytest.mark.asyncio
+async def test_job_fails_after_too_many_attempts(queue):
+    job = await queue.enqueue(PAYLOAD)
+    await queue.update(job["job_id"], status="running", attempts=3)
+    job_id = await queue.claim("worker")
+
+    with patch.object(worker, "run_review", AsyncMock()) as mock_run_review:
+        await worker.process_job(job_id, "worker")
+
+    mock_run_review.assert_not_awaited()
+    stored = await queue.get(job["job_id"])
+    assert stored["status"] == "failed"
+    assert queue.redis.lists[queue.processing_key] == []
+
+
+def test_submit_review_job_with_internal_webhook(queue):
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/reviews",
+            json={**PAYLOAD, "webhook_url": "http://169.254.169.254/latest"},
+        )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "url",
+    [
+        "http://127.0.0.1:6379/",
+        "http://10.0.0.5/hook",
+        "http://[::1]/hook",
+        "http://169.254.169.254/latest",
+        "ftp://93.184.216.34/hook",
+    ],
+)
+async def test_webhooks_to_internal_addresses_are_rejected(url):
+    with pytest.raises(ValueError):
+        await check_webhook_url(url)
+
+
+@pytest.mark.asyncio
+async def test_webhook_allowed_hosts():
+    await check_webhook_url("https://93.184.216.34/hook")
+    with patch.object(settings, "WEBHOOK_ALLOWED_HOSTS", ["hooks.internal"]):
+        await check_webhook_url("http://hooks.internal/review")
+        with pytest.raises(ValueError):
+            await check_webhook_url("https://93.184.216.34/hook")
+
+
+@pytest.fixture
+def webhook_server():
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.server.requests += 1
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests = 0
+    server.url = f"http://127.0.0.1:{server.server_port}/hook"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_webhooks_check_the_address_they_connect_to(webhook_server):
+    job = await JobQueue(InMemoryRedis()).enqueue(PAYLOAD)
+
+    # The host resolved to a public address when it was checked,
+    # and to an internal one when the webhook is sent (DNS rebinding).
+    with patch.object(worker, "check_webhook_url", AsyncMock()):
+        await worker.send_webhook(webhook_server.url, job)
+    assert webhook_server.requests == 0
+
+    with patch.object(settings, "WEBHOOK_ALLOWED_HOSTS", ["127.0.0.1"]):
+        async with create_webhook_client() as client:
+            response = await client.post(webhook_server.url, json={})
+    assert response.status_code == 200
+    assert webhook_server.requests == 1
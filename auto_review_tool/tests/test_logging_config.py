@@ -0,0 +1,75 @@
+import json
+import logging
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+
+from auto_review_tool.cli import cli
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.logging_config import (
+    DebugSamplingFilter,
+    JsonFormatter,
+    get_logging_config,
+    setup_logging,
+)
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    log_file = tmp_path / "worker.log"
+    with patch.object(settings, "LOG_FILE", str(log_file)):
+        yield log_file
+    # Log to the file of the test session again.
+    setup_logging()
+
+
+def make_record(level=logging.INFO, **extra):
+    record = logging.LogRecord("test", level, __file__, 1, "Got %s", ("a.py",), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_keeps_request_id_and_extra_fields():
+    entry = json.loads(
+        JsonFormatter().format(make_record(request_id="abc123", path="a.py"))
+    )
+
+    assert entry["message"] == "Got a.py"
+    assert entry["level"] == "INFO"
+    assert entry["request_id"] == "abc123"
+    assert entry["path"] == "a.py"
+
+
+def test_debug_records_are_sampled():
+    drop_all = DebugSamplingFilter(rate=0.0)
+
+    assert not drop_all.filter(make_record(logging.DEBUG))
+    assert drop_all.filter(make_record(logging.INFO))
+    assert DebugSamplingFilter(rate=1.0).filter(make_record(logging.DEBUG))
+
+
+def test_log_file_per_process():
+    with patch.object(settings, "LOG_FILE", "app.{pid}.log"), patch(
+            "os.getpid", return_value=1234
+    ):
+        config = get_logging_config()
+
+    assert config["handlers"]["file"]["filename"] == "app.1234.log"
+    assert config["root"]["handlers"] == ["queue"]
+
+
+def test_worker_command_writes_to_the_log_file(log_file):
+    async def run_worker(concurrency):
+        logging.getLogger("auto_review_tool").info(f"Worker runs {concurrency} jobs")
+        logging.info("Worker stopped by the test")
+
+    with patch("auto_review_tool.worker.run_worker", run_worker):
+        result = CliRunner().invoke(cli, ["worker", "--concurrency", "2"])
+    # Write the records which are still queued.
+    logging.getHandlerByName("queue").listener.stop()
+
+    assert result.exit_code == 0, result.output
+    lines = log_file.read_text().splitlines()
+    assert "INFO - [-] - Worker runs 2 jobs" in lines[0]
+    assert "root - INFO" in lines[1]
@@ -0,0 +1,63 @@
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from auto_review_tool.clients.github_client import GitHubClient
+from auto_review_tool.clients.openai_client import OpenAIClient
+from auto_review_tool.main import app
+from auto_review_tool.services import review as review_service
+
+
+def _get_sample(metrics, name, **labels):
+    from prometheus_client.parser import text_string_to_metric_families
+
+    for family in text_string_to_metric_families(metrics):
+        for sample in family.samples:
+            if sample.name == name and all(
+                sample.labels.get(label) == value for label, value in labels.items()
+            ):
+                return sample.value
+    return 0.0
+
+
+@patch.object(GitHubClient, "get_head_commit", new=AsyncMock(return_value="c1"))
+@patch.object(GitHubClient, "get_repo_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_file_contents", new_callable=AsyncMock)
+def test_metrics_endpoint(
+        mock_get_file_contents,
+        mock_get_repo_contents,
+        openai_stub_server,
+):
+    mock_get_repo_contents.return_value = [{"path": "file1.py", "type": "blob"}]
+    mock_get_file_contents.return_value = {"file1.py": "print('metrics')"}
+    openai_client = OpenAIClient(api_key="test_key", base_url=openai_stub_server.url)
+    payload = {
+        "assignment_description": "Review this code.",
+        "github_repo_url": "https://github.com/test/metrics",
+        "candidate_level": "Junior",
+    }
+
+    with patch.object(review_service, "openai_client", openai_client):
+        with TestClient(app) as client:
+            before = client.get("/metrics").text
+            assert client.post("/api/review", json=payload).status_code == 200
+            response = client.get("/metrics")
+
+    assert response.status_code == 200
+    after = response.text
+    for name, labels, increase in [
+        ("review_stage_duration_seconds_count", {"stage": "analysis"}, 1),
+        ("review_stage_duration_seconds_count", {"stage": "result_lookup"}, 1),
+        (
+            "upstream_requests_total",
+            {"service": "openai", "status": "200"},
+            1,
+        ),
+        ("openai_tokens_total", {"type": "prompt"}, 10),
+        ("cache_lookups_total", {"prefix": "code_analysis", "result": "miss"}, 1),
+    ]:
+        assert (
+            _get_sample(after, name, **labels) - _get_sample(before, name, **labels)
+            == increase
+        ), name
+    assert _get_sample(after, "reviews_in_progress", endpoint="review") == 0
@@ -1,8 +1,9 @@
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
 from auto_review_tool.clients.openai_client import OpenAIClient
+from auto_review_tool.core.config import settings
 
 
 @pytest.mark.asyncio
@@ -21,3 +22,99 @@ async def test_analyze_code():
 
     assert "Downsides" in result
     assert "Rating" in result
+
+
+@pytest.mark.asyncio
+async def test_analyze_code_with_stub_server(openai_stub_server):
+    client = OpenAIClient(api_key="test_key", base_url=openai_stub_server.url)
+
+    result = await client.analyze_code(
+        ["file1.py"],
+        ["print('hello world')"],
+        "Analyze a simple Python file.",
+        "Junior"
+    )
+    await client.close()
+
+    assert "Excellent code" in result
+    assert len(openai_stub_server.requests) == 1
+    assert "print('hello world')" in (
+        openai_stub_server.requests[0]["messages"][1]["content"]
+    )
+
+
+@pytest.mark.asyncio
+async def test_analyze_code_reviews_large_code_in_chunks(openai_stub_server):
+    client = OpenAIClient(api_key="test_key", base_url=openai_stub_server.url)
+
+    with (
+        patch.object(settings, "OPENAI_MAX_PROMPT_TOKENS", 100),
+        patch.object(settings, "OPENAI_MAX_FILE_TOKENS", 100),
+    ):
+        result = await client.analyze_code(
+            ["file1.py", "file2.py", "poetry.lock"],
+            ["a = 1\n" * 50, "b = 2\n" * 50, "[[package]]"],
+            "Analyze a large project.",
+            "Senior"
+        )
+    await client.close()
+
+    prompts = [
+        request["messages"][1]["content"] for request in openai_stub_server.requests
+    ]
+    assert "Excellent code" in result
+    assert len(prompts) == 3
+    assert "part 1 of 2" in prompts[0] or "part 1 of 2" in prompts[1]
+    assert "Merge them into one review" in prompts[2]
+    assert "poetry.lock" in prompts[2]
+    assert all("[[package]]" not in prompt for prompt in prompts)
+
+
+@pytest.mark.asyncio
+async def test_prompts_of_one_assignment_share_their_prefix(openai_stub_server):
+    client = OpenAIClient(api_key="test_key", base_url=openai_stub_server.url)
+
+    for content in ["a = 1", "b = 2"]:
+        await client.analyze_code(
+            ["main.py"], [content], "Analyze a simple Python file.", "Junior",
+            rubric="Uses type hints",
+        )
+    await client.analyze_code(
+        ["main.py"], ["a = 1"], "Analyze a simple Python file.", "Senior"
+    )
+    await client.close()
+
+    system_messages = [
+        request["messages"][0]["content"] for request in openai_stub_server.requests
+    ]
+    assert system_messages[0] == system_messages[1]
+    assert "Analyze a simple Python file." in system_messages[0]
+    assert "Uses type hints" in system_messages[0]
+    assert "a = 1" not in system_messages[0]
+    assert "Senior" in system_messages[2]
+    assert "Uses type hints" not in system_messages[2]
+
+
+@pytest.mark.asyncio
+async def test_unchanged_chunks_are_not_reviewed_again(openai_stub_server):
+    client = OpenAIClient(api_key="test_key", base_url=openai_stub_server.url)
+
+    with (
+        patch.object(settings, "OPENAI_MAX_PROMPT_TOKENS", 100),
+        patch.object(settings, "OPENAI_MAX_FILE_TOKENS", 100),
+    ):
+        for changed in ["b = 2\n", "b = 3\n"]:
+            await client.analyze_code(
+                ["file1.py", "file2.py"],
+                ["a = 1\n" * 50, changed * 50],
+                "Analyze a large project.",
+                "Senior"
+            )
+    await client.close()
+
+    prompts = [
+        request["messages"][1]["content"] for request in openai_stub_server.requests
+    ]
+    # Both chunks and the merge, then only the changed chunk and the merge.
+    assert len(prompts) == 5
+    assert sum("a = 1" in prompt for prompt in prompts) == 1
@@ -0,0 +1,56 @@
+from auto_review_tool.core.prompt_planner import (
+    TRUNCATION_MARKER,
+    estimate_tokens,
+    is_low_value_path,
+    plan_prompt,
+)
+
+
+def test_is_low_value_path():
+    assert is_low_value_path("poetry.lock")
+    assert is_low_value_path("frontend/node_modules/react/index.js")
+    assert is_low_value_path("static/app.min.js")
+    assert is_low_value_path("docs/logo.PNG")
+    assert not is_low_value_path("auto_review_tool/main.py")
+    assert not is_low_value_path("build.gradle")
+
+
+def test_plan_prompt_skips_and_truncates_files():
+    names = ["main.py", "poetry.lock", "bundle.js", "big.py", "empty.py"]
+    contents = [
+        "print('hello')",
+        "[[package]]",
+        "x" * 2000,
+        "a = 1\n" * 100,
+        "  ",
+    ]
+
+    plan = plan_prompt(
+        names, contents, max_chunk_tokens=1000, max_file_tokens=50, max_chunks=2
+    )
+
+    assert plan.skipped == ["poetry.lock", "bundle.js", "empty.py"]
+    assert plan.truncated == ["big.py"]
+    assert len(plan.chunks) == 1
+    assert list(plan.chunks[0]) == ["main.py", "big.py"]
+    assert plan.chunks[0]["big.py"].endswith(TRUNCATION_MARKER)
+
+
+def test_plan_prompt_splits_into_chunks():
+    names = [f"file{index}.py" for index in range(5)]
+    contents = ["a = 1\n" * 20] * 5
+    file_tokens = estimate_tokens(names[0]) + estimate_tokens(contents[0])
+
+    plan = plan_prompt(
+        names,
+        contents,
+        max_chunk_tokens=file_tokens * 2,
+        max_file_tokens=1000,
+        max_chunks=2,
+    )
+
+    assert [list(chunk) for chunk in plan.chunks] == [
+        ["file0.py", "file1.py"],
+        ["file2.py", "file3.py"],
+    ]
+    assert plan.skipped == ["file4.py"]
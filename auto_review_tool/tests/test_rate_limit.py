@@ -0,0 +1,76 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from auto_review_tool.core.rate_limit import RateLimitBudget
+from auto_review_tool.main import app
+from auto_review_tool.services import review as review_service
+
+
+class InMemoryRedis:
+    def __init__(self):
+        self.is_connected = True
+        self.values = {}
+
+    async def set(self, key, value, expire=3600):
+        self.values[key] = value
+
+    async def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+
+def _headers(remaining, reset):
+    return {"x-ratelimit-remaining": str(remaining), "x-ratelimit-reset": str(reset)}
+
+
+@pytest.mark.asyncio
+async def test_budget_is_shared_between_workers():
+    redis = InMemoryRedis()
+    reset = int(time.time()) + 120
+    first = RateLimitBudget(redis, ["token"], reserve=10, sync_interval=60)
+    second = RateLimitBudget(redis, ["token"], reserve=10, sync_interval=60)
+
+    await first.update("token", _headers(4000, reset))
+    await first.update("token", _headers(3999, reset))
+    assert await second.retry_after() == 0
+
+    await first.update("token", _headers(5, reset))
+    retry_after = await second.retry_after()
+    assert 110 <= retry_after <= 121
+
+
+@pytest.mark.asyncio
+async def test_budget_picks_token_with_most_remaining_requests():
+    reset = int(time.time()) + 120
+    budget = RateLimitBudget(
+        InMemoryRedis(), ["first", "second"], reserve=10, sync_interval=0
+    )
+
+    await budget.update("first", _headers(100, reset))
+    await budget.update("second", _headers(200, reset))
+    assert budget.pick_token() == "second"
+
+    await budget.update("first", _headers(0, reset))
+    assert budget.pick_token() == "second"
+    await budget.update("second", _headers(0, reset))
+    assert 110 <= await budget.retry_after() <= 121
+
+
+def test_review_endpoint_returns_retry_after_when_rate_limited():
+    budget = RateLimitBudget(InMemoryRedis(), ["token"], reserve=10, sync_interval=0)
+    asyncio.run(budget.update("token", _headers(0, int(time.time()) + 30)))
+    payload = {
+        "assignment_description": "Review this code.",
+        "github_repo_url": "https://github.com/test/repo",
+        "candidate_level": "Junior",
+    }
+
+    with patch.object(review_service.get_github_client(), "rate_limit", budget):
+        with TestClient(app) as client:
+            response = client.post("/api/review", json=payload)
+
+    assert response.status_code == 503
+    assert 1 <= int(response.headers["Retry-After"]) <= 31
@@ -0,0 +1,75 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from auto_review_tool.clients.github_client import GitHubClient
+from auto_review_tool.clients.openai_client import OpenAIClient
+from auto_review_tool.core.cache import cache
+from auto_review_tool.main import app
+from auto_review_tool.models.review import ReviewRequest, ReviewResponse
+from auto_review_tool.services import review as review_service
+
+REQUEST = ReviewRequest(
+    assignment_description="Review this code.",
+    github_repo_url="https://github.com/test/repo",
+    candidate_level="Junior",
+)
+
+
+@pytest.mark.asyncio
+@patch.object(OpenAIClient, "analyze_code", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_file_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_repo_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_head_commit", new_callable=AsyncMock)
+async def test_reviewed_commit_is_answered_from_result_store(
+        mock_get_head_commit,
+        mock_get_repo_contents,
+        mock_get_file_contents,
+        mock_analyze_code,
+        isolated_result_store,
+):
+    mock_get_head_commit.return_value = "c1"
+    mock_get_repo_contents.return_value = [{"path": "main.py", "type": "blob"}]
+    mock_get_file_contents.return_value = {"main.py": "print(1)"}
+    mock_analyze_code.return_value = "Stored review"
+
+    first = await review_service.run_review(REQUEST)
+    # The local cache is gone, e.g. after a restart.
+    cache.local.clear()
+    second = await review_service.run_review(REQUEST)
+
+    assert first == second
+    mock_get_repo_contents.assert_awaited_once()
+    mock_analyze_code.assert_awaited_once()
+
+    other_level = REQUEST.model_copy(update={"candidate_level": "Senior"})
+    assert await review_service.get_stored_result(other_level, "c1") is None
+
+
+def test_list_and_get_results(isolated_result_store):
+    with TestClient(app) as client:
+        for commit_sha in ["c1", "c2"]:
+            client.portal.call(
+                review_service.store_result,
+                REQUEST,
+                commit_sha,
+                ReviewResponse(
+                    found_files=["main.py"], analysis=f"Review of {commit_sha}"
+                ),
+            )
+
+        response = client.get(
+            "/api/results", params={"repo_url": "https://github.com/test/repo"}
+        )
+        assert response.status_code == 200
+        results = response.json()
+        assert [result["commit_sha"] for result in results] == ["c2", "c1"]
+        assert results[0]["found_files"] == ["main.py"]
+
+        response = client.get("/api/results", params={"commit_sha": "c1", "limit": 1})
+        assert [result["analysis"] for result in response.json()] == ["Review of c1"]
+
+        result_id = results[1]["id"]
+        assert client.get(f"/api/results/{result_id}").json()["commit_sha"] == "c1"
+        assert client.get("/api/results/999").status_code == 404
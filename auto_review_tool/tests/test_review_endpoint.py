@@ -1,14 +1,20 @@
+import asyncio
+import json
+import time
 from unittest.mock import AsyncMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
+from httpx import ASGITransport, AsyncClient
 
 from auto_review_tool.clients.github_client import GitHubClient
 from auto_review_tool.clients.openai_client import OpenAIClient
 from auto_review_tool.main import app
+from auto_review_tool.services import review as review_service
 
 
 @pytest.mark.asyncio
+@patch.object(GitHubClient, "get_head_commit", new=AsyncMock(return_value="c1"))
 @patch.object(GitHubClient, "get_repo_contents", new_callable=AsyncMock)
 @patch.object(GitHubClient, "get_file_contents", new_callable=AsyncMock)
 @patch.object(OpenAIClient, "analyze_code", new_callable=AsyncMock)
@@ -49,6 +55,131 @@ async def test_review_endpoint(
         assert json_response["found_files"] == ["file1.py", "file2.py"]
         assert "Excellent code" in json_response["analysis"]
 
-    mock_get_repo_contents.assert_called_once_with("https://github.com/test/repo")
+    mock_get_repo_contents.assert_called_once_with(
+        "https://github.com/test/repo", "c1"
+    )
     mock_get_file_contents.assert_called_once()
-    mock_analyze_code.assert_called_once()
\ No newline at end of file
+    mock_analyze_code.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch.object(GitHubClient, "get_head_commit", new=AsyncMock(return_value="c1"))
+@patch.object(GitHubClient, "get_repo_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_file_contents", new_callable=AsyncMock)
+async def test_concurrent_reviews_overlap(
+        mock_get_file_contents,
+        mock_get_repo_contents,
+        openai_stub_server,
+):
+    openai_stub_server.latency = 0.5
+    mock_get_repo_contents.return_value = [{"path": "file1.py", "type": "blob"}]
+
+    async def get_file_contents(_files, **_kwargs):
+        return {"file1.py": f"print({time.monotonic()})"}
+
+    mock_get_file_contents.side_effect = get_file_contents
+    openai_client = OpenAIClient(api_key="test_key", base_url=openai_stub_server.url)
+
+    with patch.object(review_service, "openai_client", openai_client):
+        async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            payload = {
+                "assignment_description": "Review this code.",
+                "github_repo_url": "https://github.com/test/repo",
+                "candidate_level": "Junior",
+            }
+            started = time.monotonic()
+            responses = await asyncio.gather(
+                client.post("/api/review", json=payload),
+                client.post("/api/review", json=payload),
+            )
+            elapsed = time.monotonic() - started
+    await openai_client.close()
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert len(openai_stub_server.requests) == 2
+    assert elapsed < 2 * openai_stub_server.latency
+
+
+def test_review_endpoint_uses_injected_clients():
+    github_client = AsyncMock(spec=GitHubClient)
+    github_client.retry_after.return_value = 0
+    github_client.get_head_commit.return_value = "c1"
+    github_client.get_repo_contents.return_value = [
+        {"path": "file1.py", "type": "blob"}
+    ]
+    github_client.get_file_contents.return_value = {"file1.py": "print(1)"}
+    openai_client = AsyncMock(spec=OpenAIClient)
+    openai_client.analyze_code.return_value = "Injected review"
+    payload = {
+        "assignment_description": "Review this code.",
+        "github_repo_url": "https://github.com/test/injected",
+        "candidate_level": "Junior",
+    }
+
+    app.dependency_overrides[review_service.get_github_client] = lambda: github_client
+    app.dependency_overrides[review_service.get_openai_client] = lambda: openai_client
+    try:
+        with TestClient(app) as client:
+            response = client.post("/api/review", json=payload)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200, response.json()
+    assert response.json()["analysis"] == "Injected review"
+    github_client.get_repo_contents.assert_awaited_once_with(
+        "https://github.com/test/injected", "c1"
+    )
+    openai_client.analyze_code.assert_awaited_once()
+
+
+def _parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@patch.object(GitHubClient, "get_head_commit", new=AsyncMock(return_value="c1"))
+@patch.object(GitHubClient, "get_repo_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_file_contents", new_callable=AsyncMock)
+def test_review_stream_endpoint(
+        mock_get_file_contents,
+        mock_get_repo_contents,
+        openai_stub_server,
+):
+    mock_get_repo_contents.return_value = [{"path": "file1.py", "type": "blob"}]
+    mock_get_file_contents.return_value = {"file1.py": "print('stream')"}
+    openai_client = OpenAIClient(api_key="test_key", base_url=openai_stub_server.url)
+    payload = {
+        "assignment_description": "Review this code.",
+        "github_repo_url": "https://github.com/test/repo",
+        "candidate_level": "Junior",
+    }
+
+    app.dependency_overrides[review_service.get_openai_client] = lambda: openai_client
+    try:
+        with TestClient(app) as client:
+            first = client.post("/api/review/stream", json=payload)
+            second = client.post("/api/review/stream", json=payload)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert first.status_code == 200
+    assert first.headers["content-type"].startswith("text/event-stream")
+    events = _parse_events(first.text)
+    assert events[0] == ("progress", {"stage": "tree_fetched", "files": 1})
+    assert ("progress", {"stage": "analysis_started"}) in events
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    assert events[-1] == (
+        "result",
+        {"found_files": ["file1.py"], "analysis": "".join(tokens)},
+    )
+
+    second_events = _parse_events(second.text)
+    assert ("progress", {"stage": "cache_hit", "source": "results"}) in second_events
+    assert second_events[-1] == events[-1]
+    assert len(openai_stub_server.requests) == 1
@@ -0,0 +1,97 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from auto_review_tool.clients.github_client import GitHubClient
+from auto_review_tool.clients.openai_client import OpenAIClient
+from auto_review_tool.models.review import ReviewRequest
+from auto_review_tool.services import review as review_service
+
+REQUEST = ReviewRequest(
+    assignment_description="Review this code.",
+    github_repo_url="https://github.com/test/repo",
+    candidate_level="Junior",
+)
+
+
+def _tree(**shas):
+    return [
+        {
+            "path": path.replace("_", "."),
+            "type": "blob",
+            "sha": sha,
+            "url": f"https://api.github.com/repos/test/repo/git/blobs/{sha}",
+        }
+        for path, sha in shas.items()
+    ]
+
+
+@pytest.mark.asyncio
+@patch.object(OpenAIClient, "analyze_changes", new_callable=AsyncMock)
+@patch.object(OpenAIClient, "analyze_code", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_file_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_repo_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_head_commit", new_callable=AsyncMock)
+async def test_unchanged_repository_reuses_previous_review(
+        mock_get_head_commit,
+        mock_get_repo_contents,
+        mock_get_file_contents,
+        mock_analyze_code,
+        mock_analyze_changes,
+):
+    # A new commit (e.g. a merge) which does not change any file.
+    mock_get_head_commit.side_effect = ["c1", "c2"]
+    mock_get_repo_contents.return_value = _tree(main_py="a1", README_md="b1")
+    mock_get_file_contents.return_value = {"main.py": "print(1)", "README.md": "#"}
+    mock_analyze_code.return_value = "First review"
+
+    first = await review_service.run_review(REQUEST)
+    second = await review_service.run_review(REQUEST)
+
+    assert first.analysis == second.analysis == "First review"
+    assert second.found_files == ["main.py", "README.md"]
+    mock_get_file_contents.assert_awaited_once()
+    mock_analyze_code.assert_awaited_once()
+    mock_analyze_changes.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch.object(OpenAIClient, "analyze_changes", new_callable=AsyncMock)
+@patch.object(OpenAIClient, "analyze_code", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_file_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_repo_contents", new_callable=AsyncMock)
+@patch.object(GitHubClient, "get_head_commit", new_callable=AsyncMock)
+async def test_changed_repository_reviews_only_the_diff(
+        mock_get_head_commit,
+        mock_get_repo_contents,
+        mock_get_file_contents,
+        mock_analyze_code,
+        mock_analyze_changes,
+):
+    mock_get_head_commit.side_effect = ["c1", "c2"]
+    mock_get_repo_contents.return_value = _tree(
+        main_py="a1", README_md="b1", setup_py="c1"
+    )
+    mock_get_file_contents.return_value = {"main.py": "print(1)\n"}
+    mock_analyze_code.return_value = "First review"
+    await review_service.run_review(REQUEST)
+
+    mock_get_repo_contents.return_value = _tree(main_py="a2", README_md="b1")
+    mock_get_file_contents.side_effect = [
+        {"main.py": "print(2)\n"},
+        {"main.py": "print(1)\n"},
+    ]
+    mock_analyze_changes.return_value = "Updated review"
+
+    result = await review_service.run_review(REQUEST)
+
+    assert result.analysis == "Updated review"
+    new_files, old_files = [
+        call.args[0] for call in mock_get_file_contents.await_args_list[1:]
+    ]
+    assert [item["sha"] for item in new_files] == ["a2"]
+    assert old_files[0]["url"].endswith("/git/blobs/a1")
+    kwargs = mock_analyze_changes.await_args.kwargs
+    assert kwargs["previous_analysis"] == "First review"
+    assert kwargs["removed_files"] == ["setup.py"]
+    assert "-print(1)\n+print(2)\n" in kwargs["diffs"]["main.py"]
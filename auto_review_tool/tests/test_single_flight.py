@@ -0,0 +1,103 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from auto_review_tool.core.single_flight import SingleFlight
+
+
+def _single_flight(is_connected=False):
+    redis = MagicMock(is_connected=is_connected)
+    redis.acquire_lock = AsyncMock(return_value=True)
+    redis.extend_lock = AsyncMock(return_value=True)
+    redis.release_lock = AsyncMock()
+    return SingleFlight(redis, lease=0.3, wait_timeout=1, poll_interval=0.01)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_result():
+    single_flight = _single_flight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"result": calls}
+
+    results = await asyncio.gather(*[single_flight.do("key", fetch) for _ in range(5)])
+
+    assert calls == 1
+    assert results == [{"result": 1}] * 5
+    assert await single_flight.do("key", fetch) == {"result": 2}
+
+
+@pytest.mark.asyncio
+async def test_followers_get_the_leader_exception():
+    single_flight = _single_flight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        single_flight.do("key", fail),
+        single_flight.do("key", fail),
+        return_exceptions=True,
+    )
+
+    assert [type(result) for result in results] == [ValueError, ValueError]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    single_flight = _single_flight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    leader = asyncio.create_task(single_flight.do("key", fetch))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(single_flight.do("key", fetch)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await asyncio.gather(*followers) == ["result", "result"]
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+@pytest.mark.asyncio
+async def test_waits_for_lock_held_by_another_worker():
+    single_flight = _single_flight(is_connected=True)
+    single_flight.redis.acquire_lock.side_effect = [False, False, True]
+    fetch = AsyncMock(return_value="cached")
+
+    assert await single_flight.do("key", fetch) == "cached"
+
+    assert single_flight.redis.acquire_lock.await_count == 3
+    fetch.assert_awaited_once()
+    single_flight.redis.release_lock.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_renews_lease_while_the_call_runs():
+    single_flight = _single_flight(is_connected=True)
+
+    async def slow_fetch():
+        await asyncio.sleep(0.25)
+        return "done"
+
+    assert await single_flight.do("key", slow_fetch) == "done"
+    assert single_flight.redis.extend_lock.await_count >= 2
+
+
+@pytest.mark.asyncio
+async def test_runs_without_lock_when_redis_fails():
+    single_flight = _single_flight(is_connected=True)
+    single_flight.redis.acquire_lock.return_value = None
+    fetch = AsyncMock(return_value="fresh")
+
+    assert await single_flight.do("key", fetch) == "fresh"
+    single_flight.redis.release_lock.assert_not_called()
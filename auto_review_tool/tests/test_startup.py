@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+
+def test_cli_and_package_import_without_the_app():
+    code = (
+        "import sys, auto_review_tool.cli; "
+        "print(sorted({'auto_review_tool.main', 'openai', 'redis', 'uvicorn'}"
+        " & set(sys.modules)))"
+    )
+
+    completed = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+
+    assert completed.stdout.strip() == "[]"
+
+
+def test_app_imports_clients_lazily(tmp_path):
+    code = (
+        "import sys, auto_review_tool.main; "
+        "from auto_review_tool.services import review; "
+        "print(sorted({'openai', 'redis'} & set(sys.modules)), review.github_client)"
+    )
+
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        # Importing the app sets up logging.
+        env={**os.environ, "LOG_FILE": str(tmp_path / "app.log")},
+    )
+
+    assert completed.stdout.strip() == "[] None"
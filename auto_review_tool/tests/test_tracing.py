@@ -0,0 +1,79 @@
+import asyncio
+import json
+import logging
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.tracing import RequestIdFilter, request_id_var, tracer
+from auto_review_tool.main import app
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    with patch.object(settings, "TRACING_EXPORTER", "jsonl"), patch.object(
+            settings, "TRACING_FILE", str(path)
+    ):
+        yield path
+    tracer.exporter = None
+
+
+def read_spans(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_spans_of_a_request_share_its_trace(trace_file):
+    await tracer.start()
+    request_id_var.set("request-1")
+
+    async def fetch_blob():
+        with tracer.span("github.blob", url="blob-url") as span:
+            span.set_attribute("size", 3)
+
+    with tracer.span("POST /api/review"):
+        await asyncio.gather(fetch_blob(), fetch_blob())
+        with pytest.raises(TimeoutError):
+            with tracer.span("redis.get", key="key"):
+                raise TimeoutError("Redis timed out")
+    await tracer.shutdown()
+
+    spans = {span["name"]: span for span in read_spans(trace_file)}
+    root = spans["POST /api/review"]
+    assert root["parent_id"] is None
+    assert len(read_spans(trace_file)) == 4
+    for name in ["github.blob", "redis.get"]:
+        assert spans[name]["trace_id"] == root["trace_id"]
+        assert spans[name]["parent_id"] == root["span_id"]
+        assert spans[name]["request_id"] == "request-1"
+    assert spans["github.blob"]["attributes"] == {"url": "blob-url", "size": 3}
+    assert spans["redis.get"]["error"] == "TimeoutError: Redis timed out"
+
+
+def test_request_id_is_echoed_and_traced(trace_file, isolated_result_store):
+    with TestClient(app) as client:
+        response = client.get("/api/results", headers={"X-Request-ID": "abc123"})
+        generated = client.get("/api/results").headers["X-Request-ID"]
+
+    assert response.headers["X-Request-ID"] == "abc123"
+    assert generated and generated != "abc123"
+    spans = read_spans(trace_file)
+    assert [span["request_id"] for span in spans] == ["abc123", generated]
+    assert spans[0]["name"] == "GET /api/results"
+    assert spans[0]["attributes"]["http.status_code"] == 200
+
+
+def test_request_id_is_added_to_log_records():
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "message", (), None)
+    RequestIdFilter().filter(record)
+    assert record.request_id == "-"
+
+    token = request_id_var.set("abc123")
+    try:
+        RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+    assert record.request_id == "abc123"
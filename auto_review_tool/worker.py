@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, Set
+
+from pydantic import ValidationError
+
+from auto_review_tool import initialize_auto_review_tool
+from auto_review_tool.core.config import settings
+from auto_review_tool.core.job_queue import job_queue
+from auto_review_tool.core.metrics import REVIEWS_IN_PROGRESS
+from auto_review_tool.core.redis_client import redis_client
+from auto_review_tool.core.result_store import result_store
+from auto_review_tool.core.template_store import template_store
+from auto_review_tool.core.tracing import request_id_var, tracer
+from auto_review_tool.core.webhooks import check_webhook_url, create_webhook_client
+from auto_review_tool.models.review import ReviewJob, ReviewJobRequest
+from auto_review_tool.services.review import close_clients, connect_clients, run_review
+
+
+async def process_job(job_id: str, worker_id: str = "") -> None:
+    """
+    Run a queued review and store its result.
+    The lease of the job is renewed while it runs, and the job is only
+    acknowledged once it is finished, so it is requeued if the worker stops.
+    """
+    # Every job runs in its own task, so the id only applies to this job.
+    request_id_var.set(job_id)
+    renewal = asyncio.create_task(_renew_lease(job_id, worker_id))
+    try:
+        with tracer.span("job", job_id=job_id):
+            await _process_job(job_id)
+    finally:
+        renewal.cancel()
+    await job_queue.ack(job_id)
+
+
+async def _renew_lease(job_id: str, worker_id: str) -> None:
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE / 3)
+        await job_queue.renew(job_id, worker_id)
+
+
+async def _process_job(job_id: str) -> None:
+    job = await job_queue.get(job_id)
+    if job is None:
+        logging.warning(f"Review job {job_id} has expired")
+        return None
+
+    try:
+        request = ReviewJobRequest(**job["request"])
+    except (ValidationError, KeyError, TypeError) as e:
+        # Requeueing the job would not help, so it fails right away.
+        logging.error(f"Review job {job_id} has an invalid request: {e}")
+        await job_queue.update(
+            job_id, status="failed", error=f"The request of the job is invalid: {e}"
+        )
+        return None
+
+    attempts = job.get("attempts", 0) + 1
+    if attempts > settings.JOB_MAX_ATTEMPTS:
+        logging.error(f"Review job {job_id} was interrupted {attempts - 1} times")
+        job = await job_queue.update(
+            job_id,
+            status="failed",
+            error="The review was interrupted too many times.",
+        )
+    else:
+        logging.info(f"Running review job {job_id}, attempt {attempts}")
+        await job_queue.update(job_id, status="running", attempts=attempts)
+        try:
+            with REVIEWS_IN_PROGRESS.labels(endpoint="job").track_inprogress():
+                result = await run_review(request)
+            job = await job_queue.update(
+                job_id, status="completed", result=result.model_dump()
+            )
+        except Exception as e:
+            logging.error(f"Review job {job_id} failed: {e}")
+            job = await job_queue.update(job_id, status="failed", error=str(e))
+
+    if request.webhook_url is not None and job is not None:
+        await send_webhook(str(request.webhook_url), job)
+
+
+async def send_webhook(url: str, job: Dict[str, Any]) -> None:
+    """
+    POST a finished job to the webhook of its request.
+    The URL is checked again, as the addresses of its host may have changed
+    since the job was submitted, and so is the address it is sent to.
+    Redirects are not followed.
+    """
+    payload = ReviewJob(**job).model_dump()
+    try:
+        await check_webhook_url(url)
+        async with create_webhook_client() as client:
+            response = await client.post(url, json=payload)
+            response.raise_for_status()
+    except Exception as e:
+        logging.error(f"Failed to deliver webhook for job {job['job_id']}: {e}")
+
+
+async def _requeue_stale_jobs() -> None:
+    """Requeue the jobs of crashed workers, checked once per lease."""
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE)
+        try:
+            await job_queue.requeue_stale()
+        except Exception as e:
+            logging.error(f"Failed to requeue stale review jobs: {e}")
+
+
+async def run_worker(concurrency: int) -> None:
+    """
+    Take review jobs from the queue and run up to `concurrency` of them
+    at the same time.
+    """
+    initialize_auto_review_tool()
+    await redis_client.connect()
+    if not redis_client.is_connected:
+        raise RuntimeError("The worker needs Redis to read the job queue.")
+    await result_store.connect()
+    await template_store.connect()
+    await connect_clients()
+    await tracer.start()
+
+    worker_id = uuid.uuid4().hex
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks: Set[asyncio.Task] = set()
+    requeue = asyncio.create_task(_requeue_stale_jobs())
+    logging.info(f"Worker started with concurrency {concurrency}")
+    try:
+        while True:
+            await semaphore.acquire()
+            job_id = await job_queue.claim(worker_id, timeout=5)
+            if job_id is None:
+                semaphore.release()
+                continue
+            task = asyncio.create_task(process_job(job_id, worker_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda _task: semaphore.release())
+    finally:
+        requeue.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await tracer.shutdown()
+        await close_clients()
+        await template_store.close()
+        await result_store.close()
+        await redis_client.close()
@@ -0,0 +1,130 @@
+"""
+Benchmark of the codecs of values stored in Redis.
+
+Encodes the source files of a directory (this repository by default) as
+cached blobs, together with a repository tree and a review, and reports
+the stored size against plain JSON, which was used before the codec,
+and the encode/decode time per value.
+Usage:
+    python -m benchmarks.codec
+    python -m benchmarks.codec --source ~/projects/app --output codec.json
+"""
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import click
+
+from auto_review_tool.core import codec as codec_module
+from auto_review_tool.core.codec import CacheCodec
+
+ROOT = Path(__file__).resolve().parent.parent
+SOURCE_SUFFIXES = {".py", ".js", ".ts", ".go", ".java", ".md", ".toml", ".yml"}
+CODECS = [
+    ("json", "none"),
+    ("json", "zlib"),
+    ("msgpack", "none"),
+    ("msgpack", "zlib"),
+    ("msgpack", "zstd"),
+    ("json", "zstd"),
+]
+
+
+def load_values(source: Path) -> List[Any]:
+    """Cache values of a review of the files under `source`."""
+    files = {
+        str(path.relative_to(source)): path.read_text(errors="replace")
+        for path in sorted(source.rglob("*"))
+        if path.is_file() and path.suffix in SOURCE_SUFFIXES
+    }
+    tree = [
+        {"path": path, "type": "blob", "sha": f"{index:040x}", "size": len(content)}
+        for index, (path, content) in enumerate(files.items())
+    ]
+    review = {
+        "found_files": list(files),
+        "analysis": "\n".join(f"- {path}: looks good." for path in files),
+    }
+    return [*files.values(), tree, review]
+
+
+def measure(function: Callable[[Any], Any], values: List[Any], repeat: int) -> float:
+    """Mean time of a call in microseconds, of the fastest of `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for value in values:
+            function(value)
+        best = min(best, time.perf_counter() - started)
+    return best / len(values) * 1e6
+
+
+def is_available(serializer: str, compression: str) -> bool:
+    if serializer == "msgpack" and codec_module.msgpack is None:
+        return False
+    return compression != "zstd" or codec_module.zstandard is not None
+
+
+@click.command()
+@click.option(
+    "--source",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=ROOT,
+    show_default=True,
+    help="Directory with the source files to encode",
+)
+@click.option(
+    "--threshold",
+    default=1024,
+    show_default=True,
+    help="Values longer than this (in bytes) are compressed",
+)
+@click.option("--repeat", default=5, show_default=True, help="Runs per measurement")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the JSON report")
+def main(source: Path, threshold: int, repeat: int, output: Optional[str]) -> None:
+    """Compare the size and speed of the Redis value codecs."""
+    values = load_values(source)
+    plain_size = sum(len(json.dumps(value).encode()) for value in values)
+    click.echo(
+        f"{len(values)} values, {plain_size / 1024:.1f} KiB as plain JSON\n"
+        f"{'codec':<18}{'KiB':>10}{'saved':>8}{'encode us':>12}{'decode us':>12}"
+    )
+
+    results: List[Dict[str, Any]] = []
+    for serializer, compression in CODECS:
+        if not is_available(serializer, compression):
+            click.echo(f"{serializer}+{compression:<13}not installed")
+            continue
+        codec = CacheCodec(serializer, compression, compression_threshold=threshold)
+        encoded = [codec.encode(value) for value in values]
+        size = sum(len(data) for data in encoded)
+        result = {
+            "serializer": serializer,
+            "compression": compression,
+            "bytes": size,
+            "saved": round(1 - size / plain_size, 4),
+            "encode_us": round(measure(codec.encode, values, repeat), 2),
+            "decode_us": round(measure(codec.decode, encoded, repeat), 2),
+        }
+        results.append(result)
+        click.echo(
+            f"{serializer + '+' + compression:<18}{size / 1024:>10.1f}"
+            f"{result['saved']:>8.0%}{result['encode_us']:>12.1f}"
+            f"{result['decode_us']:>12.1f}"
+        )
+
+    if output:
+        report = {
+            "source": str(source),
+            "values": len(values),
+            "plain_json_bytes": plain_size,
+            "threshold": threshold,
+            "codecs": results,
+        }
+        Path(output).write_text(json.dumps(report, indent=2))
+        click.echo(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+"""
+Local stand-ins for GitHub, OpenAI and Redis used by the benchmarks.
+Every server counts the calls it receives, so a benchmark can report
+how many upstream requests a review costs.
+"""
+import asyncio
+import base64
+import io
+import json
+import re
+import tarfile
+import threading
+import time
+from collections import Counter
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Synthetic repositories are named "<number of files>f-<seed>", e.g. "100f-cold-3".
+REPO_NAME_PATTERN = re.compile(r"^(\d+)f-[\w.-]+$")
+FILES_PER_PACKAGE = 50
+
+
+def build_file(repo: str, index: int) -> Tuple[str, bytes]:
+    """Generate the path and the content of a file of a synthetic repository."""
+    if index == 0:
+        return "README.md", f"# {repo}\n\nSynthetic repository.\n".encode()
+    path = f"src/package_{index // FILES_PER_PACKAGE}/module_{index}.py"
+    lines = [f'"""Module {index} of {repo}."""', ""]
+    for function in range(8):
+        lines += [
+            f"def function_{function}(value: int) -> int:",
+            f"    total = value * {index} + {function}",
+            "    for step in range(3):",
+            "        total += step",
+            "    return total",
+            "",
+        ]
+    return path, "\n".join(lines).encode()
+
+
+def get_blob_sha(content: bytes) -> str:
+    header = b"blob %d\0" % len(content)
+    return sha1(header + content, usedforsecurity=False).hexdigest()
+
+
+class BackgroundHTTPServer(ThreadingHTTPServer):
+    """An HTTP server serving requests in a background thread."""
+
+    daemon_threads = True
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class FakeGitHub(BackgroundHTTPServer):
+    """
+    Serves the head commit, the tree, the blobs and the tarball
+    of synthetic repositories of the "bench" owner.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), GitHubHandler)
+        self.url = f"http://127.0.0.1:{self.server_port}"
+        self.calls: Counter = Counter()
+        self.blobs: Dict[str, bytes] = {}
+        self.lock = threading.Lock()
+
+    def get_files(self, repo: str) -> List[Tuple[str, bytes]]:
+        match = REPO_NAME_PATTERN.match(repo)
+        if match is None:
+            return []
+        return [build_file(repo, index) for index in range(int(match.group(1)))]
+
+    def get_tree(self, repo: str) -> Dict[str, Any]:
+        tree = []
+        for path, content in self.get_files(repo):
+            blob_sha = get_blob_sha(content)
+            with self.lock:
+                self.blobs[blob_sha] = content
+            tree.append(
+                {
+                    "path": path,
+                    "mode": "100644",
+                    "type": "blob",
+                    "sha": blob_sha,
+                    "size": len(content),
+                    "url": f"{self.url}/repos/bench/{repo}/git/blobs/{blob_sha}",
+                }
+            )
+        tree_sha = sha1(repo.encode(), usedforsecurity=False).hexdigest()
+        return {"sha": tree_sha, "tree": tree, "truncated": False}
+
+    def get_tarball(self, repo: str) -> bytes:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            for path, content in self.get_files(repo):
+                info = tarfile.TarInfo(f"bench-{repo}-0000000/{path}")
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        return buffer.getvalue()
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+
+class GitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeGitHub
+
+    def do_GET(self) -> None:  # noqa: N802
+        path = urlparse(self.path).path
+        parts = path.strip("/").split("/")
+        if parts == ["rate_limit"]:
+            self._count("rate_limit")
+            body = {"rate": {"limit": 5000, "remaining": 5000}}
+            return self._respond(200, json.dumps(body).encode())
+        if len(parts) < 4 or parts[:2] != ["repos", "bench"]:
+            return self._respond(404, b'{"message": "Not Found"}')
+
+        repo, resource = parts[2], parts[3:]
+        if REPO_NAME_PATTERN.match(repo) is None:
+            return self._respond(404, b'{"message": "Not Found"}')
+        if resource[:1] == ["commits"]:
+            self._count("commits")
+            commit_sha = sha1(repo.encode(), usedforsecurity=False).hexdigest()
+            return self._respond_with_etag(commit_sha.encode(), commit_sha)
+        if resource[:2] == ["git", "trees"]:
+            self._count("trees")
+            tree = self.server.get_tree(repo)
+            return self._respond_with_etag(json.dumps(tree).encode(), tree["sha"])
+        if resource[:2] == ["git", "blobs"] and len(resource) == 3:
+            self._count("blobs")
+            with self.server.lock:
+                content = self.server.blobs.get(resource[2])
+            if content is None:
+                return self._respond(404, b'{"message": "Not Found"}')
+            if "raw" not in self.headers.get("Accept", ""):
+                encoded = base64.b64encode(content).decode()
+                content = json.dumps({"content": encoded, "encoding": "base64"})
+                content = content.encode()
+            return self._respond(200, content)
+        if resource[:1] == ["tarball"]:
+            self._count("tarball")
+            return self._respond(
+                200,
+                self.server.get_tarball(repo),
+                {"Content-Type": "application/x-gzip"},
+            )
+        return self._respond(404, b'{"message": "Not Found"}')
+
+    def _count(self, route: str) -> None:
+        with self.server.lock:
+            self.server.calls[route] += 1
+
+    def _respond_with_etag(self, body: bytes, etag_value: str) -> None:
+        etag = f'"{etag_value}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._count("not_modified")
+            return self._respond(304, b"", {"ETag": etag})
+        return self._respond(200, body, {"ETag": etag})
+
+    def _respond(
+            self,
+            status: int,
+            body: bytes,
+            headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("X-RateLimit-Remaining", "4999")
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+class FakeOpenAI(BackgroundHTTPServer):
+    """
+    Answers chat completions after `latency` seconds,
+    streamed word by word when the request asks for it.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), OpenAIHandler)
+        self.url = f"http://127.0.0.1:{self.server_port}/v1"
+        self.latency = latency
+        self.answer = (
+            "- Downsides/Comments: None\n- Rating: 5\n- Conclusion: Excellent code"
+        )
+        self.calls: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+
+class OpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeOpenAI
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length))
+        with self.server.lock:
+            self.server.calls["chat_completions"] += 1
+        time.sleep(self.server.latency)
+        if request.get("stream"):
+            return self._stream_answer(request)
+        body = json.dumps(
+            {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": self.server.answer},
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 10,
+                    "completion_tokens": 10,
+                    "total_tokens": 20,
+                },
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_answer(self, request: Dict[str, Any]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for word in self.server.answer.split(" "):
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [{"index": 0, "delta": {"content": word + " "}}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+class FakeRedis:
+    """
+    A Redis server speaking RESP2 with the commands used by the application:
+    strings with expiration, MGET/PTTL, the lock and admission scripts
+    and list queues. It runs its own event loop in a thread.
+    """
+
+    def __init__(self) -> None:
+        self.values: Dict[bytes, bytes] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.lists: Dict[bytes, List[bytes]] = {}
+        # Token buckets and slots of the admission scripts, which never expire.
+        self.buckets: Dict[bytes, Tuple[float, float]] = {}
+        self.slots: Dict[bytes, Dict[bytes, float]] = {}
+        self.calls: Counter = Counter()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.url = ""
+
+    def start(self) -> None:
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, "127.0.0.1", 0), self.loop
+        ).result()
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"redis://127.0.0.1:{port}/0"
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def reset(self) -> None:
+        def clear() -> None:
+            self.values.clear()
+            self.expires.clear()
+            self.lists.clear()
+            self.buckets.clear()
+            self.slots.clear()
+            self.calls.clear()
+
+        self.loop.call_soon_threadsafe(clear)
+
+    async def _handle(
+            self,
+            reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                writer.write(self._execute(command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        header = await reader.readline()
+        if not header:
+            return None
+        count = int(header[1:])
+        arguments = []
+        for _ in range(count):
+            length = int((await reader.readline())[1:])
+            arguments.append((await reader.readexactly(length + 2))[:-2])
+        return arguments
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return self.values.get(key)
+
+    def _execute(self, command: List[bytes]) -> bytes:
+        name = command[0].decode().upper()
+        arguments = command[1:]
+        self.calls[name] += 1
+        if name == "PING":
+            return b"+PONG\r\n"
+        if name in ("CLIENT", "SELECT"):
+            return b"+OK\r\n"
+        if name == "GET":
+            return _bulk(self._get(arguments[0]))
+        if name == "MGET":
+            return _array([_bulk(self._get(key)) for key in arguments])
+        if name == "SET":
+            return self._set(arguments)
+        if name == "PTTL":
+            if self._get(arguments[0]) is None:
+                return b":-2\r\n"
+            expires_at = self.expires.get(arguments[0])
+            if expires_at is None:
+                return b":-1\r\n"
+            return b":%d\r\n" % int((expires_at - time.time()) * 1000)
+        if name == "DEL":
+            deleted = 0
+            for key in arguments:
+                deleted += self.values.pop(key, None) is not None
+                self.expires.pop(key, None)
+            return b":%d\r\n" % deleted
+        if name == "EVAL":
+            return self._eval(arguments)
+        if name == "RPUSH":
+            self.lists.setdefault(arguments[0], []).extend(arguments[1:])
+            return b":%d\r\n" % len(self.lists[arguments[0]])
+        if name == "BLMOVE":
+            source, destination = arguments[0], arguments[1]
+            if not self.lists.get(source):
+                return b"$-1\r\n"
+            item = self.lists[source].pop(0)
+            self.lists.setdefault(destination, []).append(item)
+            return _bulk(item)
+        return f"-ERR unknown command '{name}'\r\n".encode()
+
+    def _set(self, arguments: List[bytes]) -> bytes:
+        key, value = arguments[0], arguments[1]
+        options = [argument.upper() for argument in arguments[2:]]
+        if b"NX" in options and self._get(key) is not None:
+            return b"$-1\r\n"
+        self.values[key] = value
+        self.expires.pop(key, None)
+        for option, unit in ((b"EX", 1.0), (b"PX", 0.001)):
+            if option in options:
+                ttl = float(arguments[2 + options.index(option) + 1]) * unit
+                self.expires[key] = time.time() + ttl
+        return b"+OK\r\n"
+
+    def _eval(self, arguments: List[bytes]) -> bytes:
+        """Run the scripts of the application, told apart by their commands."""
+        script, count = arguments[0], int(arguments[1])
+        keys, argv = arguments[2:2 + count], arguments[2 + count:]
+        if b"ZCARD" in script:
+            return self._admit(keys, argv)
+        if b'"XX"' in script:
+            for key in keys:
+                if argv[0] in self.slots.get(key, {}):
+                    self.slots[key][argv[0]] = time.time() + int(argv[1]) / 1000
+            return b":1\r\n"
+        if b"ZREM" in script:
+            for key in keys[:2]:
+                self.slots.get(key, {}).pop(argv[0], None)
+            average = float(self._get(keys[2]) or argv[1])
+            self._set([keys[2], b"%d" % (average * 0.9 + int(argv[1]) * 0.1)])
+            return b":1\r\n"
+        # The lock scripts compare the token, then extend or delete the lock.
+        key, token = keys[0], argv[0]
+        if self._get(key) != token:
+            return b":0\r\n"
+        if b"pexpire" in script:
+            self.expires[key] = time.time() + int(argv[1]) / 1000
+        else:
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return b":1\r\n"
+
+    def _admit(self, keys: List[bytes], argv: List[bytes]) -> bytes:
+        """The admission script: in-flight caps first, then token buckets."""
+        now = time.time()
+        rate, burst, client_rate, client_burst = (float(arg) for arg in argv[:4])
+        max_in_flight, client_max_in_flight = int(argv[4]), int(argv[5])
+        slot, lease = argv[6], int(argv[7]) / 1000
+        average = float(self._get(keys[4]) or 1000)
+
+        def reply(decision: int, retry_after_ms: float) -> bytes:
+            return _array([b":%d\r\n" % decision, b":%d\r\n" % retry_after_ms])
+
+        for decision, key, limit in (
+                (1, keys[3], client_max_in_flight),
+                (2, keys[2], max_in_flight),
+        ):
+            slots = self.slots.setdefault(key, {})
+            for expired in [name for name, expiry in slots.items() if expiry <= now]:
+                del slots[expired]
+            if 0 < limit <= len(slots):
+                return reply(decision, -(-average // len(slots)))
+        tokens = {}
+        for decision, key, key_rate, key_burst in (
+                (1, keys[1], client_rate, client_burst),
+                (2, keys[0], rate, burst),
+        ):
+            if key_rate <= 0:
+                continue
+            available, updated_at = self.buckets.get(key, (key_burst, now))
+            tokens[key] = min(key_burst, available + (now - updated_at) * key_rate)
+            if tokens[key] < 1:
+                return reply(decision, -(-(1 - tokens[key]) * 1000 // key_rate))
+        for key, available in tokens.items():
+            self.buckets[key] = (available - 1, now)
+        for key in keys[2:4]:
+            self.slots[key][slot] = now + lease
+        return reply(0, 0)
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(items: List[bytes]) -> bytes:
+    return b"*%d\r\n%s" % (len(items), b"".join(items))
@@ -0,0 +1,253 @@
+"""
+Benchmark of the review API against local stand-ins for GitHub, OpenAI
+and Redis.
+
+Every scenario reviews synthetic repositories of a given number of files:
+"cold" reviews a different repository with different files in every request,
+"warm" reviews the same repository again after it was reviewed once.
+Usage:
+    python -m benchmarks.run --files 10 --files 100 --output report.json
+    python -m benchmarks.run --files 100 --compare report.json
+"""
+import json
+import os
+import platform
+import subprocess  # noqa: S404 - scenarios run in fresh processes
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import click
+
+from benchmarks.fakes import FakeGitHub, FakeOpenAI, FakeRedis
+
+ROOT = Path(__file__).resolve().parent.parent
+MODES = ("cold", "warm")
+ADMISSION_LIMITS = (
+    "ADMISSION_RATE",
+    "ADMISSION_CLIENT_RATE",
+    "ADMISSION_MAX_IN_FLIGHT",
+    "ADMISSION_CLIENT_MAX_IN_FLIGHT",
+)
+
+
+def run_scenario(
+        files: int,
+        mode: str,
+        requests: int,
+        concurrency: int,
+        stream: bool,
+        environment: Dict[str, str],
+        servers: Dict[str, Any],
+        verbose: bool,
+) -> Dict[str, Any]:
+    """Run one scenario in a fresh process and collect the upstream calls."""
+    for server in servers.values():
+        server.reset()
+    seed = uuid.uuid4().hex[:8]
+    if mode == "cold":
+        repos = [f"{files}f-{seed}-{index}" for index in range(requests)]
+    else:
+        repos = [f"{files}f-{seed}"] * requests
+
+    command = [sys.executable, "-m", "benchmarks.scenario"]
+    command += ["--concurrency", str(concurrency)]
+    if stream:
+        command.append("--stream")
+    if mode == "warm":
+        command.append("--warm")
+    with tempfile.TemporaryDirectory() as workdir:
+        # The app writes its log file and the result store to the working directory.
+        completed = subprocess.run(  # noqa: S603
+            command + repos,
+            cwd=workdir,
+            env={
+                **environment,
+                "RESULT_STORE_PATH": os.path.join(workdir, "reviews.db"),
+            },
+            stdout=subprocess.PIPE,
+            stderr=None if verbose else subprocess.DEVNULL,
+            text=True,
+            check=True,
+        )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    if result["errors"]:
+        # Latencies of failed requests say nothing about the review.
+        raise click.ClickException(
+            f"{files} files {mode}: {result['errors']}/{result['requests']} "
+            f"requests failed with {result['error_statuses']}, "
+            "run with --verbose to see the logs of the app."
+        )
+    return {
+        "name": f"{files} files {mode}",
+        "files": files,
+        "mode": mode,
+        "concurrency": concurrency,
+        "stream": stream,
+        **result,
+        "upstream_calls": {
+            name: dict(server.calls) for name, server in servers.items()
+        },
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print the change of p95 latency and throughput against a baseline."""
+    previous = {scenario["name"]: scenario for scenario in baseline["scenarios"]}
+    click.echo(f"\n{'scenario':<22}{'p95 ms':>22}{'requests/s':>24}")
+    for scenario in report["scenarios"]:
+        old = previous.get(scenario["name"])
+        if old is None:
+            continue
+        p95, old_p95 = scenario["latency_ms"]["p95"], old["latency_ms"]["p95"]
+        rps, old_rps = scenario["requests_per_second"], old["requests_per_second"]
+        click.echo(
+            f"{scenario['name']:<22}"
+            f"{old_p95:>9.1f} -> {p95:>7.1f} {_change(old_p95, p95):>7}"
+            f"{old_rps:>9.1f} -> {rps:>7.1f} {_change(old_rps, rps):>7}"
+        )
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return ""
+    return f"{(new - old) / old:+.0%}"
+
+
+def _get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(  # noqa: S603, S607
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@click.command()
+@click.option(
+    "--files",
+    "file_counts",
+    multiple=True,
+    type=int,
+    default=(10, 100, 1000),
+    show_default=True,
+    help="Number of files of the synthetic repositories, can be repeated",
+)
+@click.option("--mode", "modes", multiple=True, type=click.Choice(MODES), default=MODES)
+@click.option("--requests", default=20, show_default=True, help="Reviews per scenario")
+@click.option("--concurrency", default=5, show_default=True, help="Reviews at a time")
+@click.option("--stream", is_flag=True, help="Use the streaming review endpoint")
+@click.option(
+    "--fetch-mode",
+    type=click.Choice(["blobs", "archive"]),
+    default="blobs",
+    show_default=True,
+)
+@click.option(
+    "--openai-latency",
+    default=0.2,
+    show_default=True,
+    help="Seconds before the fake OpenAI answers",
+)
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the JSON report")
+@click.option(
+    "--compare",
+    "baseline_path",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Compare with a previous JSON report",
+)
+@click.option("--verbose", is_flag=True, help="Show the logs of the app")
+def main(
+        file_counts: List[int],
+        modes: List[str],
+        requests: int,
+        concurrency: int,
+        stream: bool,
+        fetch_mode: str,
+        openai_latency: float,
+        output: Optional[str],
+        baseline_path: Optional[str],
+        verbose: bool,
+) -> None:
+    """Benchmark the review API with local GitHub, OpenAI and Redis stand-ins."""
+    github = FakeGitHub()
+    openai = FakeOpenAI(latency=openai_latency)
+    redis = FakeRedis()
+    redis.start()
+    servers = {"github": github, "openai": openai, "redis": redis}
+    github.start()
+    openai.start()
+
+    environment = {
+        # All requests come from one client, so admission control is disabled
+        # to measure the reviews, unless limits are set in the environment.
+        **{name: "0" for name in ADMISSION_LIMITS},
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])
+        ),
+        # The fake services accept any token.
+        "GITHUB_TOKEN": "bench",  # noqa: S105 - not a secret
+        "OPENAI_API_KEY": "bench",
+        "GITHUB_API_URL": github.url,
+        "OPENAI_BASE_URL": openai.url,
+        "REDIS_URL": redis.url,
+        "GITHUB_FETCH_MODE": fetch_mode,
+    }
+    report: Dict[str, Any] = {
+        "metadata": {
+            "commit": _get_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": requests,
+            "concurrency": concurrency,
+            "stream": stream,
+            "fetch_mode": fetch_mode,
+            "openai_latency": openai_latency,
+        },
+        "scenarios": [],
+    }
+    try:
+        for files in file_counts:
+            for mode in modes:
+                scenario = run_scenario(
+                    files,
+                    mode,
+                    requests,
+                    concurrency,
+                    stream,
+                    environment,
+                    servers,
+                    verbose,
+                )
+                report["scenarios"].append(scenario)
+                latency = scenario["latency_ms"]
+                click.echo(
+                    f"{scenario['name']:<22} p50 {latency['p50']:>8.1f} ms  "
+                    f"p95 {latency['p95']:>8.1f} ms  p99 {latency['p99']:>8.1f} ms  "
+                    f"{scenario['requests_per_second']:>7.1f} req/s  "
+                    f"{scenario['peak_rss_mb']:>6.1f} MB  "
+                    f"errors {scenario['errors']}"
+                )
+    finally:
+        github.stop()
+        openai.stop()
+        redis.stop()
+
+    if output:
+        Path(output).write_text(json.dumps(report, indent=2))
+        click.echo(f"Report written to {output}")
+    if baseline_path:
+        compare(report, json.loads(Path(baseline_path).read_text()))
+
+
+if __name__ == "__main__":
+    main()
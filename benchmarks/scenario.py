@@ -0,0 +1,107 @@
+"""
+Runs one benchmark scenario against the FastAPI app in this process and
+prints its measurements as JSON. It is started by benchmarks.run in a
+fresh process per scenario, so settings are read from the environment
+prepared for the scenario and the peak RSS only covers that scenario.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import statistics
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# Requests which hang longer than this fail, instead of blocking the scenario.
+REQUEST_TIMEOUT = 600.0
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    index = max(int(round(percent / 100 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+async def run_scenario(arguments: argparse.Namespace) -> Dict[str, Any]:
+    from httpx import ASGITransport, AsyncClient, TimeoutException
+
+    from auto_review_tool.main import app
+
+    endpoint = "/api/review/stream" if arguments.stream else "/api/review"
+    semaphore = asyncio.Semaphore(arguments.concurrency)
+
+    async def review(client: AsyncClient, repo: str) -> Tuple[float, Optional[str]]:
+        """:return: The latency and the error of the request, if it failed."""
+        payload = {
+            "assignment_description": "Implement a synthetic benchmark project.",
+            "github_repo_url": f"https://github.com/bench/{repo}",
+            "candidate_level": "Middle",
+        }
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json=payload)
+            except TimeoutException:
+                return time.perf_counter() - started, "timeout"
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            return elapsed, str(response.status_code)
+        if arguments.stream and "event: result" not in response.text:
+            return elapsed, "no result event"
+        return elapsed, None
+
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+                transport=ASGITransport(app=app),
+                base_url="http://bench",
+                timeout=REQUEST_TIMEOUT,
+        ) as client:
+            warm_up: List[Tuple[float, Optional[str]]] = []
+            if arguments.warm:
+                warm_up.append(await review(client, arguments.repos[0]))
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *[review(client, repo) for repo in arguments.repos]
+            )
+            duration = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for elapsed, _ in results)
+    errors = Counter(error for _, error in results if error is not None)
+    errors.update(f"warm-up {error}" for _, error in warm_up if error is not None)
+    return {
+        "requests": len(results),
+        "errors": sum(errors.values()),
+        "error_statuses": dict(errors),
+        "duration_s": round(duration, 3),
+        "requests_per_second": round(len(results) / duration, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(statistics.fmean(latencies), 2),
+            "max": round(latencies[-1], 2),
+        },
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, required=True)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument(
+        "--warm", action="store_true", help="Review the first repository once first"
+    )
+    parser.add_argument("repos", nargs="+")
+    arguments = parser.parse_args()
+    print(json.dumps(asyncio.run(run_scenario(arguments))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Benchmark of the startup of the app and of the CLI.
+
+Measures, every time in a fresh process, the import time of the package,
+the CLI and the app, lists the packages which take the most time to import
+with the app,
+and measures the time from launching uvicorn until every worker has
+started and until the first request is answered.
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --workers 4 --output startup.json
+"""
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess  # noqa: S404 - measurements run in fresh processes
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import click
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ("auto_review_tool", "auto_review_tool.cli", "auto_review_tool.main")
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)$")
+READY_LINE = "Application startup complete"
+MULTIPROCESS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+
+def get_environment() -> Dict[str, str]:
+    """Environment of the measured processes, which need no real tokens."""
+    environment = {
+        **os.environ,
+        "GITHUB_TOKEN": os.environ.get("GITHUB_TOKEN", "benchmark"),
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        # Nothing listens there, so Redis is skipped right away.
+        "REDIS_URL": "redis://127.0.0.1:1/0",
+        "PYTHONPATH": str(ROOT),
+    }
+    environment.pop(MULTIPROCESS_DIR_ENV, None)
+    return environment
+
+
+def measure_import(module: str, environment: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Import a module in a fresh process with -X importtime.
+    :return: The import time of the module and the time spent importing
+             the modules of every top-level package, in milliseconds.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        completed = subprocess.run(  # noqa: S603
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=workdir,
+            env=environment,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    total = 0
+    packages: Dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, name = match.groups()
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000
+        if name == module:
+            total = int(cumulative_us) / 1000
+    return {"total_ms": total, "packages": packages}
+
+
+def measure_first_request(
+        workers: int,
+        environment: Dict[str, str],
+        timeout: float,
+) -> Dict[str, Any]:
+    """
+    Launch uvicorn and measure when every worker has started
+    and when the first request is answered.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    command = [
+        sys.executable, "-m", "uvicorn", "auto_review_tool.main:app",
+        "--port", str(port), "--workers", str(workers),
+    ]
+    ready: List[float] = []
+    with tempfile.TemporaryDirectory() as workdir:
+        started = time.perf_counter()
+        process = subprocess.Popen(  # noqa: S603
+            command,
+            cwd=workdir,
+            env=environment,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+
+        def read_log() -> None:
+            for line in process.stderr:
+                if READY_LINE in line:
+                    ready.append(time.perf_counter() - started)
+
+        reader = threading.Thread(target=read_log, daemon=True)
+        reader.start()
+        first_request = None
+        try:
+            with httpx.Client(timeout=1) as client:
+                while time.perf_counter() - started < timeout:
+                    try:
+                        response = client.get(f"http://127.0.0.1:{port}/docs")
+                        if response.status_code == 200:
+                            first_request = time.perf_counter() - started
+                            break
+                    except httpx.TransportError:
+                        pass
+                    time.sleep(0.01)
+            while len(ready) < workers and time.perf_counter() - started < timeout:
+                time.sleep(0.01)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            reader.join(timeout=5)
+    if first_request is None:
+        raise click.ClickException(f"The app did not answer within {timeout}s.")
+    return {"first_request_s": first_request, "workers_ready_s": sorted(ready)}
+
+
+@click.command()
+@click.option("--workers", default=1, show_default=True, help="uvicorn workers")
+@click.option("--repeat", default=3, show_default=True, help="Runs per measurement")
+@click.option("--top", default=10, show_default=True, help="Slowest imports listed")
+@click.option("--timeout", default=60.0, show_default=True, help="Seconds to start")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the JSON report")
+def main(
+        workers: int,
+        repeat: int,
+        top: int,
+        timeout: float,
+        output: Optional[str],
+) -> None:
+    """Measure the import time and the time to the first request."""
+    environment = get_environment()
+    report: Dict[str, Any] = {"python": sys.version.split()[0], "imports": {}}
+
+    click.echo(f"{'module':<24}{'import ms':>12}")
+    app_packages: Dict[str, List[float]] = {}
+    for module in MODULES:
+        runs = [measure_import(module, environment) for _ in range(repeat)]
+        total = statistics.median(run["total_ms"] for run in runs)
+        report["imports"][module] = round(total, 1)
+        click.echo(f"{module:<24}{total:>12.1f}")
+        if module == "auto_review_tool.main":
+            for run in runs:
+                for package, ms in run["packages"].items():
+                    app_packages.setdefault(package, []).append(ms)
+
+    medians = {
+        package: statistics.median(times) for package, times in app_packages.items()
+    }
+    slowest = sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top]
+    report["slowest_app_imports"] = {name: round(ms, 1) for name, ms in slowest}
+    click.echo("\nSlowest packages imported by the app:")
+    for name, ms in slowest:
+        click.echo(f"  {name:<40}{ms:>10.1f} ms")
+
+    runs = [measure_first_request(workers, environment, timeout) for _ in range(repeat)]
+    first_request = statistics.median(run["first_request_s"] for run in runs)
+    workers_ready = [
+        round(statistics.median(times), 3)
+        for times in zip(*(run["workers_ready_s"] for run in runs))
+    ]
+    report["workers"] = workers
+    report["first_request_s"] = round(first_request, 3)
+    report["workers_ready_s"] = workers_ready
+    click.echo(
+        f"\n{workers} workers: first request answered after {first_request:.2f}s, "
+        f"workers ready after {', '.join(f'{t:.2f}s' for t in workers_ready)}"
+    )
+
+    if output:
+        Path(output).write_text(json.dumps(report, indent=2))
+        click.echo(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()